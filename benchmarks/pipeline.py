@@ -0,0 +1,264 @@
+"""
+Benchmark of the stages of rss_reader on synthetic feeds.
+
+Feeds of every size are generated in several variants: with and without media tags
+and with long html descriptions. Every stage is timed separately, the median time
+is compared with the stored baseline and the run fails if a stage is slower
+than the baseline by more than the threshold.
+
+    python benchmarks/pipeline.py --sizes 1000,10000,100000 --output pipeline.json
+    python benchmarks/pipeline.py --update-baseline
+"""
+import argparse
+import datetime as dt
+import html
+import itertools
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rss_reader.rss_reader as rss_reader
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+VARIANTS = {
+    "plain": {"media": False, "description_size": 200},
+    "media": {"media": True, "description_size": 200},
+    "long_html": {"media": True, "description_size": 20000},
+}
+
+
+def parse_arguments():
+    """
+    Returns parameters read from the command line.
+
+    :return args : argparse.Namespace
+        namespace with 'sizes', 'runs', 'pdf_items', 'baseline', 'threshold',
+        'update_baseline' and 'output' attributes
+    """
+    parser = argparse.ArgumentParser(description="Benchmark of rss_reader stages on synthetic feeds.")
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000",
+        type=lambda sizes: [int(size) for size in sizes.split(",")],
+        help="comma-separated numbers of items of generated feeds",
+    )
+    parser.add_argument("--runs", default=3, type=int, help="number of runs of every stage")
+    parser.add_argument(
+        "--pdf-items",
+        default=20,
+        type=int,
+        help="maximum number of items converted to pdf, pdf is measured only for the smallest size",
+        dest="pdf_items",
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="path to the stored baseline")
+    parser.add_argument(
+        "--threshold",
+        default=0.5,
+        type=float,
+        help="allowed slowdown relative to the baseline, e.g. 0.5 for 50%%",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        default=False,
+        help="write results to the baseline instead of comparing",
+        dest="update_baseline",
+    )
+    parser.add_argument("--output", default=None, help="write results as JSON to the specified path")
+    return parser.parse_args()
+
+
+def generate_feed(count: int, media: bool = True, description_size: int = 200) -> bytes:
+    """
+    Returns a synthetic RSS feed, items are published every minute, the latest item first.
+
+    :param count : int
+        number of items
+    :param media : bool
+        add 'media:content' and 'enclosure' tags to items
+    :param description_size : int
+        approximate length of the html description of every item
+
+    :return bytes
+        the feed encoded to UTF-8
+    """
+    paragraph = "<p>Some <b>bold</b> text with <a href='https://example.com/page'>a link</a> and more words.</p>"
+    description = html.escape(paragraph * max(description_size // len(paragraph), 1))
+    start = dt.datetime(2021, 10, 30, 23, 59, tzinfo=dt.timezone.utc)
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>"
+        "<rss version='2.0' xmlns:media='http://search.yahoo.com/mrss/'><channel>"
+        "<title>Synthetic feed</title><link>https://example.com/</link><ttl>15</ttl>"
+    ]
+    for i in range(count):
+        date = (start - dt.timedelta(minutes=i)).strftime("%a, %d %b %Y %H:%M:%S +0000")
+        media_tags = (
+            f"<media:content url='https://img.example.com/{i}.jpeg' medium='image'/>"
+            f"<enclosure url='https://img.example.com/{i}.jpeg' type='image/jpeg'/>"
+        ) if media else ""
+        parts.append(
+            f"<item><title>News number {i}</title><link>https://example.com/news/{i}</link>"
+            f"<guid>https://example.com/news/{i}</guid><pubDate>{date}</pubDate>"
+            f"<source url='https://source.example.com'>Source</source><category>World</category>"
+            f"{media_tags}<description>{description}</description></item>"
+        )
+    parts.append("</channel></rss>")
+    return "".join(parts).encode("utf-8")
+
+
+def measure(function, runs: int, setup=None) -> float:
+    """
+    Runs the function once without timing it, e.g. to import modules and register fonts,
+    then runs it several times and returns the median wall time.
+
+    :param function : callable
+        function which gets the result of setup
+    :param runs : int
+        number of runs
+    :param setup : callable or None
+        function which prepares the argument of every run, it isn't timed
+
+    :return float
+        median wall time in seconds
+    """
+    function(setup() if setup else None)
+    times = []
+    for _ in range(runs):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def cache_twice(items: list, directory: str):
+    """
+    Caches the older half of the news and returns the function which merges all news into the cache.
+
+    :param items : list
+        parsed dictionaries of news
+    :param directory : str
+        the name of the directory of cache files
+
+    :return callable
+        function which caches all news, half of them are already cached
+    """
+    rss_reader.cache_news(directory, rss_reader.create_news(items[len(items) // 2:]))
+    return lambda _: rss_reader.cache_news(directory, rss_reader.create_news(items))
+
+
+def benchmark(size: int, variant: dict, runs: int, pdf_items: int or None) -> dict:
+    """
+    Times every stage for the generated feed.
+
+    :param size : int
+        number of items of the feed
+    :param variant : dict
+        arguments of 'generate_feed'
+    :param runs : int
+        number of runs of every stage
+    :param pdf_items : int or None
+        maximum number of items converted to pdf, pdf isn't measured if it is None
+
+    :return dict
+        median wall time in seconds of every stage, the number of items converted to pdf
+        is a part of the name of the pdf stage, e.g. 'create_pdf/20'
+    """
+    content = generate_feed(size, **variant)
+    chunks = [content[i:i + rss_reader.FEED_CHUNK_SIZE] for i in range(0, len(content), rss_reader.FEED_CHUNK_SIZE)]
+    items = list(rss_reader.StreamParser(chunks))
+    news = rss_reader.create_news(items)
+    with open(os.path.join(rss_reader.DATA_PATH, "templates", "template_for_html.html"), encoding="utf-8") as file:
+        html_template = file.read()
+    with open(os.path.join(rss_reader.DATA_PATH, "templates", "template_for_pdf.html"), encoding="utf-8") as file:
+        pdf_template = file.read()
+    results = {
+        "parse": measure(lambda _: list(rss_reader.StreamParser(chunks)), runs),
+        "create_news": measure(lambda _: rss_reader.create_news(items), runs),
+        "create_news_dict": measure(lambda _: rss_reader.create_news_dict(news), runs),
+        "render_html": measure(
+            lambda _: rss_reader.render_html(html_template, news, "Synthetic feed", io.StringIO()), runs
+        ),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            runs_dirs = itertools.count()
+            results["cache_news"] = measure(
+                lambda merge: merge(None), runs, lambda: cache_twice(items, f"bench_{next(runs_dirs)}")
+            )
+            if pdf_items is not None:
+                export_news = [rss_reader.Novelty(**dict(one_news, enclosure=None)) for one_news in news[:pdf_items]]
+                results[f"create_pdf/{pdf_items}"] = measure(
+                    lambda _: rss_reader.create_pdf(pdf_template, export_news, "Synthetic feed", directory, "feed"),
+                    runs,
+                )
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns stages which are slower than the baseline by more than the threshold.
+
+    :param results : dict
+        median wall times with keys 'variant/size/stage'
+    :param baseline : dict
+        stored wall times with the same keys
+    :param threshold : float
+        allowed slowdown relative to the baseline
+
+    :return list
+        descriptions of regressions
+    """
+    return [
+        f"{key}: {seconds:.4f}s, baseline {baseline[key]:.4f}s"
+        for key, seconds in results.items()
+        if key in baseline and seconds > baseline[key] * (1 + threshold)
+    ]
+
+
+def main():
+    """
+    Measures all stages, prints results and exits with code 1 if a stage is slower than the baseline.
+    Downloading of images isn't measured, 'cache_images' is replaced with a function
+    which returns news as they are.
+    """
+    args = parse_arguments()
+    rss_reader.cache_images = lambda news, workers=4: news
+    results = {}
+    for size in args.sizes:
+        for name, variant in VARIANTS.items():
+            pdf_items = args.pdf_items if size == min(args.sizes) else None
+            for stage, seconds in benchmark(size, variant, args.runs, pdf_items).items():
+                results[f"{name}/{size}/{stage}"] = round(seconds, 4)
+    report = {"python": sys.version.split()[0], "runs": args.runs, "pdf_items": args.pdf_items, "stages": results}
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=4)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as json_file:
+            json.dump(results, json_file, indent=4, sort_keys=True)
+        return
+    if not os.path.exists(args.baseline):
+        print(f"There is no baseline '{args.baseline}', run with '--update-baseline'", file=sys.stderr)
+        return
+    with open(args.baseline, "r", encoding="utf-8") as json_file:
+        regressions = compare(results, json.load(json_file), args.threshold)
+    if regressions:
+        print("Stages slower than the baseline:\n" + "\n".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Startup benchmark of the common entry points of rss_reader.
+
+Every entry point is started in a new interpreter several times, the median wall time
+over the empty interpreter is compared with the budget. None of these entry points
+may import heavy dependencies, they are found with '-X importtime'.
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HEAVY_MODULES = ("requests", "bs4", "xhtml2pdf", "reportlab")
+ENTRY_POINTS = {
+    "import": ["-c", "import rss_reader.rss_reader"],
+    "version": ["-m", "rss_reader.rss_reader", "--version"],
+    "list_dates": ["-m", "rss_reader.rss_reader", "--list-dates"],
+    "date": ["-m", "rss_reader.rss_reader", "--date", "20211030"],
+}
+BUDGETS = {"import": 0.15, "version": 0.2, "list_dates": 0.2, "date": 0.2}
+
+
+def parse_arguments():
+    """
+    Returns parameters read from the command line.
+
+    :return args : argparse.Namespace
+        namespace with 'runs', 'budget_factor' and 'output' attributes
+    """
+    parser = argparse.ArgumentParser(description="Startup benchmark of rss_reader entry points.")
+    parser.add_argument("--runs", default=10, type=int, help="number of runs of every entry point")
+    parser.add_argument(
+        "--budget-factor",
+        default=1.0,
+        type=float,
+        help="multiply budgets, e.g. for slow machines",
+        dest="budget_factor",
+    )
+    parser.add_argument("--output", default=None, help="write results as JSON to the specified path")
+    return parser.parse_args()
+
+
+def get_heavy_modules(arguments: list, cwd: str, env: dict) -> list:
+    """
+    Returns heavy dependencies imported by the entry point.
+
+    :param arguments : list
+        arguments of the interpreter
+    :param cwd : str
+        working directory of the entry point
+    :param env : dict
+        environment of the entry point
+
+    :return list
+        names of imported heavy modules
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments], cwd=cwd, env=env, capture_output=True, text=True
+    )
+    imported = {
+        line.rsplit("|", 1)[-1].strip() for line in process.stderr.splitlines() if line.startswith("import time:")
+    }
+    return sorted(module for module in HEAVY_MODULES if module in imported)
+
+
+def measure(arguments: list, runs: int, cwd: str, env: dict) -> float:
+    """
+    Starts the entry point several times and returns the median wall time.
+
+    :param arguments : list
+        arguments of the interpreter
+    :param runs : int
+        number of runs
+    :param cwd : str
+        working directory of the entry point
+    :param env : dict
+        environment of the entry point
+
+    :return float
+        median wall time in seconds
+    """
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *arguments], cwd=cwd, env=env, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    """
+    Measures all entry points, prints results and exits with code 1 if a budget is exceeded
+    or an entry point imports heavy dependencies.
+    """
+    args = parse_arguments()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    baseline = measure(["-c", "pass"], args.runs, root, env)
+    results = {}
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, arguments in ENTRY_POINTS.items():
+            wall_time = measure(arguments, args.runs, cwd, env)
+            results[name] = {
+                "seconds": round(wall_time, 4),
+                "over_interpreter": round(wall_time - baseline, 4),
+                "budget": BUDGETS[name] * args.budget_factor,
+                "heavy_modules": get_heavy_modules(arguments, cwd, env),
+            }
+    report = {"python": sys.version.split()[0], "interpreter": round(baseline, 4), "entry_points": results}
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=4)
+    failed = [
+        name for name, result in results.items()
+        if result["over_interpreter"] > result["budget"] or result["heavy_modules"]
+    ]
+    if failed:
+        print(f"Startup budget exceeded: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """
+    Base class of errors raised by the fetch policy instead of sending the request.
+    """
+
+
+class CircuitOpenError(FetchError):
+    """
+    The host failed too many times in a row and is skipped until the cooldown is over.
+    """
+
+
+class DeadlineExceededError(FetchError):
+    """
+    The total deadline of the run is over.
+    """
+
+
+class CircuitBreaker:
+    """
+    A class to skip the host after several failures in a row.
+
+    The circuit is open for the cooldown after the threshold of failures is reached,
+    then one request is let through: its success closes the circuit,
+    its failure opens it again.
+
+    Attributes
+    ----------
+    threshold : int
+        number of failures in a row which opens the circuit
+
+    cooldown : float
+        number of seconds the circuit stays open
+
+    failures : int
+        number of failures in a row
+
+    Methods
+    -------
+    def allow(self, now):
+        Checks if a request to the host may be sent.
+
+    def record(self, success, now):
+        Records the result of the request.
+    """
+    def __init__(self, threshold: int = 5, cooldown: float = 30):
+        """
+        Constructs all attributes for the 'CircuitBreaker' object.
+
+        :param threshold : int
+            number of failures in a row which opens the circuit
+        :param cooldown : float
+            number of seconds the circuit stays open
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self, now: float) -> bool:
+        """
+        Checks if a request to the host may be sent.
+
+        :param now : float
+            the current time in seconds
+
+        :return bool
+            True if the circuit is closed or the trial request after the cooldown may be sent
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if now - self._opened_at >= self.cooldown and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, success: bool, now: float):
+        """
+        Records the result of the request.
+
+        :param success : bool
+            True if the host answered
+        :param now : float
+            the current time in seconds
+        """
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self._opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self._opened_at = now
+
+
+class FetchPolicy:
+    """
+    A class to send GET requests with timeouts, retries and circuit breakers.
+
+    Every request has connect and read timeouts, which are cut to the time left
+    until the deadline of the run. Failed connections, timeouts and answers
+    '429' and '5xx' are retried with exponential backoff and full jitter.
+    Hosts which keep failing are skipped by their circuit breakers.
+
+    Attributes
+    ----------
+    connect_timeout : float
+        number of seconds to wait for the connection
+
+    read_timeout : float
+        number of seconds to wait for data between reads
+
+    deadline : float or None
+        time in seconds of 'clock' after which requests are not sent
+
+    retries : int
+        number of retries of the failed request
+
+    backoff : float
+        base number of seconds of the backoff
+
+    max_backoff : float
+        maximum number of seconds of one backoff
+
+    Methods
+    -------
+    def get(self, url, **kwargs):
+        Sends GET request according to the policy.
+
+    def get_breaker(self, host):
+        Returns the circuit breaker of the host.
+    """
+    def __init__(
+            self, connect_timeout: float = 5, read_timeout: float = 30, deadline: float = None, retries: int = 2,
+            backoff: float = 0.5, max_backoff: float = 10, threshold: int = 5, cooldown: float = 30,
+            clock=time.monotonic, sleep=time.sleep
+    ):
+        """
+        Constructs all attributes for the 'FetchPolicy' object.
+
+        :param connect_timeout : float
+            number of seconds to wait for the connection
+        :param read_timeout : float
+            number of seconds to wait for data between reads
+        :param deadline : float or None
+            number of seconds from now after which requests are not sent, not limited if it is None
+        :param retries : int
+            number of retries of the failed request
+        :param backoff : float
+            base number of seconds of the backoff
+        :param max_backoff : float
+            maximum number of seconds of one backoff
+        :param threshold : int
+            number of failures in a row which opens the circuit of the host
+        :param cooldown : float
+            number of seconds the circuit of the host stays open
+        :param clock : callable
+            function which returns the current time in seconds
+        :param sleep : callable
+            function which waits for the number of seconds
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = None if deadline is None else clock() + deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    def get_breaker(self, host: str) -> CircuitBreaker:
+        """
+        Returns the circuit breaker of the host.
+
+        :param host : str
+            host name and port of the url
+
+        :return CircuitBreaker
+            the circuit breaker of the host
+        """
+        with self._breakers_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.threshold, self.cooldown)
+            return self._breakers[host]
+
+    def get(self, url: str, send=None, **kwargs):
+        """
+        Sends GET request according to the policy.
+
+        :param url : str
+            url of the request
+        :param send : callable or None
+            function which sends the request, 'requests.get' by default
+        :param kwargs : dict
+            additional arguments of the request, e.g. 'headers' and 'stream'
+
+        :return requests.models.Response
+            the response, the last one if the server kept answering with errors
+
+        :raise CircuitOpenError
+            an error if the host is skipped by its circuit breaker
+        :raise DeadlineExceededError
+            an error if the deadline of the run is over
+        :raise requests.exceptions.ConnectionError, requests.exceptions.Timeout
+            an error of the last attempt
+        """
+        import requests
+
+        send = send or requests.get
+        breaker = self.get_breaker(urlsplit(url).netloc)
+        for attempt in range(self.retries + 1):
+            if not breaker.allow(self.clock()):
+                log.error(f"Exception occurred 'CircuitOpenError' while requesting '{url}'")
+                raise CircuitOpenError(f"Host of '{url}' failed {breaker.failures} times in a row, it is skipped")
+            try:
+                response = send(url, timeout=self.get_timeout(url), **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+                breaker.record(False, self.clock())
+                if attempt == self.retries:
+                    raise
+                log.info(f"Exception occurred '{type(exc).__name__}' while requesting '{url}', retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record(True, self.clock())
+                    return response
+                breaker.record(False, self.clock())
+                if attempt == self.retries:
+                    return response
+                log.info(f"'{url}' answered with status code '{response.status_code}', retrying")
+                response.close()
+            self.wait(attempt, url)
+
+    def get_timeout(self, url: str) -> tuple:
+        """
+        Returns connect and read timeouts cut to the time left until the deadline.
+
+        :param url : str
+            url of the request
+
+        :return tuple
+            connect and read timeouts in seconds
+
+        :raise DeadlineExceededError
+            an error if the deadline of the run is over
+        """
+        if self.deadline is None:
+            return self.connect_timeout, self.read_timeout
+        left = self.deadline - self.clock()
+        if left <= 0:
+            log.error(f"Exception occurred 'DeadlineExceededError' while requesting '{url}'")
+            raise DeadlineExceededError(f"Deadline of the run is over, '{url}' is not requested")
+        return min(self.connect_timeout, left), min(self.read_timeout, left)
+
+    def wait(self, attempt: int, url: str):
+        """
+        Waits before the retry, the backoff is random between zero and the exponential backoff.
+
+        :param attempt : int
+            number of the failed attempt starting from zero
+        :param url : str
+            url of the request
+        """
+        delay = random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+        if self.deadline is not None:
+            delay = min(delay, max(self.deadline - self.clock(), 0))
+        self.sleep(delay)
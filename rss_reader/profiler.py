@@ -0,0 +1,199 @@
+import contextlib
+import cProfile
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+
+
+log = logging.getLogger(__name__)
+
+
+class Profiler:
+    """
+    A class to measure stages of the run and count processed data.
+
+    Wall time, CPU time of the thread and peak memory are measured for every call
+    of a stage and summed by the name of the stage, so stages of feeds processed
+    in different threads are added up. Times of a stage don't include times of stages
+    nested in it in the same thread, e.g. reading of the feed while it is parsed.
+    Peak memory is the peak of memory allocated by Python while the stage ran,
+    it includes stages which ran at the same time. Memory allocations are traced
+    during the whole run, so times include the overhead of tracing.
+    If stats are collected, function calls of the main thread and of stages
+    of other threads are recorded by cProfile.
+
+    Attributes
+    ----------
+    stats : bool
+        collect cProfile stats
+
+    stages : dict
+        dictionary with keys – names of stages and values – dictionaries
+        with 'calls', 'wall', 'cpu' and 'peak_memory' keys
+
+    counters : dict
+        dictionary with keys – names of counters and values – numbers
+
+    Methods
+    -------
+    def start(self):
+        Starts measuring the run.
+
+    def stop(self):
+        Stops measuring and returns the report.
+
+    def stage(self, name, calls=1):
+        Returns the context manager which measures the stage.
+
+    def add(self, name, value=1):
+        Adds the value to the counter.
+
+    def dump_stats(self, path):
+        Writes cProfile stats to the file.
+    """
+    def __init__(self, stats: bool = False):
+        """
+        Constructs all attributes for the 'Profiler' object.
+
+        :param stats : bool
+            collect cProfile stats
+        """
+        self.stats = stats
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active = 0
+        self._peak = 0
+        self._start = None
+        self._profiles = []
+
+    def start(self):
+        """
+        Starts measuring the run, tracing of memory allocations and cProfile of the main thread.
+        """
+        tracemalloc.start()
+        self._start = (time.perf_counter(), time.process_time())
+        if self.stats:
+            self._local.profile = self._enable_profile()
+
+    def stop(self) -> dict:
+        """
+        Stops measuring and returns the report.
+
+        :return dict
+            dictionary with 'wall', 'cpu', 'peak_memory', 'note', 'stages' and 'counters' keys,
+            times are in seconds and memory is in bytes
+        """
+        wall = time.perf_counter() - self._start[0]
+        cpu = time.process_time() - self._start[1]
+        profile = getattr(self._local, "profile", None)
+        if profile:
+            profile.create_stats()
+            self._local.profile = None
+        with self._lock:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            return {
+                "wall": round(wall, 6),
+                "cpu": round(cpu, 6),
+                "peak_memory": self._peak,
+                "note": "times include the overhead of tracing memory allocations, "
+                        "times of stages don't include times of nested stages",
+                "stages": {
+                    name: dict(stage, wall=round(stage["wall"], 6), cpu=round(stage["cpu"], 6))
+                    for name, stage in self.stages.items()
+                },
+                "counters": dict(self.counters),
+            }
+
+    @contextlib.contextmanager
+    def stage(self, name: str, calls: int = 1):
+        """
+        Returns the context manager which measures the stage.
+        Times of stages nested in it in the same thread are subtracted from its times.
+        The peak of allocated memory is reset only when no other stage runs.
+
+        :param name : str
+            name of the stage, e.g. 'fetch' or 'parse'
+        :param calls : int
+            number of calls added to the stage, 0 for parts of one call, e.g. reading of chunks
+        """
+        with self._lock:
+            if not self._active:
+                self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            self._active += 1
+        profile = None
+        if self.stats and getattr(self._local, "profile", None) is None:
+            profile = self._local.profile = self._enable_profile()
+        frames = self._local.__dict__.setdefault("frames", [])
+        nested = [0.0, 0.0]
+        frames.append(nested)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            frames.pop()
+            if frames:
+                frames[-1][0] += wall
+                frames[-1][1] += cpu
+            wall, cpu = wall - nested[0], cpu - nested[1]
+            if profile is not None:
+                if profile:
+                    profile.create_stats()
+                self._local.profile = None
+            with self._lock:
+                self._active -= 1
+                peak = tracemalloc.get_traced_memory()[1]
+                stage = self.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_memory": 0})
+                stage["calls"] += calls
+                stage["wall"] += wall
+                stage["cpu"] += cpu
+                stage["peak_memory"] = max(stage["peak_memory"], peak)
+
+    def add(self, name: str, value: int = 1):
+        """
+        Adds the value to the counter.
+
+        :param name : str
+            name of the counter, e.g. 'items_parsed'
+        :param value : int
+            value added to the counter
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def dump_stats(self, path: str):
+        """
+        Writes cProfile stats of the run to the file, it can be read by 'pstats' or 'snakeviz'.
+
+        :param path : str
+            path to the file
+        """
+        if not self._profiles:
+            log.error(f"Exception occurred 'ValueError' while writing '{path}'")
+            raise ValueError("There are no cProfile stats, the profiler was created without stats")
+        log.info(f"Writing cProfile stats to '{path}'")
+        pstats.Stats(*self._profiles).dump_stats(path)
+
+    def _enable_profile(self) -> cProfile.Profile or bool:
+        """
+        Enables cProfile in the current thread.
+
+        :return cProfile.Profile
+            the enabled profile
+        :return False
+            if another profiler is active in the thread
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return False
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
@@ -1,24 +1,87 @@
+from __future__ import annotations
+
+import contextlib
+import dataclasses
+import filecmp
 import hashlib
+import html
+import io
 import json
 import shutil
 import sys
+import tempfile
 import argparse
 import logging
-import requests
 import os
 import re
+import threading
 import datetime as dt
-from bs4 import BeautifulSoup, element
-from xhtml2pdf import pisa
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from lxml import etree
+
+
+FEED_CHUNK_SIZE = 64 * 1024
+IMAGE_CHUNK_SIZE = 64 * 1024
+DATA_PATH = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIRECTORY = os.path.join("cache", "images")
+DATABASE_PATH = os.path.join("cache", "news.sqlite3")
+MANIFEST_PATH = os.path.join("cache", "manifest.json")
+THUMBNAILS_DIRECTORY = os.path.join("cache", "thumbnails")
+THUMBNAIL_SIZE = (800, 800)
+THUMBNAIL_QUALITY = 80
+
+DATE_FORMATS = ("%a, %d %b %Y %H:%M:%S %z", "%a, %d %b %Y %H:%M:%S %Z", "%Y-%m-%dT%H:%M:%SZ")
+MONTHS = {
+    month: number for number, month in enumerate(
+        ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"), start=1
+    )
+}
+RFC_822_PATTERN = re.compile(
+    r"\s*(?:[A-Za-z]{3},?\s+)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+\d{1,2}:\d{2}(?::\d{2})?"
+    r"(?:\s+(?:[+-]\d{4}|[A-Za-z]{1,5}))?\s*$"
+)
+ISO_8601_PATTERN = re.compile(
+    r"\s*(\d{4})-(\d{2})-(\d{2})(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}(?::?\d{2})?)?)?\s*$"
+)
+DOCTYPE_PATTERN = re.compile(r"<!doctype", re.IGNORECASE)
+SKIPPED_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+DESCRIPTION_CACHE_SIZE = 4096
+PDF_CHUNK_SIZE = 50
+FICLONE = 0x40049409
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+_description_cache = OrderedDict()
+_description_cache_lock = threading.Lock()
+_date_parsers = {}
+_date_parsers_lock = threading.Lock()
+_manifest_lock = threading.RLock()
+_seen_sets = {}
+_seen_lock = threading.Lock()
+_image_indexes = {}
+_image_index_lock = threading.Lock()
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+_pdf_fonts_registered = False
+_cache_listeners = []
+_fetch_policy_lock = threading.Lock()
+_session_lock = threading.Lock()
 
 
 def parse_arguments():
     """
     Returns parameters read from the command line.
 
-    :return:
-    source : str
-        url of source of rss news
+    :return args : argparse.Namespace
+        namespace with the following attributes
+
+    sources : list
+        urls of sources of rss news
+
+    feeds : str
+        path to the file with urls of sources, one per line
 
     version
         print version info
@@ -26,27 +89,90 @@ def parse_arguments():
     json_print : bool
         print result as JSON in stdout
 
+    ndjson_print : bool
+        print result as newline-delimited JSON in stdout, one news per line
+
     verbose : bool
         output verbose status message
 
     limit : int
         limit news topics if this parameter provided
 
+    workers : int
+        maximum number of feeds processed at the same time
+
+    image_workers : int
+        maximum number of images of one feed downloaded at the same time
+
     date : str
         print cached news for specified date
 
+    date_from : str
+        print cached news starting from specified date
+
+    date_to : str
+        print cached news up to specified date
+
+    list_dates : bool
+        print dates of cached news with number of feeds and news
+
+    cache_backend : str
+        'json', 'sqlite' or 'segments' storage of cached news
+
+    connect_timeout : float
+        number of seconds to wait for the connection to the server
+
+    read_timeout : float
+        number of seconds to wait for data from the server
+
+    deadline : float
+        number of seconds after which no more requests are sent
+
+    retries : int
+        number of retries of failed requests
+
+    host_connections : int
+        maximum number of connections to one host
+
+    watch : bool
+        poll sources until the process is interrupted
+
+    interval : float
+        minimum number of seconds between polls of a feed in the watch mode
+
+    serve : bool
+        serve cached news over the local HTTP JSON API
+
+    host : str
+        address of the HTTP server
+
+    port : int
+        port of the HTTP server
+
+    serve_cache_size : int
+        maximum size of decoded news kept in memory by the HTTP server, in megabytes
+
     to_pdf : str
         convert news to pdf and save to specified path
 
+    pdf_workers : int
+        maximum number of processes rendering chunks of pdf files
+
     to_html : str
         convert news to html and save to specified path
     """
     parser = argparse.ArgumentParser(description="Pure Python command-line RSS reader.")
     parser.add_argument(
-        "source",
-        nargs="?",
-        default=None,
+        "sources",
+        nargs="*",
+        default=[],
         help="RSS URL",
+        metavar="source",
+    )
+    parser.add_argument(
+        "--feeds",
+        default=None,
+        help="read RSS URLs from the specified file, one per line",
     )
     parser.add_argument(
         "--version",
@@ -61,6 +187,13 @@ def parse_arguments():
         help="print result as JSON in stdout",
         dest="json_print",
     )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        default=False,
+        help="print result as newline-delimited JSON in stdout, one news per line",
+        dest="ndjson_print",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -75,30 +208,200 @@ def parse_arguments():
         help="limit news topics if this parameter provided",
         dest="limit",
     )
+    parser.add_argument(
+        "--workers",
+        default=8,
+        type=int,
+        help="maximum number of feeds processed at the same time",
+        dest="workers",
+    )
+    parser.add_argument(
+        "--image-workers",
+        default=4,
+        type=int,
+        help="maximum number of images of one feed downloaded at the same time",
+        dest="image_workers",
+    )
     parser.add_argument(
         "--date",
         default=None,
         help="print cached news for specified date",
     )
+    parser.add_argument(
+        "--from",
+        default=None,
+        help="print cached news starting from specified date",
+        dest="date_from",
+    )
+    parser.add_argument(
+        "--to",
+        default=None,
+        help="print cached news up to specified date",
+        dest="date_to",
+    )
+    parser.add_argument(
+        "--list-dates",
+        action="store_true",
+        default=False,
+        help="print dates of cached news with number of feeds and news",
+        dest="list_dates",
+    )
+    parser.add_argument(
+        "--cache-backend",
+        default="json",
+        choices=["json", "sqlite", "segments"],
+        help="store cached news in json files, in the indexed sqlite database "
+             "or in append-only compressed segments",
+        dest="cache_backend",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        default=5,
+        type=float,
+        help="number of seconds to wait for the connection to the server",
+        dest="connect_timeout",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        default=30,
+        type=float,
+        help="number of seconds to wait for data from the server",
+        dest="read_timeout",
+    )
+    parser.add_argument(
+        "--deadline",
+        default=None,
+        type=float,
+        help="number of seconds after which no more requests are sent",
+        dest="deadline",
+    )
+    parser.add_argument(
+        "--retries",
+        default=2,
+        type=int,
+        help="number of retries of failed requests",
+        dest="retries",
+    )
+    parser.add_argument(
+        "--host-connections",
+        default=8,
+        type=int,
+        help="maximum number of connections to one host",
+        dest="host_connections",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        default=False,
+        help="poll sources until the process is interrupted, respecting ttl, skipHours and skipDays of feeds",
+        dest="watch",
+    )
+    parser.add_argument(
+        "--interval",
+        default=900,
+        type=float,
+        help="minimum number of seconds between polls of a feed in the watch mode",
+        dest="interval",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        default=False,
+        help="serve cached news over the local HTTP JSON API, sources are polled if '--watch' is specified",
+        dest="serve",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="address of the HTTP server",
+        dest="host",
+    )
+    parser.add_argument(
+        "--port",
+        default=8080,
+        type=int,
+        help="port of the HTTP server",
+        dest="port",
+    )
+    parser.add_argument(
+        "--serve-cache-size",
+        default=64,
+        type=int,
+        help="maximum size of decoded news kept in memory by the HTTP server, in megabytes",
+        dest="serve_cache_size",
+    )
     parser.add_argument(
         "--to-pdf",
         default=None,
         help="convert news to pdf and save to specified path",
         dest="to_pdf",
     )
+    parser.add_argument(
+        "--pdf-workers",
+        default=os.cpu_count() or 1,
+        type=int,
+        help="maximum number of processes rendering chunks of pdf files",
+        dest="pdf_workers",
+    )
     parser.add_argument(
         "--to-html",
         default=None,
         help="convert news to html and save to specified path",
         dest="to_html",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="print wall time, CPU time and peak memory of every stage and counters of the run to stderr as JSON",
+        dest="profile",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default=None,
+        help="write the profile of the run to the specified path instead of stderr, implies '--profile'",
+        dest="profile_output",
+    )
+    parser.add_argument(
+        "--profile-stats",
+        default=None,
+        help="write cProfile stats of the run to the specified path, implies '--profile'",
+        dest="profile_stats",
+    )
     args = parser.parse_args()
-    return args.source, args.json_print, args.verbose, args.limit, args.date, args.to_pdf, args.to_html
+    if args.workers < 1:
+        parser.error("argument --workers: must be a positive number")
+    if args.image_workers < 1:
+        parser.error("argument --image-workers: must be a positive number")
+    if args.pdf_workers < 1:
+        parser.error("argument --pdf-workers: must be a positive number")
+    if args.json_print and args.ndjson_print:
+        parser.error("argument --ndjson: not allowed with argument --json")
+    if args.date and (args.date_from or args.date_to):
+        parser.error("argument --date: not allowed with arguments --from and --to")
+    if args.watch and (args.date or args.date_from or args.date_to or args.list_dates):
+        parser.error("argument --watch: not allowed with arguments --date, --from, --to and --list-dates")
+    if args.serve and (args.date or args.date_from or args.date_to or args.list_dates):
+        parser.error("argument --serve: not allowed with arguments --date, --from, --to and --list-dates")
+    if min(args.connect_timeout, args.read_timeout, args.deadline or 1) <= 0:
+        parser.error("arguments --connect-timeout, --read-timeout and --deadline: must be positive numbers")
+    if args.host_connections < 1:
+        parser.error("argument --host-connections: must be a positive number")
+    if args.retries < 0:
+        parser.error("argument --retries: must not be negative")
+    if args.deadline and (args.watch or args.serve):
+        parser.error("argument --deadline: not allowed with arguments --watch and --serve")
+    if args.serve_cache_size < 0:
+        parser.error("argument --serve-cache-size: must not be negative")
+    if args.interval <= 0:
+        parser.error("argument --interval: must be a positive number")
+    return args
 
 
 def create_logger(verbose: bool) -> logging.Logger:
     """
     Changes the parameters of  the created logger.
+    Handlers added before are replaced, the log file is opened only here, not on import.
 
     :param verbose : bool
         the 'verbose' parameter from the command line
@@ -106,7 +409,9 @@ def create_logger(verbose: bool) -> logging.Logger:
     :return logger : logging.Logger
         the logger with the updated parameters
     """
-    logger = logging.getLogger(__name__)
+    logger = logging.getLogger(__package__ or __name__)
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
     if verbose:
         handler = logging.StreamHandler()
         logger.setLevel(logging.DEBUG)
@@ -158,18 +463,33 @@ def is_response_successful(status_code: int) -> bool:
         return False
 
 
-def get_response(source: str) -> requests.models.Response or None:
+def is_response_not_modified(status_code: int) -> bool:
+    """
+    Gets the status code and checks if the server answered that the feed was not modified.
+
+    :param status_code : int
+        status code of the received response from the server
+
+    :return bool
+        True if the status code is '304 Not Modified'
+    """
+    return status_code == 304
+
+
+def get_response(source: str, headers: dict = None) -> requests.models.Response or None:
     """
     Gets url, send GET request and stores in variable 'response'.
 
     :param source : str
         the 'source' parameter from the command line
+    :param headers : dict
+        additional headers of the request, e.g. 'If-None-Match' and 'If-Modified-Since'
 
     :return response : requests.models.Response
-        retrieved data from the server
+        retrieved data from the server or '304 Not Modified' response
 
     :return None
-        if it is impossible to connect to the server
+        if it is impossible to connect to the server in time or the host is skipped
 
     :return None
         if response status code is not valid
@@ -177,17 +497,28 @@ def get_response(source: str) -> requests.models.Response or None:
     :raise requests.exceptions.MissingSchema
         an error if 'source' is incorrect url
     """
+    import requests
+    from rss_reader.fetch import FetchError
+
     log.info(f"Getting data from '{source}'")
     try:
-        response = requests.get(source)
+        with profile_stage("fetch"):
+            response = get_fetch_policy().get(source, get_session().get, headers=headers, stream=True)
     except requests.exceptions.MissingSchema as exc:
         log.error("Exception occurred 'requests.exceptions.MissingSchema'")
         raise exc
-    except requests.exceptions.ConnectionError:
-        log.error("Exception occurred 'requests.exceptions.ConnectionError'")
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+        log.error(f"Exception occurred 'requests.exceptions.{type(exc).__name__}'")
         print(requests.exceptions.ConnectionError("Failed to establish connection"))
         return
+    except FetchError as exc:
+        print(exc)
+        return
+    if is_response_not_modified(response.status_code):
+        log.info(f"'{source}' was not modified since the last request")
+        return response
     if not is_response_successful(response.status_code):
+        response.close()
         log.error("Exception occurred 'requests.exceptions.HTTPError'")
         print(requests.exceptions.HTTPError(
             f"Request was not successfully processed. Status code = '{response.status_code}'"
@@ -196,6 +527,95 @@ def get_response(source: str) -> requests.models.Response or None:
     return response
 
 
+def get_fetch_policy():
+    """
+    Returns the policy of network requests of the run, the default policy is created
+    if it was not set by the command line.
+
+    :return FetchPolicy
+        timeouts, retries and circuit breakers of requests
+    """
+    global fetch_policy
+    with _fetch_policy_lock:
+        if fetch_policy is None:
+            from rss_reader.fetch import FetchPolicy
+
+            fetch_policy = FetchPolicy()
+        return fetch_policy
+
+
+def get_session():
+    """
+    Returns the session shared by all network requests of the process, so connections
+    to the same hosts are reused. The session is created on the first request.
+
+    :return requests.Session
+        the session with pools of connections
+    """
+    global session
+    with _session_lock:
+        if session is None:
+            from rss_reader.transport import create_session
+
+            session = create_session(host_connections)
+        return session
+
+
+def profile_stage(name: str, calls: int = 1):
+    """
+    Returns the context manager which measures the stage if the run is profiled.
+
+    :param name : str
+        name of the stage, e.g. 'fetch' or 'parse'
+    :param calls : int
+        number of calls added to the stage, 0 for parts of one call
+
+    :return contextlib.AbstractContextManager
+        the stage of the profiler or the context manager which does nothing
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, calls)
+
+
+def add_to_counter(name: str, value: int = 1):
+    """
+    Adds the value to the counter of the profiler if the run is profiled.
+
+    :param name : str
+        name of the counter, e.g. 'items_parsed'
+    :param value : int
+        value added to the counter
+    """
+    if profiler is not None:
+        profiler.add(name, value)
+
+
+def count_bytes(chunks, counter: str, stage: str = None):
+    """
+    Yields chunks and adds their sizes to the counter of the profiler.
+    If the stage is specified, reading of every chunk is measured as a part of it.
+
+    :param chunks : iterable
+        chunks of raw bytes
+    :param counter : str
+        name of the counter
+    :param stage : str or None
+        name of the stage of reading, e.g. 'fetch'
+
+    :return generator
+        the same chunks
+    """
+    chunks = iter(chunks)
+    while True:
+        with profile_stage(stage, 0) if stage else contextlib.nullcontext():
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        add_to_counter(counter, len(chunk))
+        yield chunk
+
+
 def get_directory(source: str) -> str:
     """
     Gets url to extract the site name.
@@ -230,6 +650,23 @@ def get_filename(directory: str, date: str) -> str:
     return filename
 
 
+def has_cached_news(directory: str, filename: str) -> bool:
+    """
+    Gets the directory name and the filename and checks if there are cached news.
+
+    :param directory : str
+        the name of the directory of cache files
+    :param filename : str
+        filename which consists of directory name and date
+
+    :return bool
+        True if there are cached news
+    """
+    if store is not None:
+        return store.has_day(directory, filename[len(directory) + 1:])
+    return os.path.exists(os.path.join("cache", directory, f"{filename}.json"))
+
+
 def is_file(directory: str, filename: str):
     """
     Gets the directory name and the filename and checks for file existence.
@@ -243,483 +680,1475 @@ def is_file(directory: str, filename: str):
         an error if the file doesn't exist
     """
     log.info(f"Checking if there is cache file '{filename}'")
-    if not os.path.exists(os.path.join("cache", directory, f"{filename}.json")):
+    if not has_cached_news(directory, filename):
         log.error("Exception occurred 'FileNotFoundError'")
         raise FileNotFoundError(f"There is no cache news for '{filename}'")
 
 
-def get_soup(response: requests.models.Response) -> BeautifulSoup:
+def set_file_mode(path: str):
     """
-    Gets the response and create the soup with BeautifulSoup and 'lxml-xml' parser.
-
-    :param response : requests.models.Response
-        retrieved data from the server
+    Sets the mode of files created by 'open' to the temporary file, which is created
+    with the mode '0600', so cache files replaced by it are readable by other users.
 
-    :return BeautifulSoup
-        an 'BeautifulSoup' object obtained by parsing 'response.text'
+    :param path : str
+        path to the temporary file
     """
-    log.info("Creating soup with 'lxml-xml'")
-    return BeautifulSoup(response.text, "lxml-xml")
+    os.chmod(path, 0o666 & ~UMASK)
 
 
-def is_rss(soup: BeautifulSoup):
+def get_backend_path(directory: str, filename: str) -> str:
     """
-    Gets the 'BeautifulSoup' object and looking for the 'rss' tag.
+    Returns path to the file of the directory of cache files which belongs to the used cache backend,
+    so news cached by one backend are not taken as cached by another one.
 
-    :param soup : BeautifulSoup
-        an 'BeautifulSoup' object obtained by parsing 'response.text'
+    :param directory : str
+        the name of the directory of cache files
+    :param filename : str
+        name of the file for json files, e.g. 'seen.txt'
 
-    :raise requests.exceptions.InvalidURL
-        if soup does not contain 'RSS' tag
+    :return str
+        'cache/<directory>/<filename>' for json files or 'cache/<directory>/<name>_<backend>.<extension>'
+        for the store
     """
-    log.info("Checking if soup contains 'RSS'")
-    if not bool(soup.find("rss")):
-        log.error("Exception occurred 'requests.exceptions.InvalidURL'")
-        raise requests.exceptions.InvalidURL("Source does not contain web feed RSS")
+    if store is not None:
+        name, extension = os.path.splitext(filename)
+        filename = f"{name}_{store.name}{extension}"
+    return os.path.join("cache", directory, filename)
 
 
-def get_items(soup: BeautifulSoup) -> list:
+def get_validators(directory: str, source: str) -> dict:
     """
-    Gets the 'BeautifulSoup' object and searches all the item tags.
+    Reads validators 'ETag' and 'Last-Modified' saved for the source.
 
-    :param soup : BeautifulSoup
-        an 'BeautifulSoup' object obtained by parsing 'response.text'
+    :param directory : str
+        the name of the directory of cache files
+    :param source : str
+        url of source of rss news
 
-    :return list
-        list of objects 'element.Tag' selected by the 'item' tag
+    :return dict
+        saved validators and feed title or empty dictionary
     """
-    log.info("Getting items from soup")
-    return soup.find_all("item")
-
+    log.info(f"Getting validators for '{source}'")
+    path = get_backend_path(directory, "validators.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as json_file:
+        return json.load(json_file).get(source, {})
+
+
+def save_validators(
+        directory: str, source: str, response: requests.models.Response, title: str, news: list = None,
+        schedule: dict = None, truncated: bool = False
+):
+    """
+    Saves validators 'ETag' and 'Last-Modified' of the response, the feed title, the news
+    and the schedule of the feed to 'validators.json' of the cache backend in the directory of cache files.
+    The news are returned when the server answers that the feed was not modified.
+    Validators of the truncated feed are not saved, so the next request gets the whole feed
+    instead of '304 Not Modified'. The file is written to a temporary file first and then replaced.
 
-class Novelty:
+    :param directory : str
+        the name of the directory of cache files
+    :param source : str
+        url of source of rss news
+    :param response : requests.models.Response
+        retrieved data from the server
+    :param title : str
+        news feed title
+    :param news : list
+        a list of 'Novelty' objects of the feed
+    :param schedule : dict
+        'ttl', 'skipHours' and 'skipDays' of the feed
+    :param truncated : bool
+        True if reading of the feed stopped at the limit
     """
-    A class to represent one news item.
+    log.info(f"Saving validators for '{source}'")
+    path = get_backend_path(directory, "validators.json")
+    validators = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as json_file:
+            validators = json.load(json_file)
+    validators[source] = {
+        "etag": None if truncated else response.headers.get("ETag"),
+        "last_modified": None if truncated else response.headers.get("Last-Modified"),
+        "title": title,
+        "news": [dict(one_news) for one_news in news or []],
+        "schedule": schedule or {},
+    }
+    with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path), suffix=".part", delete=False, encoding="utf-8"
+    ) as json_file:
+        json.dump(validators, json_file, ensure_ascii=True, indent=4)
+    set_file_mode(json_file.name)
+    os.replace(json_file.name, path)
+
+
+def get_conditional_headers(validators: dict) -> dict:
+    """
+    Creates headers of the conditional request from saved validators.
 
-    Attributes
-    ----------
-    item=None : element.Tag
-        object 'element.Tag' obtained from the soup by the 'item' tag
+    :param validators : dict
+        saved validators of the source
 
-    kwargs : dict
-        dictionary of one news received from cache
+    :return headers : dict
+        'If-None-Match' and 'If-Modified-Since' headers if validators are known
+    """
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
 
-    Methods
-    -------
-    def scrape_date(self):
-        Scrapes the news release date.
 
-    def scrape_title(self):
-        Scrapes the news title.
+def get_manifest_path() -> str:
+    """
+    Returns path to the manifest of the used cache backend.
+
+    :return str
+        'cache/manifest.json' for json files or 'cache/manifest_<backend>.json' for the store
+    """
+    if store is not None:
+        return os.path.join("cache", f"manifest_{store.name}.json")
+    return MANIFEST_PATH
 
-    def scrape_source(self):
-        Scrapes the source of news.
 
-    def scrape_category(self):
-        Scrapes the news category.
+def build_manifest() -> dict:
+    """
+    Creates the manifest from cache files of all directories or from the store.
+    It's used once, when there is cache but no manifest yet.
 
-    def scrape_link(self):
-        Scrapes the news link.
+    :return manifest : dict
+        dictionary with keys – dates and values – dictionaries with keys – names
+        of cache directories and values – number of news and location of the cache file
+    """
+    log.info("Creating manifest from cache")
+    if store is not None:
+        counts = store.get_counts()
+    else:
+        counts = {}
+        for directory in os.listdir("cache"):
+            path = os.path.join("cache", directory)
+            if not os.path.isdir(path):
+                continue
+            pattern = re.compile(re.escape(directory) + r"_(\d{8})\.json")
+            for filename in os.listdir(path):
+                match = pattern.fullmatch(filename)
+                if match:
+                    with open(os.path.join(path, filename), "r") as json_file:
+                        counts.setdefault(match.group(1), {})[directory] = len(json.load(json_file))
+    return {
+        date: {
+            directory: {"count": count, "location": get_location(directory, date)}
+            for directory, count in directories.items()
+        }
+        for date, directories in counts.items()
+    }
 
-    def scrape_enclosure(self):
-        Scrapes the news enclosure.
 
-    def scrape_description(self):
-        Scrapes the news description.
+def create_manifest():
+    """
+    Creates the manifest from cache if there is cache but no manifest yet.
+    It's called before news are cached, so new news are not counted twice.
+    """
+    with _manifest_lock:
+        if os.path.isdir("cache") and not os.path.exists(get_manifest_path()):
+            save_manifest(build_manifest())
 
-    def scrape_links(self):
-        Scrapes the news links.
 
-    def create_dictionary(self):
-        Creates a dictionary based on scraped data.
+def get_manifest() -> dict:
     """
-    def __init__(self, item=None, **kwargs):
-        """
-        Constructs all attributes for the 'Novelty' object
-        based on 'element.Tag' object or 'dict' object
+    Reads the manifest of cached news.
+    If there is cache but no manifest, the manifest is created from cache.
 
-        :param item : element.Tag
-            object 'element.Tag' obtained from the soup by the 'item' tag
+    :return manifest : dict
+        dictionary with keys – dates and values – dictionaries with keys – names
+        of cache directories and values – number of news and location of the cache file
+    """
+    with _manifest_lock:
+        create_manifest()
+        if not os.path.exists(get_manifest_path()):
+            return {}
+        with open(get_manifest_path(), "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
 
-        :param kwargs : dict
-            dictionary of one news received from cache
-        """
-        if item:
-            self.item = item
-            self.date = self.scrape_date()
-            self.title = self.scrape_title()
-            self.source = self.scrape_source()
-            self.category = self.scrape_category()
-            self.link = self.scrape_link()
-            self.enclosure = self.scrape_enclosure()
-            self.description = self.scrape_description()
-            self.links = self.scrape_links()
-            self.dictionary = self.create_dictionary()
-        elif kwargs:
-            self.date = kwargs["date"]
-            self.title = kwargs["title"]
-            self.source = kwargs["source"]
-            self.category = kwargs["category"]
-            self.link = kwargs["link"]
-            self.enclosure = kwargs["enclosure"]
-            self.description = kwargs["description"]
-            self.links = kwargs["links"]
-            self.dictionary = kwargs
 
-    def __str__(self):
-        result = f"Title: {self.title}"
-        if self.source:
-            result += f"\nSource: {self.source}"
-        if self.date:
-            result += f"\nDate: {self.date}"
-        result += f"\nLink: {self.link}"
-        if self.category:
-            result += f"\nCategory: {self.category}"
-        if self.description:
-            result += f"\n\nDescription: {self.description}"
-        result += "\n\nLinks:"
-        for i, link in enumerate(self.links):
-            result += f"\n[{i + 1}]: {link}"
-        return result
+def save_manifest(manifest: dict):
+    """
+    Writes the manifest to a temporary file and replaces the manifest with it.
 
-    def scrape_date(self):
-        """
-        Scrapes the news release date.
+    :param manifest : dict
+        dictionary with keys – dates and values – dictionaries of cache directories
+    """
+    with tempfile.NamedTemporaryFile("w", dir="cache", suffix=".part", delete=False, encoding="utf-8") as json_file:
+        json.dump(manifest, json_file, ensure_ascii=True, indent=4, sort_keys=True)
+        add_to_counter("cache_bytes_written", json_file.tell())
+    set_file_mode(json_file.name)
+    os.replace(json_file.name, get_manifest_path())
 
-        :return str
-            if 'element.Tag' object contain 'pubDate' tag
-        :return None
-            if 'element.Tag' does not contain 'pubDate' tag
-        """
-        date = self.item.find("pubDate")
-        if date:
-            return date.text
-        return
 
-    def scrape_title(self):
-        """
-        Scrapes the news title.
+def update_manifest(directory: str, counts: dict):
+    """
+    Adds numbers of news added to the cache of the directory to the manifest.
 
-        :return str
-            if 'element.Tag' object contain 'title' tag
-        :return None
-            if 'element.Tag' does not contain 'title' tag
-        """
-        title = self.item.find("title")
-        if title:
-            return title.text
+    :param directory : str
+        the name of the directory of cache files
+    :param counts : dict
+        dictionary with keys – dates and values – numbers of added news
+    """
+    counts = {date: count for date, count in counts.items() if count}
+    if not counts:
         return
+    log.info(f"Updating manifest for '{directory}'")
+    with _manifest_lock:
+        manifest = get_manifest()
+        for date, count in counts.items():
+            entry = manifest.setdefault(date, {}).setdefault(directory, {"count": 0})
+            entry["count"] += count
+            entry["location"] = get_location(directory, date)
+        save_manifest(manifest)
 
-    def scrape_source(self):
-        """
-        Scrapes the source of news.
 
-        :return str
-            if 'element.Tag' object contain 'source' tag
-        :return None
-            if 'element.Tag' does not contain 'source' tag
-        """
-        source = self.item.find("source")
-        if source:
-            return source.text
-        return
+def get_location(directory: str, date: str) -> str:
+    """
+    Returns location of cached news of the directory for the date.
 
-    def scrape_category(self):
-        """
-        Scrapes the news category.
+    :param directory : str
+        the name of the directory of cache files
+    :param date : str
+        the date in '%Y%m%d' format
 
-        :return str
-            if 'element.Tag' object contain 'category' tag
-        :return None
-            if 'element.Tag' does not contain 'category' tag
-        """
-        category = self.item.find("category")
-        if category:
-            return category.text
-        return
+    :return str
+        path to the cache file, the segments directory or the database
+    """
+    if store is not None:
+        return store.get_location(directory, date)
+    return os.path.join("cache", directory, f"{get_filename(directory, date)}.json")
 
-    def scrape_link(self):
-        """
-        Scrapes the news link.
 
-        :return str
-            if 'element.Tag' object contain 'link' tag
-        :return None
-            if 'element.Tag' does not contain 'link' tag
-        """
-        link = self.item.find("link")
-        if link:
-            return link.text
-        return
+def get_days(manifest: dict, date_from: str or None, date_to: str or None) -> list:
+    """
+    Returns days of the manifest which are in the range, the latest day first.
 
-    def scrape_enclosure(self):
-        """
-        Scrapes the news enclosure.
+    :param manifest : dict
+        dictionary with keys – dates and values – dictionaries of cache directories
+    :param date_from : str or None
+        the first day of the range, the range is not limited if it is None
+    :param date_to : str or None
+        the last day of the range, the range is not limited if it is None
 
-        :return str
-            if 'element.Tag' object contain 'enclosure' tag
-            or 'media:content' tag or 'media:thumbnail' tag
-        :return None
-            if 'element.Tag' object does not contain 'enclosure' tag
-            or 'media:content' tag or 'media:thumbnail' tag
-        """
-        tag_names = ["enclosure", "media:content", "media:thumbnail"]
-        for tag in tag_names:
-            if self.item.find(tag):
-                return self.item.find(tag)["url"]
-        return
+    :return list
+        days in '%Y%m%d' format
+    """
+    return sorted(
+        (day for day in manifest if (not date_from or day >= date_from) and (not date_to or day <= date_to)),
+        reverse=True,
+    )
 
-    def scrape_description(self):
-        """
-        Scrapes the news description.
 
-        :return str
-            if 'element.Tag' object contain 'description' tag
-        :return None
-            if 'element.Tag' does not contain 'description' tag
-        """
-        description = self.item.find("description")
-        if description:
-            description = BeautifulSoup(description.text, "lxml")
-            return description.get_text("\n", strip=True)
-        return
+def iter_cached_news(directory: str, days: list, limit: int = None):
+    """
+    Yields cached news of the directory day by day, the latest news first.
+    Days are read one at a time and reading stops once the limit is reached.
+    News of the store are read lazily.
 
-    def scrape_links(self):
-        """
-        Scrapes the news links.
+    :param directory : str
+        the name of the directory of cache files
+    :param days : list
+        days in '%Y%m%d' format, the latest day first
+    :param limit : int or None
+        maximum number of news
 
-        :return links_list : list
-            list of urls contained in url parameters
-        """
-        links_list = [self.link]
-        for tag in self.item.find_all(url=True):
-            links_list.append(tag["url"])
-        return links_list
+    :return generator
+        deserialized dictionaries of news
+    """
+    count = 0
+    for day in days:
+        if store is not None:
+            dictionaries = store.iter_day(directory, day)
+        else:
+            dictionaries = get_cached_news(directory, get_filename(directory, day))
+        for dictionary in dictionaries:
+            if limit is not None and count >= limit:
+                return
+            yield dictionary
+            count += 1
 
-    def create_dictionary(self):
-        """
-        Creates a dictionary based on scraped data.
+
+def iter_news(dictionaries):
+    """
+    Creates 'Novelty' objects from news dictionaries one at a time.
+
+    :param dictionaries : iterable
+        parsed or cached news dictionaries
+
+    :return generator
+        'Novelty' objects
+    """
+    for dictionary in dictionaries:
+        yield Novelty(**dictionary)
+
+
+def print_dates(json_print: bool):
+    """
+    Prints dates of cached news with number of feeds and news from the manifest.
+
+    :param json_print : bool
+        print result as JSON in stdout
+    """
+    log.info("Printing dates of cached news")
+    manifest = get_manifest()
+    dates = [
+        {
+            "date": date,
+            "feeds": len(manifest[date]),
+            "news": sum(entry["count"] for entry in manifest[date].values()),
+        }
+        for date in sorted(manifest, reverse=True)
+    ]
+    if json_print:
+        print(json.dumps(dates, ensure_ascii=False, indent=4))
+    elif not dates:
+        print("There is no cached news")
+    else:
+        for date in dates:
+            print(f"{date['date']}: {date['news']} news from {date['feeds']} feeds")
+
+
+def strip_html(html: str) -> str:
+    """
+    Gets the html markup and returns its text, each string on a separate line,
+    without building the soup. Markup with a doctype declaration is passed
+    to BeautifulSoup, which splits strings around it. Strings inside 'script', 'style', 'template', 'rt'
+    and 'rp' tags, comments and processing instructions are skipped
+    like 'BeautifulSoup.get_text' does.
+
+    :param html : str
+        html markup, e.g. the text of 'description' tag
+
+    :return str
+        text of the markup without tags
+    """
+    if DOCTYPE_PATTERN.search(html):
+        from bs4 import BeautifulSoup
+
+        return BeautifulSoup(html, "lxml").get_text("\n", strip=True)
+    parser = etree.HTMLParser()
+    parser.feed(html)
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        return ""
+    if root is None:
+        return ""
+    strings = []
+    top_level = [*reversed(list(root.itersiblings(preceding=True))), root, *root.itersiblings()]
+    stack = [(node, False) for node in reversed(top_level)]
+    while stack:
+        node, skipped = stack.pop()
+        if node is None:
+            if skipped.tail:
+                strings.append(skipped.tail)
+            continue
+        is_tag = isinstance(node.tag, str)
+        is_skipped = skipped or is_tag and node.tag in SKIPPED_TEXT_TAGS
+        if is_tag and node.text and not is_skipped:
+            strings.append(node.text)
+        if not skipped:
+            stack.append((None, node))
+        stack.extend((child, is_skipped) for child in reversed(node))
+    return "\n".join(string.strip() for string in strings if string.strip())
+
+
+def html_to_text(html: str) -> str:
+    """
+    Gets the html markup and returns its text, each string on a separate line.
+    Results are memoized by the hash of the markup, because feeds often repeat
+    the same descriptions.
+
+    :param html : str
+        html markup, e.g. the text of 'description' tag
+
+    :return str
+        text of the markup without tags
+    """
+    key = hashlib.md5(html.encode("utf-8", "surrogatepass")).digest()
+    with _description_cache_lock:
+        if key in _description_cache:
+            _description_cache.move_to_end(key)
+            return _description_cache[key]
+    text = strip_html(html)
+    with _description_cache_lock:
+        _description_cache[key] = text
+        if len(_description_cache) > DESCRIPTION_CACHE_SIZE:
+            _description_cache.popitem(last=False)
+    return text
+
+
+ENCLOSURE_TAGS = ("enclosure", "media:content", "media:thumbnail")
+
+
+def scrape_elements(elements, get_text) -> dict:
+    """
+    Scrapes all data of one news in a single pass over the elements of the item.
+    The first element with the name is used, like 'find' of BeautifulSoup does.
+
+    :param elements : iterable
+        tuples (name, prefix, element) of all elements of the item in document order
+    :param get_text : function
+        returns the text of the element with all its descendants
+
+    :return dictionary : dict
+        dictionary with the same keys as 'Novelty.dictionary' and the 'guid' of the item
+    """
+    texts = {}
+    enclosures = {}
+    urls = []
+    for name, prefix, elem in elements:
+        if name not in texts:
+            texts[name] = elem
+        prefixed_name = f"{prefix}:{name}" if prefix else name
+        if prefixed_name in ENCLOSURE_TAGS and prefixed_name not in enclosures:
+            enclosures[prefixed_name] = elem.get("url")
+        if elem.get("url") is not None:
+            urls.append(elem.get("url"))
+    fields = {
+        key: get_text(texts[name]) if name in texts else None
+        for key, name in (("date", "pubDate"), ("title", "title"), ("source", "source"),
+                          ("category", "category"), ("link", "link"), ("description", "description"),
+                          ("guid", "guid"))
+    }
+    return {
+        "date": fields["date"],
+        "title": fields["title"],
+        "source": fields["source"],
+        "category": fields["category"],
+        "link": fields["link"],
+        "enclosure": next((enclosures[tag] for tag in ENCLOSURE_TAGS if tag in enclosures), None),
+        "description": html_to_text(fields["description"]) if fields["description"] is not None else None,
+        "links": [fields["link"]] + urls,
+        "guid": fields["guid"],
+    }
+
+
+class StreamParser:
+    """
+    A class to parse the feed incrementally from chunks of raw bytes.
+
+    Items are yielded as soon as their closing tag is read, the parsed elements
+    are freed right after use, and reading stops once the limit is reached.
+
+    Attributes
+    ----------
+    chunks : iterable
+        chunks of raw bytes of the feed
+
+    limit=None : int
+        maximum number of items to parse
+
+    seen=None : set
+        identities of already cached news, such items are not scraped
+
+    known_run=3 : int
+        number of known items in a row after which reading stops
+
+    title : str
+        news feed title, available after the channel title is parsed
+
+    skipped : int
+        number of known items which were not scraped
+
+    ttl : int
+        number of minutes the feed may be cached, available after 'ttl' is parsed
+
+    skip_hours : list
+        hours (GMT) when the feed should not be read, available after 'skipHours' is parsed
+
+    skip_days : list
+        days when the feed should not be read, available after 'skipDays' is parsed
+
+    Methods
+    -------
+    def schedule(self):
+        Returns 'ttl', 'skipHours' and 'skipDays' of the feed.
+
+    def get_identities(item):
+        Returns guid and link of the item without scraping it.
+
+    def scrape_element(element):
+        Scrapes all data of one item in a single pass over its elements.
+    """
+    def __init__(self, chunks, limit=None, seen=None, known_run=3):
+        """
+        Constructs all attributes for the 'StreamParser' object.
+
+        :param chunks : iterable
+            chunks of raw bytes of the feed
+        :param limit : int
+            maximum number of items to parse
+        :param seen : set
+            identities of already cached news
+        :param known_run : int
+            number of known items in a row after which reading stops
+        """
+        self.chunks = chunks
+        self.limit = limit
+        self.seen = seen
+        self.known_run = known_run
+        self.title = None
+        self.skipped = 0
+        self.ttl = None
+        self.skip_hours = []
+        self.skip_days = []
+
+    @property
+    def schedule(self) -> dict:
+        """
+        Returns 'ttl', 'skipHours' and 'skipDays' of the feed parsed so far.
+
+        :return dict
+            dictionary with 'ttl', 'skip_hours' and 'skip_days' keys
+        """
+        return {"ttl": self.ttl, "skip_hours": self.skip_hours, "skip_days": self.skip_days}
+
+    def __iter__(self):
+        """
+        Reads chunks and yields dictionaries of parsed items.
+
+        :raise requests.exceptions.InvalidURL
+            if the root element of the feed is not 'rss'
+        """
+        import requests
+
+        if self.limit is not None and self.limit <= 0:
+            return
+        parser = etree.XMLPullParser(events=("start", "end"), recover=True, resolve_entities=False, huge_tree=True)
+        count = 0
+        known_in_row = 0
+        is_root = True
+        for chunk in self.chunks:
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if is_root:
+                    is_root = False
+                    if not isinstance(elem.tag, str) or etree.QName(elem).localname != "rss":
+                        log.error("Exception occurred 'requests.exceptions.InvalidURL'")
+                        raise requests.exceptions.InvalidURL("Source does not contain web feed RSS")
+                if event != "end" or not isinstance(elem.tag, str):
+                    continue
+                localname = etree.QName(elem).localname
+                if localname == "title" and self.title is None:
+                    parent = elem.getparent()
+                    if parent is not None and etree.QName(parent).localname == "channel":
+                        self.title = "".join(elem.itertext())
+                elif localname == "ttl":
+                    ttl = "".join(elem.itertext()).strip()
+                    self.ttl = int(ttl) if ttl.isdigit() else None
+                elif localname == "skipHours":
+                    self.skip_hours = [
+                        int(text) for text in (
+                            "".join(hour.itertext()).strip() for hour in elem if isinstance(hour.tag, str)
+                        ) if text.isdigit()
+                    ]
+                elif localname == "skipDays":
+                    self.skip_days = [
+                        "".join(day.itertext()).strip().capitalize() for day in elem if isinstance(day.tag, str)
+                    ]
+                elif localname == "item":
+                    if self.seen and any(identity in self.seen for identity in self.get_identities(elem) if identity):
+                        self.skipped += 1
+                        known_in_row += 1
+                    else:
+                        yield self.scrape_element(elem)
+                        count += 1
+                        known_in_row = 0
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+                    if self.limit is not None and count >= self.limit:
+                        log.info(f"Limit of {self.limit} items is reached, stopping parsing")
+                        return
+                    if known_in_row >= self.known_run:
+                        log.info(f"{known_in_row} known items in a row are reached, stopping parsing")
+                        return
+        if is_root:
+            log.error("Exception occurred 'requests.exceptions.InvalidURL'")
+            raise requests.exceptions.InvalidURL("Source does not contain web feed RSS")
+
+    @staticmethod
+    def get_identities(item) -> tuple:
+        """
+        Returns guid and link of the item without scraping it.
+
+        :param item : etree.Element
+            parsed 'item' element
+
+        :return (guid : str, link : str)
+            texts of the first 'guid' and 'link' elements or None
+        """
+        guid = link = None
+        for elem in item.iterdescendants():
+            if not isinstance(elem.tag, str):
+                continue
+            localname = etree.QName(elem).localname
+            if localname == "guid" and guid is None:
+                guid = "".join(elem.itertext())
+            elif localname == "link" and link is None:
+                link = "".join(elem.itertext())
+        return guid, link
+
+    @staticmethod
+    def scrape_element(item) -> dict:
+        """
+        Scrapes all data of one item in a single pass over its elements.
+
+        :param item : etree.Element
+            parsed 'item' element
 
         :return dictionary : dict
-            dictionary with all scraped data from the 'element.Tag' object
+            dictionary with the same keys as 'Novelty.dictionary' and the 'guid' of the item
         """
-        dictionary = {
-            "date": self.date,
-            "title": self.title,
-            "source": self.source,
-            "category": self.category,
-            "link": self.link,
-            "enclosure": self.enclosure,
-            "description": self.description,
-            "links": self.links,
-        }
-        return dictionary
+        elements = (
+            (etree.QName(elem).localname, elem.prefix, elem)
+            for elem in item.iterdescendants() if isinstance(elem.tag, str)
+        )
+        return scrape_elements(elements, lambda elem: "".join(elem.itertext()))
+
+
+class Novelty:
+    """
+    A class to represent one news item.
+
+    Fields are stored in slots and are also available by key,
+    like in the dictionary of one news. The 'guid' of the item
+    is kept to identify the news, but it is not a part of the dictionary.
+
+    Attributes
+    ----------
+    kwargs : dict
+        dictionary of one news parsed from the feed or received from cache
+
+    Methods
+    -------
+    def keys(self):
+        Returns names of the fields.
+
+    def dictionary(self):
+        Creates a dictionary based on the fields.
+    """
+    fields = ("date", "title", "source", "category", "link", "enclosure", "description", "links")
+    __slots__ = fields + ("guid",)
+
+    def __init__(self, **kwargs):
+        """
+        Constructs all attributes for the 'Novelty' object based on 'dict' object.
+        Missing fields are None.
+
+        :param kwargs : dict
+            dictionary of one news parsed from the feed or received from cache
+        """
+        for field in self.__slots__:
+            setattr(self, field, kwargs.get(field))
+
+    def __str__(self):
+        result = f"Title: {self.title}"
+        if self.source:
+            result += f"\nSource: {self.source}"
+        if self.date:
+            result += f"\nDate: {self.date}"
+        result += f"\nLink: {self.link}"
+        if self.category:
+            result += f"\nCategory: {self.category}"
+        if self.description:
+            result += f"\n\nDescription: {self.description}"
+        result += "\n\nLinks:"
+        for i, link in enumerate(self.links):
+            result += f"\n[{i + 1}]: {link}"
+        return result
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def keys(self):
+        """
+        Returns names of the fields.
+
+        :return tuple
+            names of the fields in the order of the dictionary of one news
+        """
+        return self.fields
+
+    @property
+    def dictionary(self):
+        """
+        Creates a dictionary based on the fields.
+
+        :return dictionary : dict
+            dictionary with all data of the news
+        """
+        return {field: getattr(self, field) for field in self.fields}
 
 
 def create_news(objects_list: list) -> list:
     """
-    Gets a list of 'element.Tag' objects and creates a list of 'Novelty' objects.
+    Gets a list of news dictionaries and creates a list of 'Novelty' objects.
 
     :param objects_list : list
-        list of novelty objects or a list of cached news dictionaries
+        list of parsed or cached news dictionaries
 
     :return news : list
         a list of 'Novelty' objects
     """
     log.info("Creating list of Novelty objects")
-    news = []
-    if isinstance(objects_list[0], element.Tag):
-        for item in objects_list:
-            one_news = Novelty(item)
-            news.append(one_news)
-    elif isinstance(objects_list[0], dict):
-        for dct in objects_list:
-            one_news = Novelty(**dct)
-            news.append(one_news)
+    news = [Novelty(**dictionary) for dictionary in objects_list]
     log.info(f"Number of created objects: '{len(news)}'")
     return news
 
 
-def get_news(response: requests.models.Response) -> tuple[list, str]:
+def get_news(
+        response: requests.models.Response, limit: int = None, seen: set = None
+) -> tuple[list, str, int, dict]:
     """
-    Gets a response and calls a function to check the status code and
-    calls the function to check if the response contains 'rss' tag.
+    Gets a response and parses the feed incrementally while its body is read.
+    Reading stops once the limit is reached or after a run of already cached news.
+    Already cached news are not scraped.
 
     :param response : requests.models.Response
         retrieved data from the server
+    :param limit : int or None
+        maximum number of news to parse
+    :param seen : set or None
+        identities of cached news
+
+    :return (list, title : str, skipped : int, schedule : dict)
+        a list of 'Novelty' objects, string with the title of feed, number
+        of items which were skipped as already cached and 'ttl', 'skipHours'
+        and 'skipDays' of the feed
 
-    :return (list, title : str)
-        a list of 'Novelty' objects and string with the title of feed
+    :raise requests.exceptions.InvalidURL
+        if the response does not contain 'rss' tag
     """
     log.info("Creating news if the response contains 'RSS' tag")
-    soup = get_soup(response)
-    is_rss(soup)
-    items = get_items(soup)
-    title = soup.find('title').text
-    return create_news(items), title
+    chunks = response.iter_content(chunk_size=FEED_CHUNK_SIZE)
+    parser = StreamParser(count_bytes(chunks, "feed_bytes_fetched", "fetch"), limit, seen)
+    try:
+        with profile_stage("parse"):
+            items = list(parser)
+    finally:
+        response.close()
+    add_to_counter("items_parsed", len(items))
+    if parser.skipped:
+        log.info(f"Number of skipped cached news – {parser.skipped}")
+    return create_news(items), parser.title or "", parser.skipped, parser.schedule
 
 
-def get_date_format(one_news: Novelty) -> str:
+def parse_rfc_822(date_string: str) -> str or None:
     """
-    Gets a scraped string of news publication date and specifies its format.
-
-    :param one_news : Novelty
-        object of class "Novelty"
+    Gets the date in RFC 822 format, e.g. 'Sat, 30 Oct 2021 09:05:17 +0300', and returns its day.
 
-    :return date_format : str
-        if the date format matches one of three known
+    :param date_string : str
+        scraped string of news publication date
 
-    :raise ValueError
-        an error if the date format does not match one of three known
+    :return str
+        the day in '%Y%m%d' format
+    :return None
+        if the date is not in RFC 822 format
     """
-    log.info("Defining date format of news")
-    date_string = one_news.dictionary["date"]
+    match = RFC_822_PATTERN.match(date_string)
+    if not match or match.group(2).lower() not in MONTHS:
+        return
+    day, month, year = int(match.group(1)), MONTHS[match.group(2).lower()], int(match.group(3))
     try:
-        date_format = "%a, %d %b %Y %H:%M:%S %z"
-        dt.datetime.strptime(date_string, date_format)
-        return date_format
+        dt.date(year, month, day)
     except ValueError:
-        pass
+        return
+    return f"{year:04d}{month:02d}{day:02d}"
+
+
+def parse_iso_8601(date_string: str) -> str or None:
+    """
+    Gets the date in ISO 8601 format, e.g. '2021-10-27T15:36:51Z', and returns its day.
+
+    :param date_string : str
+        scraped string of news publication date
+
+    :return str
+        the day in '%Y%m%d' format
+    :return None
+        if the date is not in ISO 8601 format
+    """
+    match = ISO_8601_PATTERN.match(date_string)
+    if not match:
+        return
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3))
     try:
-        date_format = "%a, %d %b %Y %H:%M:%S %Z"
-        dt.datetime.strptime(date_string, date_format)
-        return date_format
+        dt.date(year, month, day)
     except ValueError:
-        pass
-    try:
-        date_format = "%Y-%m-%dT%H:%M:%SZ"
-        dt.datetime.strptime(date_string, date_format)
-        return date_format
-    except ValueError as exc:
-        log.error("Exception occurred 'ValueError'")
-        raise exc
+        return
+    return f"{year:04d}{month:02d}{day:02d}"
+
+
+def parse_date_formats(date_string: str) -> str or None:
+    """
+    Gets the date and tries all known formats with 'strptime'.
+
+    :param date_string : str
+        scraped string of news publication date
+
+    :return str
+        the day in '%Y%m%d' format
+    :return None
+        if the date does not match any known format
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            return dt.datetime.strptime(date_string, date_format).strftime("%Y%m%d")
+        except ValueError:
+            pass
+
+
+class DateParser:
+    """
+    A class to get days of publication of news of one feed.
+
+    The format is detected for every date, the parser that matched the previous
+    date is tried first, so feeds with one format need a single attempt per date.
+
+    Attributes
+    ----------
+    parsers : tuple
+        functions which return the day of the date or None,
+        fast RFC 822 and ISO 8601 parsers go first
 
+    last : function
+        the parser that matched the previous date
 
-def create_news_dict(news: list) -> dict:
+    Methods
+    -------
+    def get_day(self, date_string):
+        Returns the day of the date in '%Y%m%d' format.
     """
-    Creates a dictionary with keys – dates and values – lists of dictionaries Novelty.dictionary.
+    parsers = (parse_rfc_822, parse_iso_8601, parse_date_formats)
+
+    def __init__(self):
+        """
+        Constructs all attributes for the 'DateParser' object.
+        """
+        self.last = self.parsers[0]
+
+    def get_day(self, date_string: str) -> str:
+        """
+        Returns the day of the date in '%Y%m%d' format.
+
+        :param date_string : str
+            scraped string of news publication date
+
+        :return str
+            the day in '%Y%m%d' format
+
+        :raise ValueError
+            an error if the date does not match any known format
+        """
+        day = self.last(date_string)
+        if day:
+            return day
+        for parser in self.parsers:
+            if parser is not self.last:
+                day = parser(date_string)
+                if day:
+                    self.last = parser
+                    return day
+        raise ValueError(f"time data '{date_string}' does not match any known format")
+
+
+def get_date_parser(directory: str) -> DateParser:
+    """
+    Returns the date parser of the feed, parsers are kept between calls.
+
+    :param directory : str
+        the name of the directory of cache files
+
+    :return DateParser
+        the date parser of the feed
+    """
+    with _date_parsers_lock:
+        return _date_parsers.setdefault(directory, DateParser())
+
+
+def create_news_dict(news: list, date_parser: DateParser = None) -> dict:
+    """
+    Creates a dictionary with keys – dates and values – lists of 'Novelty' objects
+    in a single pass over the news. News without a date or with a date
+    of unknown format are skipped.
 
     :param news : list
         a list of 'Novelty' objects
+    :param date_parser : DateParser
+        the date parser of the feed
 
     :return news_dict : dict
         dictionary of dictionaries sorted by date
     """
     log.info("Creating dictionary with news sorted by date")
     news_dict = {}
-    date_format = get_date_format(news[0])
+    date_parser = date_parser or DateParser()
     for one_news in news:
-        date = dt.datetime.strptime(one_news.dictionary["date"], date_format)
+        if not one_news.date:
+            log.error(f"News '{one_news.title}' has no date, it can't be cached")
+            continue
         try:
-            news_dict[date.strftime("%Y%m%d")].append(one_news.dictionary)
-        except KeyError:
-            news_dict[date.strftime("%Y%m%d")] = [one_news.dictionary]
+            day = date_parser.get_day(one_news.date)
+        except ValueError as exc:
+            log.error(f"Exception occurred 'ValueError': {exc}")
+            continue
+        news_list = news_dict.get(day)
+        if news_list is None:
+            news_dict[day] = [one_news]
+        else:
+            news_list.append(one_news)
     return news_dict
 
 
-def cache_images(news: list, path: str, filename: str) -> list:
+def get_image_index() -> dict:
     """
-    Gets a list of 'Novelty' objects, path to the cache file, and name of the cache file.
-    If 'Novelty' object dictionary.["enclosure"] contains url, downloads the image,
-    determines its format and caches it. The path in the dictionary.["enclosure"]
-    changes to the path of saved file.
+    Reads the index of the shared image store once and keeps it in memory.
+    Each line of 'index.tsv' contains the url of the image and the path
+    to the file relative to the store.
+
+    :return dict
+        the index with urls as keys and relative paths to the files as values
+    """
+    index_path = os.path.abspath(os.path.join(IMAGES_DIRECTORY, "index.tsv"))
+    with _image_index_lock:
+        if index_path not in _image_indexes:
+            log.info("Reading index of the image store")
+            index = {}
+            if os.path.exists(index_path):
+                with open(index_path, "r", encoding="utf-8") as index_file:
+                    for line in index_file:
+                        url, _, relative_path = line.rstrip("\n").partition("\t")
+                        index[url] = relative_path
+            _image_indexes[index_path] = index
+        return _image_indexes[index_path]
+
+
+def add_to_image_index(url: str, relative_path: str):
+    """
+    Adds the url of the image to the index of the shared image store.
+
+    :param url : str
+        url of the image
+    :param relative_path : str
+        path to the file relative to the store
+    """
+    index = get_image_index()
+    with _image_index_lock:
+        index[url] = relative_path
+        with open(os.path.join(IMAGES_DIRECTORY, "index.tsv"), "a", encoding="utf-8") as index_file:
+            index_file.write(f"{url}\t{relative_path}\n")
+
+
+def download_image(url: str) -> str or None:
+    """
+    Downloads the image to the shared image store if the url is not in the index yet.
+    The body is streamed to a temporary file in chunks and hashed on the fly,
+    the file is named by the hash of the content, so identical images
+    from different urls are stored once.
+
+    :param url : str
+        url of the image
+
+    :return file_path : str
+        path to the file in the image store
+    :return None
+        if the url does not point to an image, the server answered with an error
+        or it is impossible to connect to the server in time
+    """
+    index = get_image_index()
+    if url in index and os.path.exists(os.path.join(IMAGES_DIRECTORY, index[url])):
+        log.info(f"Image '{url}' is already in the image store")
+        add_to_counter("images_skipped")
+        return os.path.join(os.getcwd(), IMAGES_DIRECTORY, index[url])
+    log.info(f"Downloading image '{url}'")
+    os.makedirs(IMAGES_DIRECTORY, exist_ok=True)
+    import requests
+    from rss_reader.fetch import FetchError
+
+    content_hash = hashlib.sha256()
+    try:
+        response = get_fetch_policy().get(url, get_session().get, stream=True)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, FetchError) as exc:
+        log.error(f"Image '{url}' was not downloaded. Exception occurred '{type(exc).__name__}'")
+        add_to_counter("images_failed")
+        return
+    with response:
+        if not response.ok:
+            log.error(f"Image '{url}' was not downloaded. Status code = '{response.status_code}'")
+            add_to_counter("images_failed")
+            return
+        image_format = re.findall(r"(?<=image/)\w+", response.headers.get("Content-Type", ""))
+        if not image_format:
+            log.error(f"'{url}' does not point to an image")
+            add_to_counter("images_failed")
+            return
+        with tempfile.NamedTemporaryFile(dir=IMAGES_DIRECTORY, suffix=".part", delete=False) as image:
+            temp_path = image.name
+            try:
+                for chunk in count_bytes(response.iter_content(chunk_size=IMAGE_CHUNK_SIZE), "image_bytes_fetched"):
+                    content_hash.update(chunk)
+                    image.write(chunk)
+            except BaseException:
+                image.close()
+                os.remove(temp_path)
+                raise
+    image_name = content_hash.hexdigest()
+    relative_path = os.path.join(image_name[:2], f"{image_name}.{image_format[0]}")
+    file_path = os.path.join(IMAGES_DIRECTORY, relative_path)
+    if os.path.exists(file_path):
+        log.info(f"Image '{url}' has the same content as '{relative_path}'")
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        set_file_mode(temp_path)
+        os.replace(temp_path, file_path)
+    add_to_image_index(url, relative_path)
+    add_to_counter("images_downloaded")
+    return os.path.join(os.getcwd(), file_path)
+
+
+def cache_images(news: list, workers: int = 4) -> list:
+    """
+    Gets a list of 'Novelty' objects. If 'Novelty' object dictionary.["enclosure"] contains url,
+    puts the image to the shared image store unless it is already there.
+    The path in the dictionary.["enclosure"] changes to the path of the file in the store.
+    Images are downloaded in a pool of threads.
 
     :param news : list
         a list of 'Novelty' objects
-    :param path : str
-        path to the cache file
-    :param filename : str
-        filename which consists of directory name or directory name and date
+    :param workers : int
+        maximum number of images downloaded at the same time
 
     :return news : list
         a list of 'Novelty' objects with modified paths
     """
     log.info("Caching images")
+    urls = list(dict.fromkeys(one_news["enclosure"] for one_news in news if one_news["enclosure"]))
+    if not urls:
+        return news
+    with profile_stage("images"), ThreadPoolExecutor(max_workers=min(workers, len(urls))) as executor:
+        file_paths = dict(zip(urls, executor.map(download_image, urls)))
     for one_news in news:
-        if one_news["enclosure"]:
-            url = one_news["enclosure"]
-            response = requests.get(url)
-            image_format = re.findall(r"(?<=image/)\w+", response.headers["Content-Type"])[0]
-            image_name = hashlib.md5(bytes(url, encoding="utf-8")).hexdigest()
-            directory_path = os.path.join(os.getcwd(), path, "images", filename)
-            if not os.path.isdir(directory_path):
-                os.makedirs(directory_path)
-            file_path = os.path.join(directory_path, f"{image_name}.{image_format}")
-            with open(file_path, "wb") as image:
-                image.write(response.content)
-            one_news["enclosure"] = file_path
+        if one_news["enclosure"] and file_paths[one_news["enclosure"]]:
+            one_news["enclosure"] = file_paths[one_news["enclosure"]]
     return news
 
 
-def cache_news(directory: str, news: list):
+def cache_news(directory: str, news: list, image_workers: int = 4):
     """
     Gets a list of 'Novelty' objects, creates a directory for cache files.
-    Runs a loop that checks if there is no cache file – creates it
-    and serializes all dictionaries. If there is a cache file,
-    it compares the dictionaries from the cache file and from the dictionary
-    by title and adds new ones. If there are no matches, it adds all news dictionaries.
+    Looks up the news in the set of identities of cached news and skips known ones.
+    New news are grouped by date, their images are cached and they are added
+    to the beginning of the cache file of the date, the file is created if there is none.
+    If the sqlite or segments backend is used, news are added to the store instead.
+    Identities of added news are saved to the set of the directory
+    and numbers of added news are saved to the manifest.
+    Listeners of the cache, e.g. the cache of the 'serve' mode, are notified of changed dates.
 
     :param directory : str
         the name of the directory of cache files
 
     :param news : list
         a list of 'Novelty' objects
+
+    :param image_workers : int
+        maximum number of images downloaded at the same time
     """
     log.info("Caching news")
-    news_dict = create_news_dict(news)
     path = os.path.join("cache", directory)
     if not os.path.isdir(path):
         log.info(f"Creating directory '{path}' for cache")
         os.makedirs(path)
-    for date in news_dict:
-        filename = get_filename(directory, date)
-        if not os.path.exists(os.path.join(path, f"{filename}.json")):
-            log.info(f"Creating cache file '{filename}.json' and caching all parsed news")
-            with open(os.path.join(path, f"{filename}.json"), "w") as json_file:
-                news_dict[date] = cache_images(news_dict[date], path, filename)
-                json.dump(news_dict[date], json_file, ensure_ascii=True, indent=4)
-        else:
-            log.info(f"Opening cache file '{filename}.json' and deserializing it")
-            with open(os.path.join(path, f"{filename}.json"), "r+") as json_file:
-                news_list = json.load(json_file)
-                json_file.seek(0)
-                log.info("Checking for new parsed news")
-                for index, one_news in enumerate(news_dict[date]):
-                    if one_news["title"] == news_list[0]["title"] and index == 0:
-                        log.info("No new news")
-                        break
-                    elif one_news["title"] == news_list[0]["title"] and index != 0:
-                        log.info(f"Number of new parsed news – {index}")
-                        news_dict[date][:index] = cache_images(news_dict[date][:index], path, filename)
-                        updated_news_list = news_dict[date][:index] + news_list
-                        json.dump(updated_news_list, json_file, ensure_ascii=True, indent=4)
-                        log.info("Writing new data to file")
-                        break
+    seen = get_seen(directory)
+    create_manifest()
+    new_news = {}
+    for one_news in news:
+        identity = get_identity(one_news)
+        if identity not in new_news and not is_known(one_news, seen):
+            new_news[identity] = one_news
+    log.info(f"Number of new parsed news – {len(new_news)}")
+    if not new_news:
+        return
+    with profile_stage("bucket"):
+        news_dict = create_news_dict(list(new_news.values()), get_date_parser(directory))
+    if store is not None:
+        counts = cache_news_in_store(directory, news_dict, image_workers)
+    else:
+        counts = {date: len(news_list) for date, news_list in news_dict.items()}
+        for date in news_dict:
+            filename = get_filename(directory, date)
+            news_dict[date] = cache_images(news_dict[date], image_workers)
+            news_list = [dict(one_news) for one_news in news_dict[date]]
+            with profile_stage("cache_write"):
+                if not os.path.exists(os.path.join(path, f"{filename}.json")):
+                    log.info(f"Creating cache file '{filename}.json' and caching all parsed news")
+                    with open(os.path.join(path, f"{filename}.json"), "w") as json_file:
+                        json.dump(news_list, json_file, ensure_ascii=True, indent=4)
+                        add_to_counter("cache_bytes_written", json_file.tell())
                 else:
-                    log.info("All parsed news are new")
-                    news_dict[date] = cache_images(news_dict[date], path, filename)
-                    updated_news_list = news_dict[date] + news_list
-                    json.dump(updated_news_list, json_file, ensure_ascii=True, indent=4)
+                    log.info(f"Opening cache file '{filename}.json' and deserializing it")
+                    with open(os.path.join(path, f"{filename}.json"), "r+") as json_file:
+                        updated_news_list = news_list + json.load(json_file)
+                        json_file.seek(0)
+                        json.dump(updated_news_list, json_file, ensure_ascii=True, indent=4)
+                        json_file.truncate()
+                        add_to_counter("cache_bytes_written", json_file.tell())
                     log.info("Writing new data to file")
+    with profile_stage("cache_write"):
+        add_seen(directory, [get_identity(one_news) for news_list in news_dict.values() for one_news in news_list])
+        update_manifest(directory, counts)
+    for listener in _cache_listeners:
+        listener(directory, [date for date, count in counts.items() if count])
 
 
-def print_json(news: list):
+def get_content_hash(one_news: Novelty or dict) -> str:
     """
-    Gets a list of 'Novelty' objects, creates a list of dictionaries and prints to std as json.
+    Returns the hash of the title, date and description of the news.
+
+    :param one_news : Novelty or dict
+        object of class "Novelty" or a dictionary of one cached news
+
+    :return str
+        md5 hash of the content of the news
+    """
+    content = "\n".join(str(one_news[key]) for key in ("title", "date", "description"))
+    return hashlib.md5(content.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def get_identities(one_news: Novelty or dict) -> tuple:
+    """
+    Returns all identities of the news: guid, link and hash of the content.
+    Cached news have no guid.
+
+    :param one_news : Novelty or dict
+        object of class "Novelty" or a dictionary of one cached news
+
+    :return tuple
+        guid, link and hash of the content, guid and link may be None
+    """
+    return getattr(one_news, "guid", None), one_news["link"], get_content_hash(one_news)
+
+
+def get_identity(one_news: Novelty or dict) -> str:
+    """
+    Returns the identity of the news which doesn't change between requests.
+
+    :param one_news : Novelty or dict
+        object of class "Novelty" or a dictionary of one cached news
+
+    :return str
+        the guid of the news, the link if there is no guid or the hash of the content
+    """
+    return next(identity for identity in get_identities(one_news) if identity)
+
+
+def is_known(one_news: Novelty, seen: set) -> bool:
+    """
+    Checks if any identity of the news is in the set of cached news.
+
+    :param one_news : Novelty
+        object of class "Novelty"
+    :param seen : set
+        identities of cached news
+
+    :return bool
+        True if the news is already cached
+    """
+    return any(identity in seen for identity in get_identities(one_news) if identity)
+
+
+def get_seen(directory: str) -> set:
+    """
+    Returns identities of news of the directory cached by the used backend, the set is read once
+    from 'seen.txt' of the backend and kept in memory. If there is no such file, it is created
+    from the links and hashes of news in cache files or in the store.
+
+    :param directory : str
+        the name of the directory of cache files
+
+    :return set
+        identities of cached news
+    """
+    path = os.path.abspath(get_backend_path(directory, "seen.txt"))
+    with _seen_lock:
+        if path in _seen_sets:
+            return _seen_sets[path]
+        seen = set()
+        if os.path.exists(path):
+            log.info(f"Reading identities of cached news of '{directory}'")
+            with open(path, "r", encoding="utf-8") as seen_file:
+                seen = {line.rstrip("\n") for line in seen_file}
+        elif os.path.isdir(os.path.dirname(path)):
+            log.info(f"Creating identities of cached news of '{directory}' from cache")
+            if store is not None:
+                days = [day for day, directories in store.get_counts().items() if directory in directories]
+                dictionaries = (dictionary for day in days for dictionary in store.iter_day(directory, day))
+            else:
+                pattern = re.compile(re.escape(directory) + r"_\d{8}\.json")
+                dictionaries = iter_news_files(
+                    os.path.join(os.path.dirname(path), filename)
+                    for filename in os.listdir(os.path.dirname(path)) if pattern.fullmatch(filename)
+                )
+            for dictionary in dictionaries:
+                seen.update(identity for identity in get_identities(dictionary) if identity)
+            with open(path, "w", encoding="utf-8") as seen_file:
+                seen_file.write("".join(f"{identity}\n" for identity in seen))
+        _seen_sets[path] = seen
+        return seen
+
+
+def iter_news_files(paths):
+    """
+    Yields news dictionaries of cache files.
+
+    :param paths : iterable
+        paths to cache files
+
+    :return generator
+        deserialized dictionaries of news
+    """
+    for path in paths:
+        with open(path, "r") as json_file:
+            yield from json.load(json_file)
+
+
+def add_seen(directory: str, identities: list):
+    """
+    Adds identities of cached news to the set of the directory and appends them to 'seen.txt' of the backend.
+
+    :param directory : str
+        the name of the directory of cache files
+    :param identities : list
+        identities of cached news
+    """
+    seen = get_seen(directory)
+    with _seen_lock:
+        seen.update(identities)
+        with open(get_backend_path(directory, "seen.txt"), "a", encoding="utf-8") as seen_file:
+            add_to_counter("cache_bytes_written", seen_file.write("".join(f"{identity}\n" for identity in identities)))
+
+
+def cache_news_in_store(directory: str, news_dict: dict, image_workers: int = 4):
+    """
+    Adds news which are not cached yet to the store and caches their images.
+
+    :param directory : str
+        the name of the directory of cache files
+    :param news_dict : dict
+        dictionary with keys – dates and values – lists of 'Novelty' objects
+    :param image_workers : int
+        maximum number of images downloaded at the same time
+
+    :return counts : dict
+        dictionary with keys – dates and values – numbers of added news
+    """
+    counts = {}
+    for date, news in news_dict.items():
+        identities = [get_identity(one_news) for one_news in news]
+        unknown = store.get_unknown(directory, date, identities)
+        new_news = [one_news for one_news, identity in zip(news, identities) if identity in unknown]
+        log.info(f"Number of new parsed news for '{date}' – {len(new_news)}")
+        if new_news:
+            cache_images(new_news, image_workers)
+            items = [(get_identity(one_news), dict(one_news)) for one_news in new_news]
+            with profile_stage("cache_write"):
+                store.add(directory, date, items)
+            if profiler is not None:
+                add_to_counter("cache_bytes_written", sum(len(json.dumps(dictionary)) for _, dictionary in items))
+        counts[date] = len(new_news)
+    return counts
+
+
+def print_json(news):
+    """
+    Gets 'Novelty' objects and prints them to stdout as a JSON list.
+    Every news is printed as soon as it is received, so the list is never built in memory.
+
+    :param news : iterable
+        'Novelty' objects, e.g. a list or a generator
+    """
+    log.info("Printing news as JSON")
+    count = 0
+    for one_news in news:
+        dictionary = json.dumps(one_news.dictionary, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+        print(",\n    " if count else "[\n    ", dictionary, sep="", end="", flush=True)
+        count += 1
+    print("\n]" if count else "[]", flush=True)
+
+
+def print_ndjson(news):
+    """
+    Gets 'Novelty' objects and prints them to stdout as newline-delimited JSON,
+    one news per line, every news as soon as it is received.
+
+    :param news : iterable
+        'Novelty' objects, e.g. a list or a generator
+    """
+    log.info("Printing news as newline-delimited JSON")
+    for one_news in news:
+        print(json.dumps(one_news.dictionary, ensure_ascii=False), flush=True)
+
+
+def get_file_hash(file_path: str) -> str:
+    """
+    Returns the hash of the content of the file. Files of the image store are named
+    by the hash of the content, so only other files are read.
+
+    :param file_path : str
+        path to the file
+
+    :return str
+        hexadecimal sha256 hash of the content
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    if re.fullmatch(r"[0-9a-f]{64}", name):
+        return name
+    content_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(IMAGE_CHUNK_SIZE), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def derive_thumbnail(image_path: str, size: tuple = THUMBNAIL_SIZE) -> str:
+    """
+    Returns the path to the downscaled and recompressed copy of the image for export.
+    Thumbnails are cached by the hash of the source and the target size, so the image
+    is encoded only once. Images with transparency are saved as 'png', others as 'jpeg'.
+
+    :param image_path : str
+        path to the source image
+    :param size : tuple
+        maximum width and height of the thumbnail
+
+    :return str
+        path to the thumbnail or to the source image if it is small or can't be decoded
+    """
+    image_name = get_file_hash(image_path)
+    thumbnail_name = f"{image_name}_{size[0]}x{size[1]}"
+    thumbnail_directory = os.path.join(THUMBNAILS_DIRECTORY, image_name[:2])
+    for extension in ("jpeg", "png"):
+        thumbnail_path = os.path.join(thumbnail_directory, f"{thumbnail_name}.{extension}")
+        if os.path.exists(thumbnail_path):
+            return os.path.abspath(thumbnail_path)
+    from PIL import Image
+
+    try:
+        with Image.open(image_path) as image:
+            if image.width <= size[0] and image.height <= size[1]:
+                return image_path
+            log.info(f"Creating thumbnail of '{image_path}'")
+            image.thumbnail(size)
+            if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+                extension, options, image = "png", {"optimize": True}, image.convert("RGBA")
+            else:
+                extension, options, image = "jpeg", {"quality": THUMBNAIL_QUALITY}, image.convert("RGB")
+    except (OSError, ValueError) as exc:
+        log.error(f"Exception occurred '{type(exc).__name__}' while creating thumbnail of '{image_path}'")
+        return image_path
+    os.makedirs(thumbnail_directory, exist_ok=True)
+    thumbnail_path = os.path.join(thumbnail_directory, f"{thumbnail_name}.{extension}")
+    with tempfile.NamedTemporaryFile(dir=thumbnail_directory, suffix=".part", delete=False) as thumbnail:
+        try:
+            image.save(thumbnail, extension, **options)
+        except BaseException:
+            thumbnail.close()
+            os.remove(thumbnail.name)
+            raise
+    set_file_mode(thumbnail.name)
+    os.replace(thumbnail.name, thumbnail_path)
+    return os.path.abspath(thumbnail_path)
+
+
+def create_thumbnails(news: list, size: tuple = THUMBNAIL_SIZE) -> list:
+    """
+    Gets a list of 'Novelty' objects and replaces paths to cached images in ["enclosure"]
+    with paths to their thumbnails. Every image is processed once.
 
     :param news : list
         a list of 'Novelty' objects
+    :param size : tuple
+        maximum width and height of thumbnails
+
+    :return news : list
+        a list of 'Novelty' objects with modified paths
     """
-    log.info("Creating list of dictionaries for serialization")
-    news_dictionaries = [one_news.dictionary for one_news in news]
-    log.info("Printing news as JSON")
-    print(json.dumps(news_dictionaries, ensure_ascii=False, indent=4))
+    try:
+        import PIL
+    except ImportError:
+        log.info("Module 'PIL' is not installed, images are exported in original size")
+        return news
+    log.info("Creating thumbnails of images")
+    thumbnails = {}
+    for one_news in news:
+        if one_news.enclosure and os.path.isfile(one_news.enclosure):
+            if one_news.enclosure not in thumbnails:
+                thumbnails[one_news.enclosure] = derive_thumbnail(one_news.enclosure, size)
+            one_news.enclosure = thumbnails[one_news.enclosure]
+    return news
+
+
+def publish_image(source: str, destination: str) -> str:
+    """
+    Publishes the image to the folder of the html file. The image is skipped if the file
+    is already there with the same size and modification time or the same content.
+    Otherwise a hard link is created, then a reflink (copy-on-write clone) is tried,
+    the file is copied only if both are not supported, e.g. on different file systems.
+
+    :param source : str
+        path to the cached image
+    :param destination : str
+        path to the image in the folder of the html file
+
+    :return str
+        'skipped', 'linked', 'cloned' or 'copied'
+    """
+    if os.path.exists(destination):
+        if filecmp.cmp(source, destination, shallow=True):
+            if not os.path.samefile(source, destination):
+                shutil.copystat(source, destination)
+            return "skipped"
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return "linked"
+    except OSError:
+        pass
+    try:
+        import fcntl
+
+        with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+        shutil.copystat(source, destination)
+        return "cloned"
+    except (ImportError, OSError):
+        if os.path.exists(destination):
+            os.remove(destination)
+    shutil.copy2(source, destination)
+    return "copied"
 
 
 def copy_images(news: list, filename: str, path: str) -> list:
     """
-    Gets a list of 'Novelty' objects, copies images to the folder
+    Gets a list of 'Novelty' objects, publishes images to the folder
     for html file and changes the path ["enclosure"].
+    Every image is published once, images published by previous exports are not copied again.
 
     :param news : list
         a list of 'Novelty' objects
@@ -731,106 +2160,261 @@ def copy_images(news: list, filename: str, path: str) -> list:
     :return news : list
         a list of 'Novelty' objects with modified paths
     """
-    log.info("Copying images for html file")
+    log.info("Publishing images for html file")
     directory_path = os.path.join(path, filename)
+    published = {}
     for one_news in news:
-        if one_news.dictionary["enclosure"]:
-            if os.path.exists(one_news.dictionary["enclosure"]):
-                image_name = os.path.basename(one_news.dictionary["enclosure"])
-                image_path = os.path.join(directory_path, image_name)
+        if one_news.enclosure and os.path.exists(one_news.enclosure):
+            image_name = os.path.basename(one_news.enclosure)
+            if one_news.enclosure not in published:
                 if not os.path.isdir(directory_path):
                     log.info(f"Creating directory '{filename}' for images")
                     os.makedirs(directory_path)
-                shutil.copy(one_news.dictionary["enclosure"], image_path)
-                one_news.dictionary["enclosure"] = os.path.join(filename, image_name)
+                result = publish_image(one_news.enclosure, os.path.join(directory_path, image_name))
+                log.info(f"Image '{image_name}' {result}")
+                published[one_news.enclosure] = result
+            one_news.enclosure = os.path.join(filename, image_name)
     return news
 
 
-def create_soup(template: str, news: list, title: str):
+def render_text(key: str, value: str) -> str:
+    """
+    Returns the markup of the text field of one news, lines of the text are separated by 'br' tags.
+
+    :param key : str
+        name of the field
+    :param value : str
+        text of the field
+
+    :return str
+        escaped markup of the paragraph
+    """
+    if "\n" in value:
+        text = "<br/>" + "".join(f"{html.escape(line, quote=False)}<br/>" for line in value.split("\n"))
+    else:
+        text = html.escape(value, quote=False)
+    return f'<p class="{key}">{key.capitalize()}: {text}</p>\n'
+
+
+def render_news(i: int, one_news: Novelty) -> str:
     """
-    Creates the soup based on a template for conversion to 'html' or 'pdf'.
+    Returns the markup of one news for conversion to 'html' or 'pdf'.
+    Fields without value are skipped.
+
+    :param i : int
+        number of the news
+    :param one_news : Novelty
+        object of class "Novelty"
+
+    :return str
+        escaped markup of the 'div' tag of the news
+    """
+    parts = [f'<div id="news{i}">\n']
+    for key, value in one_news.dictionary.items():
+        if not value:
+            continue
+        if key == "enclosure":
+            enclosure = html.escape(value)
+            parts.append(
+                f'<a href="{html.escape(one_news.link or "")}" target="_blank">'
+                f'<img alt="{enclosure}" class="enclosure" src="{enclosure}"/></a>\n'
+            )
+        elif key == "link":
+            parts.append(
+                f'<p class="link">Link: <a href="{html.escape(value)}" target="_blank">'
+                f'{html.escape(value, quote=False)}</a></p>\n'
+            )
+        elif key == "links":
+            parts.append('<p class="links">Links: ')
+            for j, link in enumerate(value):
+                parts.append(
+                    f'<p class="link list" id="news{i}link{j}wrap">[{j + 1}]: '
+                    f'<a href="{html.escape(link)}" id="news{i}link{j}" target="_blank">'
+                    f'{html.escape(link, quote=False)}</a></p>'
+                )
+            parts.append("</p>\n")
+        else:
+            parts.append(render_text(key, value))
+    parts.append("</div>\n")
+    return "".join(parts)
+
+
+def render_html(template: str, news, title: str, output, styles: str = "", start: int = 0):
+    """
+    Writes the markup of news based on a template for conversion to 'html' or 'pdf'.
+    Every news is escaped and written to the output as soon as it is rendered,
+    so the time of rendering is linear in the number of news and links.
 
     :param template : str
-        template name 'template_for_pdf.html' or 'template_for_pdf.html'
+        template 'template_for_html.html' or 'template_for_pdf.html'
+    :param news : iterable
+        'Novelty' objects, e.g. a list or a generator
+    :param title : str
+        news feed title
+    :param output : file object
+        text file or buffer the markup is written to
+    :param styles : str
+        additional css rules
+    :param start : int
+        number of the first news, the title is written only if it is 0
+    """
+    log.info("Rendering news based on template")
+    head, body = template.split("<body>", 1)
+    head = head.replace("<title></title>", f"<title>{html.escape(title, quote=False)}</title>", 1)
+    if styles:
+        head = head.replace("</style>", f"    {styles}\n    </style>", 1)
+    output.write(f"{head}<body>\n")
+    if not start:
+        output.write(f"<h1>{html.escape(title, quote=False)}</h1>\n")
+    for i, one_news in enumerate(news, start):
+        output.write(render_news(i, one_news))
+    output.write(body.lstrip("\n"))
+
+
+def register_pdf_fonts(data_path: str):
+    """
+    Registers regular and bold DejaVuSans fonts for 'pdf' files in the current process.
+    The markup refers to the font family by name, so fonts are loaded once per process
+    instead of once per document.
+
+    :param data_path : str
+        path to directory with package data
+    """
+    global _pdf_fonts_registered
+    if _pdf_fonts_registered:
+        return
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from xhtml2pdf import default
+
+    pdfmetrics.registerFont(TTFont("DejaVuSans", os.path.join(data_path, "fonts", "DejaVuSans.ttf")))
+    pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", os.path.join(data_path, "fonts", "DejaVuSans-Bold.ttf")))
+    pdfmetrics.registerFontFamily(
+        "DejaVuSans", normal="DejaVuSans", bold="DejaVuSans-Bold", italic="DejaVuSans", boldItalic="DejaVuSans-Bold"
+    )
+    default.DEFAULT_FONT["dejavusans"] = "DejaVuSans"
+    _pdf_fonts_registered = True
+
+
+def render_pdf(template: str, news: list, title: str, start: int = 0) -> bytes:
+    """
+    Renders a chunk of news to a 'pdf' document. Runs in worker processes of the 'pdf' pool.
+
+    :param template : str
+        template 'template_for_pdf.html'
     :param news : list
-        a list of 'Novelty' objects
+        dictionaries of news of the chunk
     :param title : str
         news feed title
+    :param start : int
+        number of the first news of the chunk, the title is rendered only in the first chunk
 
-    :return soup : BeautifulSoup
-        'BeautifulSoup' object based on the template
-    """
-    log.info("Creating soup based on template")
-    soup = BeautifulSoup(template, "lxml")
-    soup.title.append(title)
-    soup.body.append(soup.new_tag("h1"))
-    soup.h1.append(title)
-    for i, one_news in enumerate(news):
-        soup.body.append(soup.new_tag("div", id=f"news{i}"))
-        for key in one_news.dictionary:
-            if one_news.dictionary[key] and key == "enclosure":
-                soup.find("div", id=f"news{i}").append(soup.new_tag("img", attrs={"class": key}))
-            elif one_news.dictionary[key]:
-                soup.find("div", id=f"news{i}").append(soup.new_tag("p", attrs={"class": key}))
-                soup.find("div", id=f"news{i}").find("p", attrs={"class": key}).append(key.capitalize() + ": ")
-        tags = {tag["class"][0]: tag for tag in soup.find("div", id=f"news{i}").contents}
-        for key, tag in tags.items():
-            if key == "enclosure":
-                tag.attrs["src"] = one_news.dictionary["enclosure"]
-                tag.attrs["alt"] = one_news.dictionary["enclosure"]
-                tag.wrap(soup.new_tag("a", href=one_news.dictionary["link"], target="_blank"))
-            elif key == "link":
-                tag.append(soup.new_tag("a", href=one_news.dictionary[key], target="_blank"))
-                tag.a.append(one_news.dictionary[key])
-            elif key == "links":
-                for j, link in enumerate(one_news.dictionary[key]):
-                    tag.append(soup.new_tag("a", id=f"news{i}link{j}", href=link, target="_blank"))
-                    tag.find("a", id=f"news{i}link{j}").append(link)
-                    tag.find("a", id=f"news{i}link{j}").wrap(soup.new_tag(
-                        "p",
-                        attrs={"class": "link list", "id": f"news{i}link{j}wrap"}
-                    ))
-                    tag.find("p", id=f"news{i}link{j}wrap").insert(0, f"[{j+1}]: ")
-            else:
-                if "\n" in one_news.dictionary[key]:
-                    tag.append(soup.new_tag("br"))
-                    for line in one_news.dictionary[key].split("\n"):
-                        tag.append(line)
-                        tag.append(soup.new_tag("br"))
-                else:
-                    tag.append(one_news.dictionary[key])
-    return soup
+    :return bytes
+        content of the 'pdf' document
+    """
+    from xhtml2pdf import pisa
+
+    register_pdf_fonts(DATA_PATH)
+    markup = io.StringIO()
+    render_html(template, create_news(news), title, markup, start=start)
+    pdf_file = io.BytesIO()
+    pisa.CreatePDF(markup.getvalue(), dest=pdf_file, **get_pdf_options())
+    return pdf_file.getvalue()
+
+
+def get_pdf_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Returns the process pool for rendering 'pdf' chunks. The pool is created once and shared
+    by all exported feeds, every worker registers fonts when it starts.
 
+    :param workers : int
+        maximum number of worker processes
 
-def create_pdf(soup: BeautifulSoup, path: str, filename: str, data_path: str):
+    :return ProcessPoolExecutor
+        pool of worker processes
     """
-    Adds fonts and creates a 'pdf' file based on the soup.
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            import multiprocessing
+
+            log.info(f"Starting {workers} pdf workers")
+            _pdf_executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=register_pdf_fonts,
+                initargs=(DATA_PATH,),
+            )
+        return _pdf_executor
+
+
+def create_pdf(template: str, news: list, title: str, path: str, filename: str, workers: int = 1):
+    """
+    Creates a 'pdf' file. News are rendered in chunks of 'PDF_CHUNK_SIZE' pages in the
+    process pool and the chunks are concatenated, so every worker keeps only one chunk in memory.
+    Small exports and exports with one worker are rendered in the current process.
 
-    :param soup : BeautifulSoup
-        'BeautifulSoup' object based on the template
+    :param template : str
+        template 'template_for_pdf.html'
+    :param news : list
+        a list of 'Novelty' objects
+    :param title : str
+        news feed title
     :param path : str
         directory path for 'pdf' files
     :param filename : str
         filename which consists of directory name or directory name and date
-    :param data_path:
-        path to directory with package data
+    :param workers : int
+        maximum number of processes rendering chunks
     """
-    log.info("Adding fonts to html for pdf creation")
-    soup.style.append(
-        "@font-face {font-family: 'DejaVuSans'; src: url(" +
-        os.path.join(data_path, "fonts", "DejaVuSans.ttf") + ");}"
-    )
-    soup.style.append(
-        "@font-face {font-family: 'DejaVuSans'; src: url(" +
-        os.path.join(data_path, "fonts", "DejaVuSans-Bold.ttf") +
-        "); font-weight: bold;}"
-    )
     log.info(f"Creating '{filename}.pdf' and writing to '/{path}/'")
+    news = [one_news.dictionary for one_news in news]
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        log.info("Module 'pypdf' is not installed, rendering news in one document")
+        chunk_size = max(len(news), 1)
+    else:
+        chunk_size = PDF_CHUNK_SIZE
+    starts = range(0, max(len(news), 1), chunk_size)
+    if workers > 1 and len(starts) > 1:
+        chunks = get_pdf_executor(workers).map(
+            render_pdf,
+            [template] * len(starts),
+            [news[start:start + chunk_size] for start in starts],
+            [title] * len(starts),
+            starts,
+        )
+    else:
+        chunks = (render_pdf(template, news[start:start + chunk_size], title, start) for start in starts)
     with open(os.path.join(path, f"{filename}.pdf"), "w+b") as pdf_file:
-        pisa.CreatePDF(soup.prettify(), dest=pdf_file)
+        if len(starts) == 1:
+            pdf_file.write(next(chunks))
+            return
+        writer = PdfWriter()
+        for chunk in chunks:
+            writer.append(io.BytesIO(chunk))
+        writer.write(pdf_file)
+
+
+def get_pdf_options() -> dict:
+    """
+    Returns additional options of 'pisa.CreatePDF'. Versions of xhtml2pdf with
+    the resource access policy read local files only from the working directory,
+    so the directory of package fonts is allowed explicitly.
 
+    :return dict
+        the 'resource_policy' option or empty dictionary for older versions
+    """
+    try:
+        from xhtml2pdf.config.resources import default_policy
+    except ImportError:
+        return {}
+    policy = default_policy()
+    return {"resource_policy": dataclasses.replace(policy, extra_roots=(*policy.extra_roots, Path(DATA_PATH)))}
 
-def convert_to(path: str, file_format: str, news: list, filename: str, title: str):
+
+def convert_to(path: str, file_format: str, news: list, filename: str, title: str, pdf_workers: int = 1):
     """
     Converts news to 'pdf' or 'html' format
 
@@ -844,31 +2428,30 @@ def convert_to(path: str, file_format: str, news: list, filename: str, title: st
         filename which consists of directory name or directory name and date
     :param title : str
         news feed title
+    :param pdf_workers : int
+        maximum number of processes rendering 'pdf' chunks
     """
-    log.info("Converting news to html format")
+    log.info(f"Converting news to {file_format} format")
+    news = create_thumbnails(news)
     if file_format == "pdf":
         template_name = "template_for_pdf.html"
     else:
         news = copy_images(news, filename, path)
         template_name = "template_for_html.html"
-    data_path = os.getcwd()
-    if not os.path.isdir("templates"):
-        data_path = os.path.join(sys.path[-1], "rss_reader")
-    with open(os.path.join(data_path, "templates", template_name), encoding="utf-8") as html_file:
+    with open(os.path.join(DATA_PATH, "templates", template_name), encoding="utf-8") as html_file:
         template = html_file.read()
-    soup = create_soup(template, news, title)
     if not os.path.isdir(path):
         log.info(f"Creating directory '{path}' for files)")
         os.makedirs(path)
     if file_format == "pdf":
-        create_pdf(soup, path, filename, data_path)
+        create_pdf(template, news, title, path, filename, pdf_workers)
     elif file_format == "html":
         log.info(f"Creating '{filename}.html' and writing to '/{path}/'")
         with open(os.path.join(path, f"{filename}.html"), "w", encoding="utf-8") as html_file:
-            html_file.write(soup.prettify())
+            render_html(template, news, title, html_file)
 
 
-def get_cached_news(directory: str, filename: str) -> list:
+def get_cached_news(directory: str, filename: str, limit: int = None) -> list:
     """
     Deserializes the cache file.
 
@@ -876,22 +2459,27 @@ def get_cached_news(directory: str, filename: str) -> list:
         the name of the directory of cache files
     :param filename : str
         filename which consists of directory name or directory name and date
+    :param limit : int or None
+        maximum number of news, only the needed news are read from the store
 
     :return cached_news_dicts : list
         list of deserialized dictionaries from the cache file
     """
+    if store is not None:
+        log.info(f"Getting '{filename}' from the store")
+        return store.get_day(directory, filename[len(directory) + 1:], limit)
     log.info(f"Deserializing '{filename}.json'")
     with open(os.path.join("cache", directory, f"{filename}.json"), "r") as json_file:
         cached_news_dicts = json.load(json_file)
-    return cached_news_dicts
+    return cached_news_dicts[:limit]
 
 
-def print_news(news: list, title: str):
+def print_news(news, title: str):
     """
     Prints news in stdout.
 
-    :param news : list
-        a list of 'Novelty' objects
+    :param news : iterable
+        'Novelty' objects, e.g. a list or a generator
     :param title : str
         news feed title
     """
@@ -901,9 +2489,10 @@ def print_news(news: list, title: str):
         print("\n", one_news, "\n", sep="")
 
 
-def process_output(json_print, to_pdf, to_html, filename, news, title):
+def process_output(json_print, to_pdf, to_html, filename, news, title, ndjson_print=False, pdf_workers=1):
     """
     Processes variables for data output.
+    News are printed as soon as they are received if they are not converted to files.
 
     :param json_print : bool
         print result as JSON in stdout
@@ -913,74 +2502,455 @@ def process_output(json_print, to_pdf, to_html, filename, news, title):
         contains the path for files converted to 'html' format
     :param filename : str
         filename which consists of directory name or directory name and date
-    :param news : list
-        a list of 'Novelty' objects
+    :param news : iterable
+        'Novelty' objects, e.g. a list or a generator
     :param title : str
         news feed title
+    :param ndjson_print : bool
+        print result as newline-delimited JSON in stdout
+    :param pdf_workers : int
+        maximum number of processes rendering 'pdf' chunks
     """
-    if to_pdf or to_html:
-        if json_print:
+    with profile_stage("render"):
+        if to_pdf or to_html:
+            news = list(news)
+            if json_print:
+                print_json(news)
+            elif ndjson_print:
+                print_ndjson(news)
+            if to_pdf:
+                convert_to(to_pdf, "pdf", news, filename, title, pdf_workers)
+            if to_html:
+                convert_to(to_html, "html", news, filename, title)
+        elif json_print:
             print_json(news)
-        if to_pdf:
-            convert_to(to_pdf, "pdf", news, filename, title)
-        if to_html:
-            convert_to(to_html, "html", news, filename, title)
-    elif json_print:
-        print_json(news)
-    elif not json_print:
-        print_news(news, title)
+        elif ndjson_print:
+            print_ndjson(news)
+        else:
+            print_news(news, title)
 
 
-def main():
+def get_sources(sources: list, feeds: str or None) -> list:
     """
-    The main logic of the program.
+    Combines urls from the command line and from the feeds file without duplicates.
+
+    :param sources : list
+        the 'source' parameters from the command line
+    :param feeds : str or None
+        path to the file with urls of sources, one per line
+
+    :return list
+        urls of sources in the order they were received
+
+    :raise FileNotFoundError
+        an error if the feeds file doesn't exist
     """
-    sys.tracebacklimit = 0
-    source, json_print, verbose, limit, date, to_pdf, to_html = parse_arguments()
-    global log
-    log = create_logger(verbose)
-    log.debug(f"Program received: {source=} {json_print=} {verbose=} {limit=} {date=} {to_pdf=} {to_html=}")
-    if date:
-        is_date_valid(date)
-    if source:
+    log.info("Getting list of sources")
+    sources = list(sources)
+    if feeds:
+        if not os.path.exists(feeds):
+            log.error("Exception occurred 'FileNotFoundError'")
+            raise FileNotFoundError(f"There is no feeds file '{feeds}'")
+        with open(feeds, "r", encoding="utf-8") as feeds_file:
+            for line in feeds_file:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    sources.append(line)
+    return list(dict.fromkeys(sources))
+
+
+_directory_locks = {}
+_directory_locks_guard = threading.Lock()
+
+
+def get_directory_lock(directory: str) -> threading.Lock:
+    """
+    Returns the lock that serializes writing to the cache directory,
+    so feeds from the same site can be processed at the same time.
+
+    :param directory : str
+        the name of the directory of cache files
+
+    :return threading.Lock
+        the lock of the cache directory
+    """
+    with _directory_locks_guard:
+        return _directory_locks.setdefault(directory, threading.Lock())
+
+
+def process_source(
+        source: str, date: str or None, limit: int = None, image_workers: int = 4
+) -> tuple[list, str, str]:
+    """
+    Gets news from the source, caches them and returns news for output.
+    If the limit is specified and the date is not, reading of the feed stops at the limit,
+    only the read news are cached and validators of the feed are not saved,
+    so the next request gets the whole feed. Items of the feed which are in the news of the feed
+    saved with its validators are not parsed again, they are taken from the saved news.
+    If the source is unavailable, returns cached news for the specified date.
+    If the source was not modified since the last request, returns news of the feed
+    saved with its validators.
+
+    :param source : str
+        url of source of rss news
+    :param date : str or None
+        the 'date' parameter from the command line
+    :param limit : int or None
+        the 'limit' parameter from the command line
+    :param image_workers : int
+        maximum number of images downloaded at the same time
+
+    :return (list, title : str, filename : str)
+        a list of 'Novelty' objects, the title of feed and the filename
+
+    :raise RuntimeError
+        an error if the source is unavailable and the date is not specified
+    """
+    directory = get_directory(source)
+    filename = get_filename(directory, date)
+    with get_directory_lock(directory):
+        validators = get_validators(directory, source)
+    response = get_response(source, get_conditional_headers(validators))
+    if response is not None and is_response_not_modified(response.status_code):
+        response.close()
+        if date:
+            with get_directory_lock(directory):
+                is_file(directory, filename)
+                cached_news_dicts = get_cached_news(directory, filename, limit)
+        else:
+            cached_news_dicts = validators.get("news", [])[:limit]
+        if cached_news_dicts:
+            return create_news(cached_news_dicts), validators.get("title") or filename, filename
+        log.info("There is no cached news, requesting the whole feed")
         response = get_response(source)
-        directory = get_directory(source)
-        filename = get_filename(directory, date)
-        if response:
-            news, title = get_news(response)
-            cache_news(directory, news)
+    if response:
+        previous = validators.get("news", [])
+        known = {one_news["link"] for one_news in previous if one_news["link"]}
+        news, title, skipped, schedule = get_news(response, None if date else limit, known)
+        truncated = limit is not None and not date and len(news) >= limit
+        with get_directory_lock(directory):
+            cache_news(directory, news, image_workers)
+            if skipped:
+                news = merge_feed_news(news, previous, len(news) + skipped)
+            save_validators(directory, source, response, title, news, schedule, truncated)
             if date:
                 is_file(directory, filename)
-                cached_news_dicts = get_cached_news(directory, filename)
+                cached_news_dicts = get_cached_news(directory, filename, limit)
                 news = create_news(cached_news_dicts)
-            process_output(json_print, to_pdf, to_html, filename, news[:limit], title)
-        elif date:
-            is_file(directory, filename)
-            title = filename
-            cached_news_dicts = get_cached_news(directory, filename)
-            cached_news = create_news(cached_news_dicts)
-            process_output(json_print, to_pdf, to_html, filename, cached_news[:limit], title)
-        else:
-            log.error("Exception occurred 'RuntimeError'")
-            raise RuntimeError(f"Failed to get news from '{source}'")
+        return news, title, filename
+    elif date:
+        is_file(directory, filename)
+        cached_news_dicts = get_cached_news(directory, filename, limit)
+        return create_news(cached_news_dicts), filename, filename
+    else:
+        log.error("Exception occurred 'RuntimeError'")
+        raise RuntimeError(f"Failed to get news from '{source}'")
+
+
+def merge_feed_news(news: list, previous: list, count: int) -> list:
+    """
+    Returns the current news of the feed when some items were skipped as already cached:
+    the parsed news first and then the news saved with validators of the feed
+    at the previous request. Their number is not greater than the number
+    of parsed and skipped items or the number of saved news.
+
+    :param news : list
+        a list of parsed 'Novelty' objects
+    :param previous : list
+        a list of news dictionaries saved with validators of the feed
+    :param count : int
+        number of parsed and skipped items of the feed
+
+    :return list
+        a list of 'Novelty' objects
+    """
+    identities = {identity for one_news in news for identity in get_identities(one_news) if identity}
+    merged = news + [one_news for one_news in create_news(previous) if not is_known(one_news, identities)]
+    return merged[:max(count, len(previous))]
+
+
+def poll_source(source: str, image_workers: int = 4) -> dict:
+    """
+    Fetches and caches news of the source in the watch mode.
+
+    :param source : str
+        url of source of rss news
+    :param image_workers : int
+        maximum number of images downloaded at the same time
+
+    :return dict
+        'ttl', 'skipHours' and 'skipDays' of the feed saved with its validators
+
+    :raise RuntimeError
+        an error if the source is unavailable
+    """
+    process_source(source, None, None, image_workers)
+    directory = get_directory(source)
+    with get_directory_lock(directory):
+        return get_validators(directory, source).get("schedule", {})
+
+
+def get_day_news(directory: str, date: str) -> list:
+    """
+    Reads all cached news of the directory for the date while news of the directory are not written.
+
+    :param directory : str
+        the name of the directory of cache files
+    :param date : str
+        the date in '%Y%m%d' format
+
+    :return list
+        deserialized dictionaries of news
+    """
+    with get_directory_lock(directory):
+        return list(iter_cached_news(directory, [date]))
+
+
+def serve(sources: list, args):
+    """
+    Serves cached news over the local HTTP JSON API until the process is interrupted.
+    Decoded days are kept in memory and invalidated when news are cached.
+    If '--watch' is specified, sources are polled in the background.
+
+    :param sources : list
+        urls of sources of rss news
+    :param args : argparse.Namespace
+        parameters read from the command line
+    """
+    from rss_reader.server import DayCache, NewsServer
+
+    day_cache = DayCache(args.serve_cache_size * 1024 * 1024)
+    _cache_listeners.append(day_cache.invalidate)
+    server = NewsServer(
+        (args.host, args.port),
+        day_cache,
+        get_manifest,
+        get_manifest_path,
+        get_day_news,
+    )
+    if args.watch:
+        threading.Thread(target=watch, args=(sources, args), daemon=True).start()
+    log.info(f"Serving cached news on 'http://{args.host}:{server.server_port}'")
+    print(f"Serving cached news on 'http://{args.host}:{server.server_port}'", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Serving is stopped")
+    finally:
+        server.server_close()
+        _cache_listeners.remove(day_cache.invalidate)
+
+
+def watch(sources: list, args):
+    """
+    Polls the sources until the process is interrupted. Every feed is polled
+    according to its 'ttl', 'skipHours' and 'skipDays', but not more often than '--interval'.
+
+    :param sources : list
+        urls of sources of rss news
+    :param args : argparse.Namespace
+        parameters read from the command line
+
+    :raise ValueError
+        an error if there are no sources
+    """
+    from rss_reader.watcher import Watcher
+
+    if not sources:
+        log.error("Exception occurred 'ValueError'")
+        raise ValueError("Sources are required for '--watch'")
+    watcher = Watcher(
+        sources,
+        lambda source: poll_source(source, args.image_workers),
+        interval=args.interval,
+        workers=args.workers,
+    )
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        log.info("Watching is stopped")
+        watcher.stop()
+
+
+def fetch_feeds(sources: list, date: str or None, workers: int, limit: int = None, image_workers: int = 4):
+    """
+    Processes the sources in a pool of threads. Fetching, parsing and caching
+    of different feeds overlap, the number of feeds processed at the same time
+    is limited by 'workers'.
+
+    :param sources : list
+        urls of sources of rss news
+    :param date : str or None
+        the 'date' parameter from the command line
+    :param workers : int
+        maximum number of feeds processed at the same time
+    :param limit : int or None
+        the 'limit' parameter from the command line
+    :param image_workers : int
+        maximum number of images of one feed downloaded at the same time
+
+    :return generator
+        pairs of source and 'Future' of 'process_source' in the order of sources
+    """
+    log.info(f"Processing {len(sources)} feeds with {workers} workers")
+    with ThreadPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+        futures = [(source, executor.submit(process_source, source, date, limit, image_workers)) for source in sources]
+        for source, future in futures:
+            yield source, future
+
+
+def print_range(sources: list, args):
+    """
+    Prints cached news of every directory from the range of dates set by '--from' and '--to'.
+    Only days of the range are read. If sources are specified, they are fetched and cached
+    first and only their directories are printed.
+
+    :param sources : list
+        urls of sources of rss news
+    :param args : argparse.Namespace
+        parameters read from the command line
+
+    :raise FileNotFoundError
+        an error if there are no cached news in the range
+    """
+    date_from, date_to, limit = args.date_from, args.date_to, args.limit
+    log.info(f"Getting cached news from '{date_from}' to '{date_to}'")
+    if sources:
+        for source, future in fetch_feeds(sources, None, args.workers, None, args.image_workers):
+            try:
+                future.result()
+            except Exception as exc:
+                log.error(f"Exception occurred '{type(exc).__name__}' while processing '{source}'")
+                print(f"{source}: {exc}")
+    manifest = get_manifest()
+    days = get_days(manifest, date_from, date_to)
+    directories = sorted({directory for day in days for directory in manifest[day]})
+    if sources:
+        source_directories = {get_directory(source) for source in sources}
+        directories = [directory for directory in directories if directory in source_directories]
+    for directory in directories:
+        feed_days = [day for day in days if directory in manifest[day]]
+        filename = get_filename(directory, f"{date_from or feed_days[-1]}-{date_to or feed_days[0]}")
+        news = iter_news(iter_cached_news(directory, feed_days, limit))
+        process_output(
+            args.json_print, args.to_pdf, args.to_html, filename, news, filename, args.ndjson_print, args.pdf_workers
+        )
+    if not directories:
+        log.error("Exception occurred 'FileNotFoundError'")
+        raise FileNotFoundError(f"No cached news from '{date_from or ''}' to '{date_to or ''}'")
+
+
+def write_profile(args):
+    """
+    Stops the profiler and writes its report as JSON to the file set by '--profile-output'
+    or to stderr, so the output of news is not mixed with it. cProfile stats are written
+    to the file set by '--profile-stats'.
+
+    :param args : argparse.Namespace
+        parameters read from the command line
+    """
+    report = profiler.stop()
+    if args.profile_output:
+        log.info(f"Writing profile to '{args.profile_output}'")
+        with open(args.profile_output, "w", encoding="utf-8") as json_file:
+            json.dump(report, json_file, indent=4)
+    else:
+        print(json.dumps(report, indent=4), file=sys.stderr)
+    if args.profile_stats:
+        profiler.dump_stats(args.profile_stats)
+
+
+def main():
+    """
+    The main logic of the program.
+    """
+    sys.tracebacklimit = 0
+    args = parse_arguments()
+    global log, store, profiler
+    log = create_logger(args.verbose)
+    log.debug(f"Program received: {vars(args)}")
+    if args.cache_backend == "sqlite":
+        from rss_reader.sqlite_store import SqliteStore
+        store = SqliteStore(DATABASE_PATH)
+    elif args.cache_backend == "segments":
+        from rss_reader.segment_store import SegmentStore
+        store = SegmentStore("cache")
+    if args.profile or args.profile_output or args.profile_stats:
+        from rss_reader.profiler import Profiler
+
+        profiler = Profiler(stats=bool(args.profile_stats))
+        profiler.start()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            write_profile(args)
+
+
+def run(args):
+    """
+    Processes sources or cached news according to the command line.
+
+    :param args : argparse.Namespace
+        parameters read from the command line
+    """
+    json_print, limit, date, to_pdf, to_html = args.json_print, args.limit, args.date, args.to_pdf, args.to_html
+    global fetch_policy, host_connections
+    if args.list_dates:
+        print_dates(json_print)
+        return
+    from rss_reader.fetch import FetchPolicy
+
+    fetch_policy = FetchPolicy(args.connect_timeout, args.read_timeout, args.deadline, args.retries)
+    host_connections = args.host_connections
+    for day in (date, args.date_from, args.date_to):
+        if day:
+            is_date_valid(day)
+    sources = get_sources(args.sources, args.feeds)
+    if args.serve:
+        serve(sources, args)
+    elif args.watch:
+        watch(sources, args)
+    elif args.date_from or args.date_to:
+        print_range(sources, args)
+    elif sources:
+        for source, future in fetch_feeds(sources, date, args.workers, limit, args.image_workers):
+            try:
+                news, title, filename = future.result()
+            except Exception as exc:
+                if len(sources) == 1:
+                    raise exc
+                log.error(f"Exception occurred '{type(exc).__name__}' while processing '{source}'")
+                print(f"{source}: {exc}")
+                continue
+            process_output(
+                json_print, to_pdf, to_html, filename, news[:limit], title, args.ndjson_print, args.pdf_workers
+            )
     elif date:
-        log.info("Getting list of cache directories")
-        cache_dirs = list(os.walk("cache"))[0][1]
+        log.info("Getting list of cache directories from manifest")
+        cache_dirs = sorted(get_manifest().get(date, {}))
         flag = True
         for directory in cache_dirs:
             filename = get_filename(directory, date)
             title = filename
-            if os.path.exists(os.path.join("cache", directory, f"{filename}.json")):
-                cached_news_dicts = get_cached_news(directory, filename)
-                cached_news = create_news(cached_news_dicts)
-                process_output(json_print, to_pdf, to_html, filename, cached_news[:limit], title)
+            if has_cached_news(directory, filename):
+                cached_news = iter_news(iter_cached_news(directory, [date], limit))
+                process_output(
+                    json_print, to_pdf, to_html, filename, cached_news, title, args.ndjson_print, args.pdf_workers
+                )
                 flag = False
         if flag:
             log.error("Exception occurred 'FileNotFoundError'")
             raise FileNotFoundError(f"No cached news for '{date}' date")
 
 
-log = create_logger(False)
+log = logging.getLogger(__package__ or __name__)
+log.addHandler(logging.NullHandler())
+store = None
+fetch_policy = None
+session = None
+host_connections = 8
+profiler = None
 
 
 if __name__ == "__main__":
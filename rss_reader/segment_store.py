@@ -0,0 +1,347 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+
+
+log = logging.getLogger(__name__)
+
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+
+class SegmentStore:
+    """
+    A class to keep cached news in append-only segments of newline-delimited JSON.
+
+    Every ingest writes only the new news of a day to a new segment
+    'cache/<feed>/segments/<day>/<number>.ndjson[.gz]', so the cost of writing
+    doesn't depend on the size of the day. Identities of cached news of the day
+    are appended to 'identities.txt'. When a day has too many segments,
+    they are merged into one in a background thread.
+
+    Attributes
+    ----------
+    path : str
+        path to the cache directory
+
+    compress=True : bool
+        compress segments with gzip
+
+    max_segments=8 : int
+        number of segments of one day after which the day is compacted
+
+    name : str
+        name of the backend
+
+    Methods
+    -------
+    def get_unknown(self, feed, day, identities):
+        Returns identities which are not cached yet.
+
+    def add(self, feed, day, items):
+        Writes news to a new segment.
+
+    def compact(self, feed, day):
+        Merges all segments of the day into one.
+
+    def has_day(self, feed, day):
+        Checks if there are news of the feed for the day.
+
+    def iter_day(self, feed, day):
+        Yields news of the feed for the day.
+
+    def get_day(self, feed, day, limit=None, offset=0):
+        Returns news of the feed for the day.
+
+    def get_location(self, feed, day):
+        Returns location of news of the feed for the day.
+
+    def get_counts(self):
+        Returns numbers of news of all feeds for all days.
+
+    def wait(self):
+        Waits for the background compaction to finish.
+    """
+    name = "segments"
+
+    def __init__(self, path: str, compress: bool = True, max_segments: int = 8):
+        """
+        Constructs all attributes for the 'SegmentStore' object.
+
+        :param path : str
+            path to the cache directory
+        :param compress : bool
+            compress segments with gzip
+        :param max_segments : int
+            number of segments of one day after which the day is compacted
+        """
+        self.path = path
+        self.compress = compress
+        self.max_segments = max_segments
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._compactions = {}
+
+    def _get_lock(self, feed: str, day: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault((feed, day), threading.Lock())
+
+    def _get_day_path(self, feed: str, day: str) -> str:
+        return os.path.join(self.path, feed, "segments", day)
+
+    @staticmethod
+    def _get_segments(day_path: str) -> list:
+        """
+        Returns names of segments of the day sorted by number, the oldest first.
+        """
+        if not os.path.isdir(day_path):
+            return []
+        segments = [name for name in os.listdir(day_path) if name.endswith((".ndjson", ".ndjson.gz"))]
+        return sorted(segments, key=lambda name: int(name.split(".")[0]))
+
+    @staticmethod
+    def _read_segment(file_path: str):
+        """
+        Yields lines of the segment as dictionaries with 'identity' and 'news' keys.
+        """
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as segment:
+            for line in segment:
+                yield json.loads(line)
+
+    def _write_temp_segment(self, day_path: str, lines: list) -> str:
+        """
+        Writes lines of the segment to a temporary file in the directory of the day.
+        """
+        with tempfile.NamedTemporaryFile(dir=day_path, suffix=".part", delete=False) as temp_file:
+            temp_path = temp_file.name
+        opener = gzip.open if self.compress else open
+        with opener(temp_path, "wt", encoding="utf-8") as segment:
+            for identity, dictionary in lines:
+                segment.write(json.dumps({"identity": identity, "news": dictionary}, ensure_ascii=False) + "\n")
+        os.chmod(temp_path, 0o666 & ~UMASK)
+        return temp_path
+
+    def _get_segment_path(self, day_path: str, number: int) -> str:
+        extension = ".ndjson.gz" if self.compress else ".ndjson"
+        return os.path.join(day_path, f"{number:06d}{extension}")
+
+    def _write_segment(self, day_path: str, number: int, lines: list) -> str:
+        """
+        Writes the segment to a temporary file and links it to the first free number.
+        """
+        temp_path = self._write_temp_segment(day_path, lines)
+        while True:
+            file_path = self._get_segment_path(day_path, number)
+            try:
+                os.link(temp_path, file_path)
+                break
+            except FileExistsError:
+                number += 1
+        os.remove(temp_path)
+        return file_path
+
+    def get_unknown(self, feed: str, day: str, identities: list) -> set:
+        """
+        Returns identities which are not cached yet.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param identities : list
+            identities of news
+
+        :return set
+            identities of news which are not cached yet
+        """
+        identities_path = os.path.join(self._get_day_path(feed, day), "identities.txt")
+        if not os.path.exists(identities_path):
+            return set(identities)
+        with open(identities_path, "r", encoding="utf-8") as identities_file:
+            known = {line.rstrip("\n") for line in identities_file}
+        return set(identities) - known
+
+    def add(self, feed: str, day: str, items: list):
+        """
+        Writes news to a new segment of the day and starts the compaction
+        in the background if the day has too many segments.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param items : list
+            pairs of identity and dictionary of one news, the latest news first
+        """
+        if not items:
+            return
+        day_path = self._get_day_path(feed, day)
+        with self._get_lock(feed, day):
+            os.makedirs(day_path, exist_ok=True)
+            segments = self._get_segments(day_path)
+            number = int(segments[-1].split(".")[0]) + 1 if segments else 1
+            file_path = self._write_segment(day_path, number, items)
+            log.info(f"Writing {len(items)} news of '{feed}' for '{day}' to '{file_path}'")
+            with open(os.path.join(day_path, "identities.txt"), "a", encoding="utf-8") as identities_file:
+                identities_file.write("".join(f"{identity}\n" for identity, _ in items))
+        if len(segments) + 1 <= self.max_segments:
+            return
+        with self._locks_guard:
+            if (feed, day) in self._compactions:
+                return
+            thread = threading.Thread(target=self.compact, args=(feed, day), name=f"compaction-{feed}-{day}")
+            self._compactions[(feed, day)] = thread
+        thread.start()
+
+    def compact(self, feed: str, day: str):
+        """
+        Merges all segments of the day into one segment, which replaces the latest merged segment,
+        and removes the other merged ones. The merged segment keeps the number of the latest
+        merged segment, so segments added by other processes during the compaction stay newer.
+        Readers skip duplicates and list segments again if a segment is removed while they read it,
+        so they can read the day while it is compacted.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        """
+        day_path = self._get_day_path(feed, day)
+        try:
+            with self._get_lock(feed, day):
+                segments = self._get_segments(day_path)
+                if len(segments) < 2:
+                    return
+                log.info(f"Compacting {len(segments)} segments of '{feed}' for '{day}'")
+                lines = [(line["identity"], line["news"]) for line in self._iter_lines(day_path)]
+                merged_path = self._get_segment_path(day_path, int(segments[-1].split(".")[0]))
+                os.replace(self._write_temp_segment(day_path, lines), merged_path)
+                for segment in segments:
+                    if segment != os.path.basename(merged_path):
+                        os.remove(os.path.join(day_path, segment))
+                log.info(f"Segments of '{feed}' for '{day}' are merged into '{merged_path}'")
+        finally:
+            with self._locks_guard:
+                self._compactions.pop((feed, day), None)
+
+    def _iter_lines(self, day_path: str):
+        """
+        Yields lines of all segments of the day, the latest news first, without duplicates.
+        If a segment was removed by the compaction while the day is read,
+        segments are listed again and reading continues with the merged segment,
+        which contains all news of the removed ones.
+        """
+        seen = set()
+        while True:
+            try:
+                for segment in reversed(self._get_segments(day_path)):
+                    for line in self._read_segment(os.path.join(day_path, segment)):
+                        if line["identity"] not in seen:
+                            seen.add(line["identity"])
+                            yield line
+                return
+            except FileNotFoundError:
+                log.info(f"Segments of '{day_path}' were merged by the compaction, reading them again")
+
+    def has_day(self, feed: str, day: str) -> bool:
+        """
+        Checks if there are news of the feed for the day.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return bool
+            True if there are cached news
+        """
+        return bool(self._get_segments(self._get_day_path(feed, day)))
+
+    def iter_day(self, feed: str, day: str):
+        """
+        Yields news of the feed for the day, the latest news first.
+        Only segments which are needed are read.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return generator
+            dictionaries of news
+        """
+        for line in self._iter_lines(self._get_day_path(feed, day)):
+            yield line["news"]
+
+    def get_day(self, feed: str, day: str, limit: int = None, offset: int = 0) -> list:
+        """
+        Returns news of the feed for the day, the latest news first.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param limit : int
+            maximum number of news
+        :param offset : int
+            number of news to skip
+
+        :return list
+            list of dictionaries of news
+        """
+        news = []
+        for i, dictionary in enumerate(self.iter_day(feed, day)):
+            if limit is not None and len(news) >= limit:
+                break
+            if i >= offset:
+                news.append(dictionary)
+        return news
+
+    def get_location(self, feed: str, day: str) -> str:
+        """
+        Returns location of news of the feed for the day.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return str
+            path to the directory of segments of the day
+        """
+        return self._get_day_path(feed, day)
+
+    def get_counts(self) -> dict:
+        """
+        Returns numbers of news of all feeds for all days.
+
+        :return dict
+            dictionary with keys – days and values – dictionaries with keys – feeds
+            and values – numbers of news
+        """
+        counts = {}
+        if not os.path.isdir(self.path):
+            return counts
+        for feed in os.listdir(self.path):
+            segments_path = os.path.join(self.path, feed, "segments")
+            if not os.path.isdir(segments_path):
+                continue
+            for day in os.listdir(segments_path):
+                identities_path = os.path.join(segments_path, day, "identities.txt")
+                if self.has_day(feed, day) and os.path.exists(identities_path):
+                    with open(identities_path, "r", encoding="utf-8") as identities_file:
+                        counts.setdefault(day, {})[feed] = len({line.rstrip("\n") for line in identities_file})
+        return counts
+
+    def wait(self):
+        """
+        Waits for the background compaction to finish.
+        """
+        with self._locks_guard:
+            threads = list(self._compactions.values())
+        for thread in threads:
+            thread.join()
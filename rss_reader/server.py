@@ -0,0 +1,329 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+log = logging.getLogger(__name__)
+
+
+class DayCache:
+    """
+    A class to keep decoded news of days in memory.
+
+    Days are evicted in the least recently used order once the total size
+    of the cached news is greater than the maximum size. A day is read again
+    if the number of its news in the manifest changed or it was invalidated.
+
+    Attributes
+    ----------
+    max_size : int
+        maximum total size of cached news in bytes
+
+    size : int
+        total size of cached news in bytes
+
+    Methods
+    -------
+    def get(self, feed, day, count, load):
+        Returns news of the feed for the day from memory or loads them.
+
+    def invalidate(self, feed, days=None):
+        Removes days of the feed from memory.
+    """
+    def __init__(self, max_size: int):
+        """
+        Constructs all attributes for the 'DayCache' object.
+
+        :param max_size : int
+            maximum total size of cached news in bytes
+        """
+        self.max_size = max_size
+        self.size = 0
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, feed: str, day: str, count: int or None, load) -> list:
+        """
+        Returns news of the feed for the day from memory or loads them.
+        The size of the day is the size of its news encoded to JSON.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the date in '%Y%m%d' format
+        :param count : int or None
+            number of news of the day in the manifest, it isn't checked if it is None
+        :param load : callable
+            function which returns news dictionaries of the feed for the day
+
+        :return list
+            news dictionaries
+        """
+        key = (feed, day)
+        with self._lock:
+            entry = self._days.get(key)
+            if entry is not None and (count is None or entry[0] == count):
+                self._days.move_to_end(key)
+                return entry[2]
+        news = load(feed, day)
+        size = len(json.dumps(news, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._remove(key)
+            if size <= self.max_size:
+                self._days[key] = (len(news), size, news)
+                self.size += size
+            while self.size > self.max_size:
+                self._remove(next(iter(self._days)))
+        return news
+
+    def invalidate(self, feed: str, days: list = None):
+        """
+        Removes days of the feed from memory, e.g. after new news are cached.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param days : list or None
+            dates in '%Y%m%d' format, all days of the feed are removed if it is None
+        """
+        with self._lock:
+            for key in [key for key in self._days if key[0] == feed and (days is None or key[1] in days)]:
+                self._remove(key)
+
+    def _remove(self, key: tuple):
+        """
+        Removes the day from memory, the lock must be held.
+
+        :param key : tuple
+            the name of the directory and the date
+        """
+        entry = self._days.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+class NewsServer(ThreadingHTTPServer):
+    """
+    A class of the local HTTP server of cached news.
+
+    The manifest is read again only when its file changes,
+    news of days are kept in the 'DayCache'.
+
+    Attributes
+    ----------
+    day_cache : DayCache
+        decoded news of days
+
+    read_manifest : callable
+        function which returns the manifest
+
+    manifest_path : callable
+        function which returns path to the manifest
+
+    load_day : callable
+        function which returns news dictionaries of the feed for the day
+
+    Methods
+    -------
+    def get_manifest(self):
+        Returns the manifest, it's read only if its file changed.
+
+    def get_news(self, day, feed=None, limit=None, offset=0):
+        Returns news of the day for one feed or all feeds.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, day_cache: DayCache, read_manifest, manifest_path, load_day):
+        """
+        Constructs all attributes for the 'NewsServer' object and binds the address.
+
+        :param address : tuple
+            host and port
+        :param day_cache : DayCache
+            decoded news of days
+        :param read_manifest : callable
+            function which returns the manifest
+        :param manifest_path : callable
+            function which returns path to the manifest
+        :param load_day : callable
+            function which returns news dictionaries of the feed for the day
+        """
+        super().__init__(address, NewsRequestHandler)
+        self.day_cache = day_cache
+        self.read_manifest = read_manifest
+        self.manifest_path = manifest_path
+        self.load_day = load_day
+        self._manifest = ({}, None)
+        self._manifest_lock = threading.Lock()
+
+    def get_manifest(self) -> dict:
+        """
+        Returns the manifest, it's read only if its file changed.
+
+        :return dict
+            dictionary with keys – dates and values – dictionaries of cache directories
+        """
+        with self._manifest_lock:
+            try:
+                stat = os.stat(self.manifest_path())
+                version = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                version = None
+            if version is None or version != self._manifest[1]:
+                self._manifest = (self.read_manifest(), version)
+            return self._manifest[0]
+
+    def get_news(self, day: str, feed: str = None, limit: int = None, offset: int = 0) -> list or None:
+        """
+        Returns news of the day for one feed or all feeds in the order of their names.
+
+        :param day : str
+            the date in '%Y%m%d' format
+        :param feed : str or None
+            the name of the directory of cache files
+        :param limit : int or None
+            maximum number of news
+        :param offset : int
+            number of news to skip
+
+        :return list
+            news dictionaries
+        :return None
+            if there are no cached news of the feed for the day
+        """
+        feeds = self.get_manifest().get(day, {})
+        if feed is not None:
+            if feed not in feeds:
+                return None
+            feeds = {feed: feeds[feed]}
+        result = []
+        for name in sorted(feeds):
+            count = feeds[name].get("count")
+            if count is not None and offset >= count:
+                offset -= count
+                continue
+            news = self.day_cache.get(name, day, count, self.load_day)
+            end = None if limit is None else offset + limit - len(result)
+            result.extend(news[offset:end])
+            offset = max(offset - len(news), 0)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+class NewsRequestHandler(BaseHTTPRequestHandler):
+    """
+    A class to answer requests to the JSON API of cached news.
+
+    GET /dates
+        dates of cached news with numbers of news of every feed
+    GET /feeds?date=YYYYMMDD
+        feeds which have news for the date with numbers of news
+    GET /news?date=YYYYMMDD[&feed=name][&limit=N][&offset=N]
+        news of the date of one feed or all feeds
+
+    Methods
+    -------
+    def do_GET(self):
+        Answers the request with JSON.
+    """
+    def do_GET(self):
+        """
+        Answers the request with JSON, errors are answered with the 'error' message.
+        """
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/dates":
+                manifest = self.server.get_manifest()
+                data = {
+                    day: {feed: entry["count"] for feed, entry in manifest[day].items()}
+                    for day in sorted(manifest, reverse=True)
+                }
+            elif url.path == "/feeds":
+                data = {feed: entry["count"] for feed, entry in self.server.get_manifest().get(
+                    self.get_date(query), {}
+                ).items()}
+            elif url.path == "/news":
+                data = self.server.get_news(
+                    self.get_date(query),
+                    query.get("feed"),
+                    self.get_number(query, "limit"),
+                    self.get_number(query, "offset") or 0,
+                )
+                if data is None:
+                    self.send_json(404, {"error": f"No cached news of '{query['feed']}' for '{query['date']}'"})
+                    return
+            else:
+                self.send_json(404, {"error": f"Unknown path '{url.path}'"})
+                return
+        except ValueError as exc:
+            self.send_json(400, {"error": str(exc)})
+            return
+        self.send_json(200, data)
+
+    @staticmethod
+    def get_date(query: dict) -> str:
+        """
+        Returns the 'date' parameter of the request.
+
+        :param query : dict
+            parameters of the request
+
+        :return str
+            the date in '%Y%m%d' format
+
+        :raise ValueError
+            an error if the date is missing or has a wrong format
+        """
+        date = query.get("date", "")
+        if len(date) != 8 or not date.isdigit():
+            raise ValueError("Parameter 'date' in '%Y%m%d' format is required")
+        return date
+
+    @staticmethod
+    def get_number(query: dict, name: str) -> int or None:
+        """
+        Returns the non-negative number parameter of the request.
+
+        :param query : dict
+            parameters of the request
+        :param name : str
+            name of the parameter
+
+        :return int or None
+            value of the parameter or None if it is missing
+
+        :raise ValueError
+            an error if the value is not a non-negative number
+        """
+        if name not in query:
+            return None
+        if not query[name].isdigit():
+            raise ValueError(f"Parameter '{name}' must be a non-negative number")
+        return int(query[name])
+
+    def send_json(self, status: int, data):
+        """
+        Sends the response with data encoded to JSON.
+
+        :param status : int
+            status code of the response
+        :param data : object
+            data of the response
+        """
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        """
+        Writes requests to the log instead of stderr.
+        """
+        log.info(f"{self.address_string()} {format % args}")
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS news (
+    id INTEGER PRIMARY KEY,
+    feed TEXT NOT NULL,
+    day TEXT NOT NULL,
+    identity TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS news_identity ON news (feed, day, identity);
+CREATE INDEX IF NOT EXISTS news_feed_day ON news (feed, day, id);
+CREATE INDEX IF NOT EXISTS news_day ON news (day, feed);
+"""
+
+
+class SqliteStore:
+    """
+    A class to keep cached news in the SQLite database.
+
+    News are indexed by feed, day and identity of the news, so lookups and inserts
+    don't need to read and rewrite a whole day. The database works in WAL mode,
+    so several processes can write to it at the same time.
+    Every thread uses its own connection.
+
+    Attributes
+    ----------
+    path : str
+        path to the database file
+
+    name : str
+        name of the backend
+
+    Methods
+    -------
+    def get_unknown(self, feed, day, identities):
+        Returns identities which are not in the database.
+
+    def add(self, feed, day, items):
+        Adds news to the database.
+
+    def has_day(self, feed, day):
+        Checks if there are news of the feed for the day.
+
+    def iter_day(self, feed, day):
+        Yields news of the feed for the day.
+
+    def get_day(self, feed, day, limit=None, offset=0):
+        Returns news of the feed for the day.
+
+    def get_location(self, feed, day):
+        Returns location of news of the feed for the day.
+
+    def get_counts(self):
+        Returns numbers of news of all feeds for all days.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        """
+        Constructs all attributes for the 'SqliteStore' object and creates the database.
+
+        :param path : str
+            path to the database file
+        """
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread.
+
+        :return sqlite3.Connection
+            connection to the database in WAL mode
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            log.info(f"Connecting to '{self.path}'")
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_unknown(self, feed: str, day: str, identities: list) -> set:
+        """
+        Returns identities which are not in the database.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param identities : list
+            identities of news
+
+        :return set
+            identities of news which are not cached yet
+        """
+        known = set()
+        for i in range(0, len(identities), 500):
+            chunk = identities[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT identity FROM news WHERE feed = ? AND day = ? AND identity IN ({placeholders})",
+                [feed, day, *chunk],
+            )
+            known.update(row[0] for row in rows)
+        return set(identities) - known
+
+    def add(self, feed: str, day: str, items: list):
+        """
+        Adds news to the database, news which are already there are ignored.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param items : list
+            pairs of identity and dictionary of one news, the latest news first
+        """
+        log.info(f"Adding {len(items)} news of '{feed}' for '{day}' to the database")
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO news (feed, day, identity, data) VALUES (?, ?, ?, ?)",
+                ((feed, day, identity, json.dumps(dictionary)) for identity, dictionary in reversed(items)),
+            )
+
+    def has_day(self, feed: str, day: str) -> bool:
+        """
+        Checks if there are news of the feed for the day.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return bool
+            True if there are cached news
+        """
+        rows = self.connection.execute("SELECT 1 FROM news WHERE feed = ? AND day = ? LIMIT 1", (feed, day))
+        return rows.fetchone() is not None
+
+    def iter_day(self, feed: str, day: str):
+        """
+        Yields news of the feed for the day, the latest news first.
+        Rows are fetched from the database while they are read.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return generator
+            dictionaries of news
+        """
+        rows = self.connection.execute("SELECT data FROM news WHERE feed = ? AND day = ? ORDER BY id DESC", (feed, day))
+        for row in rows:
+            yield json.loads(row[0])
+
+    def get_day(self, feed: str, day: str, limit: int = None, offset: int = 0) -> list:
+        """
+        Returns news of the feed for the day, the latest news first.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+        :param limit : int
+            maximum number of news
+        :param offset : int
+            number of news to skip
+
+        :return list
+            list of dictionaries of news
+        """
+        rows = self.connection.execute(
+            "SELECT data FROM news WHERE feed = ? AND day = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (feed, day, -1 if limit is None else limit, offset),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def get_location(self, feed: str, day: str) -> str:
+        """
+        Returns location of news of the feed for the day.
+
+        :param feed : str
+            the name of the directory of cache files
+        :param day : str
+            the day in '%Y%m%d' format
+
+        :return str
+            path to the database
+        """
+        return self.path
+
+    def get_counts(self) -> dict:
+        """
+        Returns numbers of news of all feeds for all days.
+
+        :return dict
+            dictionary with keys – days and values – dictionaries with keys – feeds
+            and values – numbers of news
+        """
+        counts = {}
+        rows = self.connection.execute("SELECT day, feed, COUNT(*) FROM news GROUP BY day, feed")
+        for day, feed, count in rows:
+            counts.setdefault(day, {})[feed] = count
+        return counts
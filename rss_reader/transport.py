@@ -0,0 +1,190 @@
+import ipaddress
+import logging
+import socket
+import threading
+import time
+
+
+log = logging.getLogger(__name__)
+
+DNS_TTL = 300
+
+
+class DnsCache:
+    """
+    A class to keep addresses of resolved hosts for a short time.
+
+    Connections to the same host don't wait for the resolver again until the time
+    to live is over. Addresses of the host are resolved again if none of them answers.
+
+    Attributes
+    ----------
+    ttl : float
+        number of seconds addresses are kept
+
+    clock : callable
+        function which returns the current time in seconds
+
+    Methods
+    -------
+    def resolve(self, host, port):
+        Returns addresses of the host.
+
+    def invalidate(self, host):
+        Removes addresses of the host.
+
+    def create_connection(self, address, *args, **kwargs):
+        Connects to the first answering address of the host.
+    """
+    def __init__(self, create_connection, ttl: float = DNS_TTL, clock=time.monotonic):
+        """
+        Constructs all attributes for the 'DnsCache' object.
+
+        :param create_connection : callable
+            function of urllib3 which connects to the address
+        :param ttl : float
+            number of seconds addresses are kept
+        :param clock : callable
+            function which returns the current time in seconds
+        """
+        self.ttl = ttl
+        self.clock = clock
+        self._create_connection = create_connection
+        self._addresses = {}
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> list:
+        """
+        Returns addresses of the host, the resolver is called only if they are not known or expired.
+        Connections to the same host wait for one call of the resolver.
+
+        :param host : str
+            host name
+        :param port : int
+            port of the connection
+
+        :return list
+            ip addresses of the host
+        """
+        with self._lock:
+            host_lock = self._host_locks.setdefault((host, port), threading.Lock())
+        with host_lock:
+            entry = self._addresses.get((host, port))
+            if entry is not None and entry[0] > self.clock():
+                return entry[1]
+            from urllib3.util.connection import allowed_gai_family
+
+            log.info(f"Resolving '{host}'")
+            infos = socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+            addresses = list(dict.fromkeys(info[4][0] for info in infos))
+            self._addresses[(host, port)] = (self.clock() + self.ttl, addresses)
+            return addresses
+
+    def invalidate(self, host: str):
+        """
+        Removes addresses of the host.
+
+        :param host : str
+            host name
+        """
+        with self._lock:
+            for key in [key for key in self._addresses if key[0] == host]:
+                del self._addresses[key]
+
+    def create_connection(self, address: tuple, *args, **kwargs) -> socket.socket:
+        """
+        Connects to the first answering address of the host.
+        It has the signature of 'urllib3.util.connection.create_connection'.
+
+        :param address : tuple
+            host and port
+
+        :return socket.socket
+            connected socket
+
+        :raise OSError
+            an error of the last address if none of them answered
+        """
+        host, port = address
+        try:
+            ipaddress.ip_address(host.strip("[]"))
+        except ValueError:
+            pass
+        else:
+            return self._create_connection(address, *args, **kwargs)
+        error = None
+        for ip_address in self.resolve(host, port):
+            try:
+                return self._create_connection((ip_address, port), *args, **kwargs)
+            except OSError as exc:
+                error = exc
+        self.invalidate(host)
+        if error is None:
+            raise OSError(f"Host '{host}' has no addresses")
+        raise error
+
+
+_dns_cache = None
+_dns_cache_lock = threading.Lock()
+
+
+def install_dns_cache() -> DnsCache:
+    """
+    Makes urllib3 connect through the DNS cache, it's installed once per process.
+
+    :return DnsCache
+        the DNS cache of the process
+    """
+    global _dns_cache
+    from urllib3.util import connection
+
+    with _dns_cache_lock:
+        if _dns_cache is None:
+            _dns_cache = DnsCache(connection.create_connection)
+            connection.create_connection = _dns_cache.create_connection
+        return _dns_cache
+
+
+def get_accept_encoding() -> str:
+    """
+    Returns encodings of responses which can be decoded, 'br' needs the brotli package.
+
+    :return str
+        value of the 'Accept-Encoding' header
+    """
+    try:
+        import brotli
+    except ImportError:
+        try:
+            import brotlicffi
+        except ImportError:
+            return "gzip, deflate"
+    return "gzip, deflate, br"
+
+
+def create_session(host_connections: int = 8, hosts: int = 32):
+    """
+    Creates the session shared by all network requests of the process.
+    Connections are kept alive and reused, the number of connections to one host is limited,
+    requests wait for a free connection. Compressed responses are accepted and hosts are
+    resolved through the DNS cache.
+
+    :param host_connections : int
+        maximum number of connections to one host
+    :param hosts : int
+        number of hosts whose connections are kept
+
+    :return requests.Session
+        the session with pools of connections
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    install_dns_cache()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=host_connections, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = get_accept_encoding()
+    return session
@@ -0,0 +1,175 @@
+import datetime as dt
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+log = logging.getLogger(__name__)
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+class Watcher:
+    """
+    A class to poll feeds in one long-running process.
+
+    Feeds are kept in a priority queue ordered by the time of the next poll.
+    The interval of every feed respects its 'ttl', 'skipHours' and 'skipDays',
+    failed polls are retried with exponential backoff. State of the process,
+    e.g. sets of cached news and indexes, stays in memory between polls.
+
+    Attributes
+    ----------
+    poll : callable
+        function which fetches and caches the feed and returns its schedule
+
+    interval : float
+        minimum number of seconds between polls of a feed
+
+    max_interval : float
+        maximum number of seconds between polls of a failing feed
+
+    workers : int
+        maximum number of feeds polled at the same time
+
+    clock : callable
+        function which returns the current time in seconds since the epoch
+
+    Methods
+    -------
+    def get_next_poll(self, source, now):
+        Returns the time of the next poll of the feed.
+
+    def poll_source(self, source):
+        Polls the feed and returns the time of its next poll.
+
+    def run(self, polls=None):
+        Polls feeds when they are due until the watcher is stopped.
+
+    def stop(self):
+        Stops the watcher.
+    """
+    def __init__(
+            self, sources: list, poll, interval: float = 900, max_interval: float = 86400, workers: int = 8,
+            clock=time.time
+    ):
+        """
+        Constructs all attributes for the 'Watcher' object, all feeds are due at once.
+
+        :param sources : list
+            urls of sources of rss news
+        :param poll : callable
+            function which fetches and caches the feed and returns its schedule
+        :param interval : float
+            minimum number of seconds between polls of a feed
+        :param max_interval : float
+            maximum number of seconds between polls of a failing feed
+        :param workers : int
+            maximum number of feeds polled at the same time
+        :param clock : callable
+            function which returns the current time in seconds since the epoch
+        """
+        self.poll = poll
+        self.interval = interval
+        self.max_interval = max_interval
+        self.workers = workers
+        self.clock = clock
+        self._order = itertools.count()
+        self._queue = [(0.0, next(self._order), source) for source in dict.fromkeys(sources)]
+        self._schedules = {}
+        self._failures = {}
+        self._stopped = threading.Event()
+
+    def get_next_poll(self, source: str, now: float) -> float:
+        """
+        Returns the time of the next poll of the feed. The interval is the 'ttl' of the feed
+        but not less than the minimum interval, it is doubled after every failed poll
+        up to the maximum interval. Hours and days skipped by the feed are passed over.
+
+        :param source : str
+            url of source of rss news
+        :param now : float
+            time of the end of the last poll
+
+        :return float
+            time of the next poll in seconds since the epoch
+        """
+        schedule = self._schedules.get(source, {})
+        failures = self._failures.get(source, 0)
+        if failures:
+            interval = min(self.interval * 2 ** failures, self.max_interval)
+        else:
+            interval = max(self.interval, (schedule.get("ttl") or 0) * 60)
+        moment = dt.datetime.fromtimestamp(now + interval, dt.timezone.utc)
+        skip_hours = set(schedule.get("skip_hours") or [])
+        skip_days = set(schedule.get("skip_days") or [])
+        for _ in range(24 * 7):
+            if moment.hour not in skip_hours and DAYS[moment.weekday()] not in skip_days:
+                return moment.timestamp()
+            moment = moment.replace(minute=0, second=0, microsecond=0) + dt.timedelta(hours=1)
+        log.info(f"Feed '{source}' skips every hour, its skipHours and skipDays are ignored")
+        return now + interval
+
+    def poll_source(self, source: str) -> float:
+        """
+        Polls the feed and returns the time of its next poll.
+
+        :param source : str
+            url of source of rss news
+
+        :return float
+            time of the next poll in seconds since the epoch
+        """
+        try:
+            self._schedules[source] = self.poll(source) or {}
+            self._failures.pop(source, None)
+        except Exception as exc:
+            self._failures[source] = self._failures.get(source, 0) + 1
+            log.error(
+                f"Exception occurred '{type(exc).__name__}' while polling '{source}', "
+                f"failures in a row: {self._failures[source]}"
+            )
+        next_poll = self.get_next_poll(source, self.clock())
+        moment = dt.datetime.fromtimestamp(next_poll, dt.timezone.utc)
+        log.info(f"Next poll of '{source}' at {moment:%Y-%m-%d %H:%M:%S} UTC")
+        return next_poll
+
+    def run(self, polls: int = None):
+        """
+        Polls feeds when they are due until the watcher is stopped.
+        Feeds are polled in a pool of threads, every feed is put back to the queue
+        as soon as its poll is finished, so a slow feed doesn't delay others.
+
+        :param polls : int or None
+            stop after the number of polls, e.g. for tests
+        """
+        log.info(f"Watching {len(self._queue)} feeds")
+        heapq.heapify(self._queue)
+        count = 0
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stopped.is_set():
+                can_poll = polls is None or count < polls
+                while can_poll and self._queue and self._queue[0][0] <= self.clock():
+                    source = heapq.heappop(self._queue)[2]
+                    running[executor.submit(self.poll_source, source)] = source
+                    count += 1
+                    can_poll = polls is None or count < polls
+                if not running and not (can_poll and self._queue):
+                    break
+                timeout = max(self._queue[0][0] - self.clock(), 0) if can_poll and self._queue else None
+                if not running:
+                    self._stopped.wait(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    heapq.heappush(self._queue, (future.result(), next(self._order), running.pop(future)))
+
+    def stop(self):
+        """
+        Stops the watcher, polls which have started are finished.
+        """
+        self._stopped.set()
@@ -0,0 +1,87 @@
+import unittest
+from unittest.mock import Mock
+import requests
+from rss_reader.fetch import CircuitBreaker, CircuitOpenError, DeadlineExceededError, FetchPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestFetchPolicy(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+
+    def create_policy(self, **kwargs):
+        return FetchPolicy(clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_retries_with_backoff(self):
+        response = Mock(status_code=200)
+        send = Mock(side_effect=[requests.exceptions.ConnectTimeout, requests.exceptions.ConnectionError, response])
+        policy = self.create_policy(retries=2, backoff=1, max_backoff=1.5)
+        self.assertIs(policy.get("https://a.com/rss", send, stream=True), response)
+        self.assertEqual(send.call_count, 3)
+        send.assert_called_with("https://a.com/rss", timeout=(5, 30), stream=True)
+        self.assertLessEqual(self.clock.now, 2.5)
+
+    def test_error_statuses_retried(self):
+        responses = [Mock(status_code=503), Mock(status_code=503)]
+        policy = self.create_policy(retries=1)
+        self.assertIs(policy.get("https://a.com/rss", Mock(side_effect=responses)), responses[1])
+        responses[0].close.assert_called_once()
+        responses[1].close.assert_not_called()
+
+    def test_last_error_raised(self):
+        send = Mock(side_effect=requests.exceptions.ReadTimeout)
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.create_policy(retries=1).get("https://a.com/rss", send)
+        self.assertEqual(send.call_count, 2)
+
+    def test_circuit_breaker(self):
+        send = Mock(side_effect=requests.exceptions.ConnectionError)
+        policy = self.create_policy(retries=0, threshold=2, cooldown=30)
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                policy.get("https://cdn.com/1.png", send)
+        with self.assertRaises(CircuitOpenError):
+            policy.get("https://cdn.com/2.png", send)
+        self.assertEqual(send.call_count, 2)
+        send.side_effect = None
+        send.return_value = Mock(status_code=200)
+        self.assertIs(policy.get("https://other.com/1.png", send), send.return_value)
+        self.clock.now += 30
+        self.assertIs(policy.get("https://cdn.com/2.png", send), send.return_value)
+        self.assertEqual(policy.get_breaker("cdn.com").failures, 0)
+
+    def test_deadline(self):
+        send = Mock(return_value=Mock(status_code=200))
+        policy = self.create_policy(deadline=10)
+        self.clock.now = 8
+        policy.get("https://a.com/rss", send)
+        send.assert_called_with("https://a.com/rss", timeout=(2, 2))
+        self.clock.now = 10
+        with self.assertRaises(DeadlineExceededError):
+            policy.get("https://a.com/rss", send)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_one_trial_after_cooldown(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=10)
+        breaker.record(False, 0)
+        self.assertFalse(breaker.allow(5))
+        self.assertTrue(breaker.allow(10))
+        self.assertFalse(breaker.allow(10))
+        breaker.record(False, 11)
+        self.assertFalse(breaker.allow(20))
+        self.assertTrue(breaker.allow(21))
+
+
+if __name__ == "__main__":
+    unittest.main()
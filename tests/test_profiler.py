@@ -0,0 +1,89 @@
+import os
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+from rss_reader.profiler import Profiler
+
+
+def allocate():
+    return bytearray(4 * 1024 * 1024)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_stages_summed_by_name(self):
+        profiler = Profiler()
+        profiler.start()
+        for _ in range(2):
+            with profiler.stage("parse"):
+                allocate()
+        with profiler.stage("render"):
+            pass
+        report = profiler.stop()
+        self.assertEqual(report["stages"]["parse"]["calls"], 2)
+        self.assertGreaterEqual(report["stages"]["parse"]["peak_memory"], 4 * 1024 * 1024)
+        self.assertLess(report["stages"]["render"]["peak_memory"], 4 * 1024 * 1024)
+        self.assertGreaterEqual(report["peak_memory"], 4 * 1024 * 1024)
+        self.assertGreaterEqual(report["wall"], report["stages"]["parse"]["wall"])
+
+    def test_nested_stages_subtracted(self):
+        profiler = Profiler()
+        profiler.start()
+        with profiler.stage("parse"):
+            for _ in range(3):
+                with profiler.stage("fetch", 0):
+                    time.sleep(0.02)
+        report = profiler.stop()
+        self.assertEqual(report["stages"]["fetch"]["calls"], 0)
+        self.assertGreaterEqual(report["stages"]["fetch"]["wall"], 0.06)
+        self.assertLess(report["stages"]["parse"]["wall"], 0.02)
+
+    def test_stage_measured_on_exception(self):
+        profiler = Profiler()
+        profiler.start()
+        with self.assertRaises(RuntimeError):
+            with profiler.stage("fetch"):
+                raise RuntimeError
+        self.assertEqual(profiler.stop()["stages"]["fetch"]["calls"], 1)
+
+    def test_counters_from_threads(self):
+        profiler = Profiler()
+        profiler.start()
+        threads = [threading.Thread(target=lambda: [profiler.add("items_parsed", 2) for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        profiler.add("images_skipped")
+        self.assertEqual(profiler.stop()["counters"], {"items_parsed": 800, "images_skipped": 1})
+
+    def test_stats_of_threads_dumped(self):
+        profiler = Profiler(stats=True)
+        profiler.start()
+
+        def parse():
+            with profiler.stage("parse"):
+                allocate()
+
+        thread = threading.Thread(target=parse)
+        thread.start()
+        thread.join()
+        profiler.stop()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.pstats")
+            profiler.dump_stats(path)
+            functions = {function for _, _, function in pstats.Stats(path).stats}
+        self.assertIn("allocate", functions)
+
+    def test_dump_without_stats(self):
+        profiler = Profiler()
+        profiler.start()
+        profiler.stop()
+        with self.assertRaises(ValueError):
+            profiler.dump_stats("run.pstats")
+
+
+if __name__ == "__main__":
+    unittest.main()
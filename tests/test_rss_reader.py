@@ -1,10 +1,21 @@
+import io
 import json
 import logging
+import os
+import stat
+import subprocess
+import sys
+import tempfile
 import unittest
 from unittest.mock import Mock, patch
 import bs4
+import PIL.Image
+import pypdf
 import requests
 import rss_reader.rss_reader as rss_reader
+from rss_reader.fetch import FetchPolicy
+from rss_reader.profiler import Profiler
+from rss_reader.sqlite_store import SqliteStore
 
 
 logging.disable(logging.CRITICAL)
@@ -24,6 +35,19 @@ class TestCreateLogger(unittest.TestCase):
         self.assertEqual(result.level, 0)
 
 
+class TestLazyImports(unittest.TestCase):
+    def test_heavy_modules_not_imported(self):
+        code = (
+            "import sys, rss_reader.rss_reader; "
+            "print(','.join(m for m in ('requests', 'bs4', 'xhtml2pdf') if m in sys.modules))"
+        )
+        with tempfile.TemporaryDirectory() as cwd:
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            process = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+            self.assertEqual(process.stdout.strip(), "")
+            self.assertFalse(os.path.exists(os.path.join(cwd, "file.log")))
+
+
 class TestIsDateValid(unittest.TestCase):
     def test_valid_date(self):
         date = "20211029"
@@ -81,52 +105,163 @@ class TestIsResponseSuccessful(unittest.TestCase):
         self.assertEqual(result, False)
 
 
-class TestGetSoup(unittest.TestCase):
-    def test_html_text(self):
-        mock_response = Mock()
-        mock_response.text = "<p>Something hilarious</p>"
-        result = rss_reader.get_soup(mock_response)
-        self.assertIsInstance(result, bs4.BeautifulSoup)
+class TestIsResponseNotModified(unittest.TestCase):
+    def test_not_modified_status_code(self):
+        self.assertEqual(rss_reader.is_response_not_modified(304), True)
 
+    def test_successful_status_code(self):
+        self.assertEqual(rss_reader.is_response_not_modified(200), False)
 
-class TestIsRss(unittest.TestCase):
-    def test_soup_with_rss(self):
-        soup = bs4.BeautifulSoup("<rss version='2.0' xmlns:'atom=http://www.w3.org/2005/Atom'>", "lxml-xml")
-        result = rss_reader.is_rss(soup)
-        self.assertEqual(result, None)
 
-    def test_soup_without_rss(self):
-        soup = bs4.BeautifulSoup("<html lang='ru'>", "lxml-xml")
-        with self.assertRaises(requests.exceptions.InvalidURL):
-            rss_reader.is_rss(soup)
+class TestValidators(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+        os.makedirs(os.path.join("cache", "news.yahoo.com"))
 
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
 
-class TestGetItems(unittest.TestCase):
-    def test_soup_with_items(self):
-        xml_content = "<rss><item>Abc</item>, <item>Def</item>, <item>Ghi</item></rss>"
-        soup = bs4.BeautifulSoup(xml_content, "lxml-xml")
-        items_list = soup.find_all("item")
-        result = rss_reader.get_items(soup)
-        self.assertEqual(result, items_list)
-
-    def test_soup_without_items(self):
-        xml_content = "<rss><p>Abc</p>, <p>Def</p>, <p>Ghi</p></rss>"
-        soup = bs4.BeautifulSoup(xml_content, "lxml-xml")
-        items_list = soup.find_all("item")
-        result = rss_reader.get_items(soup)
-        self.assertEqual(result, items_list)
+    def test_saved_validators(self):
+        source = "https://news.yahoo.com/rss"
+        mock_response = Mock()
+        mock_response.headers = {"ETag": '"abc"', "Last-Modified": "Sat, 30 Oct 2021 06:12:19 GMT"}
+        rss_reader.save_validators("news.yahoo.com", source, mock_response, "Yahoo News")
+        validators = rss_reader.get_validators("news.yahoo.com", source)
+        self.assertEqual(validators["title"], "Yahoo News")
+        self.assertEqual(validators["news"], [])
+        self.assertEqual(os.listdir(os.path.join("cache", "news.yahoo.com")), ["validators.json"])
+        result = rss_reader.get_conditional_headers(validators)
+        self.assertEqual(result, {
+            "If-None-Match": '"abc"',
+            "If-Modified-Since": "Sat, 30 Oct 2021 06:12:19 GMT",
+        })
+
+    def test_unknown_source(self):
+        result = rss_reader.get_validators("news.yahoo.com", "https://news.yahoo.com/rss")
+        self.assertEqual(result, {})
+        self.assertEqual(rss_reader.get_conditional_headers(result), {})
+
+
+class TestStripHtml(unittest.TestCase):
+    def test_same_text_as_soup(self):
+        descriptions = [
+            "<p>Some <b>bold</b> text &amp; <a href='x'>link</a></p><img src='a.jpg'/>",
+            "<!-- comment -->before<script>var a = 1;</script>after<style>p {}</style>",
+            "<ruby>漢<rt>kan</rt><rp>(</rp></ruby><br>  tail  <template>hidden</template>",
+            "</div>&lt;not a tag&gt;<!DOCTYPE html>é",
+            "plain text",
+            "",
+        ]
+        for description in descriptions:
+            result = rss_reader.strip_html(description)
+            self.assertEqual(result, bs4.BeautifulSoup(description, "lxml").get_text("\n", strip=True))
+
+
+class TestHtmlToText(unittest.TestCase):
+    @patch("rss_reader.rss_reader.strip_html")
+    def test_memoized(self, mock_strip_html):
+        mock_strip_html.return_value = "text"
+        description = "<p>Repeated boilerplate description of TestHtmlToText</p>"
+        for _ in range(3):
+            result = rss_reader.html_to_text(description)
+        self.assertEqual(result, "text")
+        mock_strip_html.assert_called_once_with(description)
+
+
+class TestStreamParser(unittest.TestCase):
+    xml_content = (
+        b"<rss xmlns:media='http://search.yahoo.com/mrss/'><channel><title>Feed</title>"
+        b"<item><title>Abc</title><link>link_1</link><media:content url='image_1'/></item>"
+        b"<item><title>Def</title><link>link_2</link>"
+        b"<description>&lt;p&gt;Some &lt;b&gt;text&lt;/b&gt;&lt;/p&gt;</description></item>"
+        b"<item><title>Ghi</title></item></channel></rss>"
+    )
+
+    def test_items_from_chunks(self):
+        chunks = [self.xml_content[i:i + 10] for i in range(0, len(self.xml_content), 10)]
+        parser = rss_reader.StreamParser(chunks)
+        result = list(parser)
+        self.assertEqual(parser.title, "Feed")
+        self.assertEqual([item["title"] for item in result], ["Abc", "Def", "Ghi"])
+        self.assertEqual(result[0]["enclosure"], "image_1")
+        self.assertEqual(result[0]["links"], ["link_1", "image_1"])
+        self.assertEqual(result[1]["description"], "Some\ntext")
+
+    def test_schedule(self):
+        xml_content = (
+            b"<rss><channel><title>Feed</title><ttl>60</ttl><skipHours><hour>0</hour><hour>23</hour></skipHours>"
+            b"<skipDays><day>Sunday</day></skipDays><item><title>Abc</title></item></channel></rss>"
+        )
+        parser = rss_reader.StreamParser([xml_content])
+        list(parser)
+        self.assertEqual(parser.schedule, {"ttl": 60, "skip_hours": [0, 23], "skip_days": ["Sunday"]})
+
+    def test_single_pass_scraping(self):
+        xml_content = (
+            b"<rss xmlns:media='http://search.yahoo.com/mrss/'><channel><item><title>Abc</title><link>link_1</link>"
+            b"<pubDate>Sat, 30 Oct 2021 09:05:17 +0300</pubDate><source url='source_url'>Source</source>"
+            b"<media:thumbnail url='thumbnail'/><enclosure url='enclosure'/></item></channel></rss>"
+        )
+        result = list(rss_reader.StreamParser([xml_content]))
+        self.assertEqual(result, [{
+            "date": "Sat, 30 Oct 2021 09:05:17 +0300",
+            "title": "Abc",
+            "source": "Source",
+            "category": None,
+            "link": "link_1",
+            "enclosure": "enclosure",
+            "description": None,
+            "links": ["link_1", "source_url", "thumbnail", "enclosure"],
+            "guid": None,
+        }])
+
+    def test_limit(self):
+        end = self.xml_content.index(b"</item>") + len(b"</item>")
+        chunks = iter([self.xml_content[:end], self.xml_content[end:]])
+        result = list(rss_reader.StreamParser(chunks, limit=1))
+        self.assertEqual(len(result), 1)
+        self.assertEqual(next(chunks), self.xml_content[end:])
+
+    def test_not_rss(self):
+        with self.assertRaises(requests.exceptions.InvalidURL):
+            list(rss_reader.StreamParser([b"<html lang='ru'><body></body></html>"]))
+
+    def test_known_items(self):
+        xml_content = b"<rss><channel>" + b"".join(
+            f"<item><title>{i}</title><guid>guid_{i}</guid></item>".encode() for i in range(10)
+        ) + b"</channel></rss>"
+        parser = rss_reader.StreamParser([xml_content], seen={"guid_1", "guid_3", "guid_4", "guid_5"}, known_run=3)
+        result = list(parser)
+        self.assertEqual([item["title"] for item in result], ["0", "2"])
+        self.assertEqual(parser.skipped, 4)
+
+
+class TestNovelty(unittest.TestCase):
+    def test_fields_by_key(self):
+        result = rss_reader.Novelty(title="Abc", link="link_1", enclosure="enclosure", guid="guid_1")
+        result["enclosure"] = "path"
+        self.assertEqual(result.enclosure, "path")
+        self.assertEqual(dict(result), result.dictionary)
+        self.assertNotIn("guid", result.dictionary)
+        with self.assertRaises(KeyError):
+            result["item"]
+
+    def test_no_instance_dictionary(self):
+        result = rss_reader.Novelty(title="Abc")
+        self.assertFalse(hasattr(result, "__dict__"))
+        self.assertEqual(result.title, "Abc")
+        self.assertEqual(result.link, None)
+
+    def test_empty_novelty(self):
+        result = rss_reader.Novelty()
+        self.assertEqual(result.dictionary, dict.fromkeys(rss_reader.Novelty.fields))
+        self.assertEqual(result.guid, None)
 
 
 class TestCreateNews(unittest.TestCase):
-    def test_novelty_objects(self):
-        xml_content = "<rss><item>Abc</item>, <item>Def</item>, <item>Ghi</item></rss>"
-        soup = bs4.BeautifulSoup(xml_content, "lxml-xml")
-        items_list = soup.find_all("item")
-        result = rss_reader.create_news(items_list)
-        self.assertIsInstance(result, list)
-        for item in result:
-            self.assertIsInstance(item, rss_reader.Novelty)
-
     def test_dictionary_objects(self):
         dicts_list = []
         for i in range(3):
@@ -151,45 +286,392 @@ class TestCreateNews(unittest.TestCase):
             self.assertIsInstance(item, rss_reader.Novelty)
 
 
-class TestGetDateFormat(unittest.TestCase):
-    def test_valid_date_format(self):
-        mock_one_news = Mock()
-        dates = {
-            "Sat, 30 Oct 2021 09:05:17 +0300": "%a, %d %b %Y %H:%M:%S %z",
-            "Sat, 30 Oct 2021 06:12:19 GMT": "%a, %d %b %Y %H:%M:%S %Z",
-            "2021-10-27T15:36:51Z": "%Y-%m-%dT%H:%M:%SZ",
-        }
-        news = []
-        for date, date_format in dates.items():
-            mock_one_news.dictionary = {"date": f"{date}"}
-            result = rss_reader.get_date_format(mock_one_news)
-            self.assertEqual(result, date_format)
-
-    def test_invalid_date_format(self):
-        mock_one_news = Mock()
-        mock_one_news.dictionary = {"date": "30-10-2021"}
-        with self.assertRaises(ValueError):
-            rss_reader.get_date_format(mock_one_news)
-
-
 class TestCreateNewsDict(unittest.TestCase):
     def test_news_with_date(self):
-        mock_news_1 = Mock()
-        mock_news_2 = Mock()
-        mock_news_3 = Mock()
-        mock_news_1.dictionary = {"date": "Sat, 30 Oct 2021 09:05:17 +0300"}
-        mock_news_2.dictionary = {"date": "Sat, 29 Oct 2021 09:05:17 +0300"}
-        mock_news_3.dictionary = {"date": "Sat, 28 Oct 2021 09:05:17 +0300"}
-        news = [mock_news_1, mock_news_2, mock_news_3]
+        news = [
+            rss_reader.Novelty(date="Sat, 30 Oct 2021 09:05:17 +0300"),
+            rss_reader.Novelty(date="Sat, 29 Oct 2021 09:05:17 +0300"),
+            rss_reader.Novelty(date="Sat, 28 Oct 2021 09:05:17 +0300"),
+        ]
         dates = ["20211030", "20211029", "20211028"]
         result = rss_reader.create_news_dict(news)
         for date in dates:
             self.assertIn(date, result)
 
+    def test_mixed_date_formats(self):
+        news = [
+            rss_reader.Novelty(date="Sat, 30 Oct 2021 09:05:17 +0300"),
+            rss_reader.Novelty(date="2021-10-30T15:36:51Z"),
+            rss_reader.Novelty(date="Fri, 29 Oct 2021 06:12:19 GMT"),
+            rss_reader.Novelty(date="30-10-2021"),
+            rss_reader.Novelty(date=None),
+        ]
+        result = rss_reader.create_news_dict(news)
+        self.assertEqual(result, {"20211030": news[:2], "20211029": news[2:3]})
+
+
+class TestDateParser(unittest.TestCase):
+    def test_known_formats(self):
+        dates = {
+            "Sat, 30 Oct 2021 09:05:17 +0300": "20211030",
+            "Sat, 30 Oct 2021 06:12:19 GMT": "20211030",
+            "30 Oct 2021 06:12 EST": "20211030",
+            "2021-10-27T15:36:51Z": "20211027",
+            "2021-10-27T15:36:51.123+03:00": "20211027",
+            "2021-10-27": "20211027",
+        }
+        date_parser = rss_reader.DateParser()
+        for date, day in dates.items():
+            self.assertEqual(date_parser.get_day(date), day)
+
+    def test_last_parser_first(self):
+        date_parser = rss_reader.DateParser()
+        date_parser.get_day("2021-10-27T15:36:51Z")
+        self.assertIs(date_parser.last, rss_reader.parse_iso_8601)
+
+    def test_invalid_date(self):
+        date_parser = rss_reader.DateParser()
+        for date in ["30-10-2021", "Sat, 32 Oct 2021 09:05:17 +0300", "2021-02-30T15:36:51Z"]:
+            with self.assertRaises(ValueError):
+                date_parser.get_day(date)
+
+
+class TestCacheImages(unittest.TestCase):
+    @patch("rss_reader.rss_reader.download_image")
+    def test_each_url_downloaded_once(self, mock_download_image):
+        mock_download_image.side_effect = lambda url: f"{url}.png"
+        news = [{"enclosure": "image_1"}, {"enclosure": None}, {"enclosure": "image_1"}, {"enclosure": "image_2"}]
+        result = rss_reader.cache_images(news, 2)
+        self.assertEqual(mock_download_image.call_count, 2)
+        self.assertEqual(
+            [one_news["enclosure"] for one_news in result],
+            ["image_1.png", None, "image_1.png", "image_2.png"],
+        )
+
+
+class TestCreateThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def create_image(self, name, size, mode="RGB"):
+        PIL.Image.new(mode, size).save(name)
+        return os.path.abspath(name)
+
+    def test_thumbnail_cached(self):
+        image_path = self.create_image("large.png", (1600, 1000))
+        news = [rss_reader.Novelty(enclosure=image_path), rss_reader.Novelty(enclosure=image_path)]
+        rss_reader.create_thumbnails(news, (400, 400))
+        thumbnail_path = news[0].enclosure
+        self.assertTrue(thumbnail_path.endswith("_400x400.jpeg"))
+        self.assertEqual(news[1].enclosure, thumbnail_path)
+        with PIL.Image.open(thumbnail_path) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 250))
+        self.assertEqual(stat.S_IMODE(os.stat(thumbnail_path).st_mode), 0o666 & ~rss_reader.UMASK)
+        with patch("PIL.Image.open") as mock_open:
+            self.assertEqual(rss_reader.derive_thumbnail(image_path, (400, 400)), thumbnail_path)
+        mock_open.assert_not_called()
+        self.assertNotEqual(rss_reader.derive_thumbnail(image_path, (200, 200)), thumbnail_path)
+
+    def test_transparent_image(self):
+        image_path = self.create_image("large.png", (1000, 1000), "RGBA")
+        self.assertTrue(rss_reader.derive_thumbnail(image_path, (400, 400)).endswith("_400x400.png"))
+
+    def test_small_and_broken_images_not_changed(self):
+        image_path = self.create_image("small.png", (100, 100))
+        with open("broken.png", "wb") as broken_file:
+            broken_file.write(b"not an image")
+        news = [rss_reader.Novelty(enclosure=image_path), rss_reader.Novelty(enclosure="broken.png")]
+        rss_reader.create_thumbnails(news, (400, 400))
+        self.assertEqual([one_news.enclosure for one_news in news], [image_path, "broken.png"])
+        self.assertFalse(os.path.exists(rss_reader.THUMBNAILS_DIRECTORY))
+
+
+class TestPublishImage(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.temp_dir.name, "image.png")
+        self.destination = os.path.join(self.temp_dir.name, "published.png")
+        with open(self.source, "wb") as image:
+            image.write(b"image content")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_linked_then_skipped(self):
+        self.assertEqual(rss_reader.publish_image(self.source, self.destination), "linked")
+        self.assertTrue(os.path.samefile(self.source, self.destination))
+        self.assertEqual(rss_reader.publish_image(self.source, self.destination), "skipped")
+
+    @patch("os.link", side_effect=OSError)
+    @patch("fcntl.ioctl", side_effect=OSError)
+    def test_copied_then_skipped(self, mock_ioctl, mock_link):
+        self.assertEqual(rss_reader.publish_image(self.source, self.destination), "copied")
+        with open(self.destination, "rb") as image:
+            self.assertEqual(image.read(), b"image content")
+        with patch("shutil.copy2") as mock_copy:
+            self.assertEqual(rss_reader.publish_image(self.source, self.destination), "skipped")
+        mock_copy.assert_not_called()
+
+    def test_changed_file_replaced(self):
+        with open(self.destination, "wb") as image:
+            image.write(b"other content")
+        self.assertEqual(rss_reader.publish_image(self.source, self.destination), "linked")
+        with open(self.destination, "rb") as image:
+            self.assertEqual(image.read(), b"image content")
+
+    @patch("requests.Session.get")
+    def test_published_image_readable_by_others(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.headers = {"Content-Type": "image/png"}
+        mock_response.iter_content.return_value = [b"image content"]
+        cwd = os.getcwd()
+        os.chdir(self.temp_dir.name)
+        try:
+            news = [rss_reader.Novelty(enclosure=rss_reader.download_image("https://s.yimg.com/1.png"))]
+            rss_reader.copy_images(news, "feed", "html")
+        finally:
+            os.chdir(cwd)
+        published = os.path.join(self.temp_dir.name, "html", news[0].enclosure)
+        self.assertEqual(stat.S_IMODE(os.stat(published).st_mode), 0o666 & ~rss_reader.UMASK)
+
+    def test_copy_images_publishes_once(self):
+        news = [rss_reader.Novelty(enclosure=self.source), rss_reader.Novelty(enclosure=self.source)]
+        with patch("rss_reader.rss_reader.publish_image", return_value="linked") as mock_publish:
+            rss_reader.copy_images(news, "feed", self.temp_dir.name)
+        mock_publish.assert_called_once_with(self.source, os.path.join(self.temp_dir.name, "feed", "image.png"))
+        self.assertEqual([one_news.enclosure for one_news in news], [os.path.join("feed", "image.png")] * 2)
+
+
+class TestDownloadImage(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    @patch("requests.Session.get")
+    def test_same_content_stored_once(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.headers = {"Content-Type": "image/png"}
+        mock_response.iter_content.return_value = [b"image ", b"content"]
+        first = rss_reader.download_image("https://s.yimg.com/1.png")
+        second = rss_reader.download_image("https://s.yimg.com/2.png")
+        self.assertEqual(first, second)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("requests.Session.get")
+    def test_files_readable_by_others(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.headers = {"Content-Type": "image/png"}
+        mock_response.iter_content.return_value = [b"image content"]
+        file_path = rss_reader.download_image("https://s.yimg.com/1.png")
+        rss_reader.save_manifest({})
+        mode = 0o666 & ~rss_reader.UMASK
+        self.assertEqual(stat.S_IMODE(os.stat(file_path).st_mode), mode)
+        self.assertEqual(stat.S_IMODE(os.stat(rss_reader.MANIFEST_PATH).st_mode), mode)
+
+    @patch("requests.Session.get")
+    def test_known_url_not_downloaded(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.headers = {"Content-Type": "image/jpeg"}
+        mock_response.iter_content.return_value = [b"image content"]
+        first = rss_reader.download_image("https://s.yimg.com/1.jpeg")
+        second = rss_reader.download_image("https://s.yimg.com/1.jpeg")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("requests.Session.get")
+    def test_error_response_not_stored(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.ok = False
+        mock_response.headers = {"Content-Type": "image/png"}
+        result = rss_reader.download_image("https://s.yimg.com/1.png")
+        self.assertIsNone(result)
+        self.assertNotIn("https://s.yimg.com/1.png", rss_reader.get_image_index())
+
+    @patch("requests.Session.get", side_effect=requests.exceptions.ConnectTimeout)
+    def test_unavailable_host_skipped(self, mock_get):
+        with patch("rss_reader.rss_reader.fetch_policy", FetchPolicy(retries=0, threshold=1)):
+            self.assertIsNone(rss_reader.download_image("https://s.yimg.com/1.png"))
+            self.assertIsNone(rss_reader.download_image("https://s.yimg.com/2.png"))
+        self.assertEqual(mock_get.call_count, 1)
+
+    @patch("requests.Session.get")
+    def test_temporary_file_removed_on_error(self, mock_get):
+        mock_response = mock_get.return_value
+        mock_response.headers = {"Content-Type": "image/png"}
+        mock_response.iter_content.side_effect = requests.exceptions.ChunkedEncodingError
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            rss_reader.download_image("https://s.yimg.com/1.png")
+        self.assertEqual(os.listdir(rss_reader.IMAGES_DIRECTORY), [])
+
+
+class TestCacheNews(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    def test_known_news_skipped(self, mock_cache_images):
+        date = "Sat, 30 Oct 2021 09:05:17 +0300"
+        news = [rss_reader.Novelty(title="1", date=date, guid="guid_1", link="link_1")]
+        rss_reader.cache_news("news.yahoo.com", news)
+        news = [
+            rss_reader.Novelty(title="2", date=date, guid="guid_2", link="link_2"),
+            rss_reader.Novelty(title="1 edited", date=date, guid="guid_1", link="link_1"),
+            rss_reader.Novelty(title="2", date=date, guid="guid_2", link="link_2"),
+        ]
+        rss_reader.cache_news("news.yahoo.com", news)
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual([news["title"] for news in result], ["2", "1"])
+        self.assertEqual(rss_reader.get_seen("news.yahoo.com"), {"guid_1", "guid_2"})
+
+    def test_seen_created_from_cache_files(self):
+        os.makedirs(os.path.join("cache", "news.yahoo.com"))
+        with open(os.path.join("cache", "news.yahoo.com", "news.yahoo.com_20211030.json"), "w") as json_file:
+            json.dump([{"title": "1", "date": "date", "description": None, "link": "link_1"}], json_file)
+        result = rss_reader.get_seen("news.yahoo.com")
+        self.assertIn("link_1", result)
+        self.assertTrue(rss_reader.is_known(rss_reader.Novelty(title="1", guid="guid_1", link="link_1"), result))
+        self.assertTrue(os.path.exists(os.path.join("cache", "news.yahoo.com", "seen.txt")))
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        if rss_reader.store is not None:
+            rss_reader.store.connection.close()
+            rss_reader.store = None
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    def test_updated_by_cache_news(self, mock_cache_images):
+        news = [
+            rss_reader.Novelty(title="1", date="Sat, 30 Oct 2021 09:05:17 +0300", link="link_1"),
+            rss_reader.Novelty(title="2", date="Fri, 29 Oct 2021 09:05:17 +0300", link="link_2"),
+        ]
+        rss_reader.cache_news("news.yahoo.com", news)
+        rss_reader.cache_news("news.yahoo.com", news)
+        result = rss_reader.get_manifest()
+        self.assertEqual(sorted(result), ["20211029", "20211030"])
+        self.assertEqual(result["20211030"]["news.yahoo.com"], {
+            "count": 1,
+            "location": os.path.join("cache", "news.yahoo.com", "news.yahoo.com_20211030.json"),
+        })
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    def test_listeners_notified(self, mock_cache_images):
+        listener = Mock()
+        news = [rss_reader.Novelty(title="1", date="Sat, 30 Oct 2021 09:05:17 +0300", link="link_1")]
+        with patch("rss_reader.rss_reader._cache_listeners", [listener]):
+            rss_reader.cache_news("news.yahoo.com", news)
+            rss_reader.cache_news("news.yahoo.com", news)
+        listener.assert_called_once_with("news.yahoo.com", ["20211030"])
+
+    def test_created_from_cache_files(self):
+        os.makedirs(os.path.join("cache", "news.yahoo.com"))
+        with open(os.path.join("cache", "news.yahoo.com", "news.yahoo.com_20211030.json"), "w") as json_file:
+            json.dump([{"title": "1"}, {"title": "2"}], json_file)
+        result = rss_reader.get_manifest()
+        self.assertEqual(result["20211030"]["news.yahoo.com"]["count"], 2)
+        self.assertTrue(os.path.exists(rss_reader.MANIFEST_PATH))
+
+    def test_created_from_store(self):
+        rss_reader.store = SqliteStore(rss_reader.DATABASE_PATH)
+        rss_reader.store.add("news.yahoo.com", "20211030", [("link_1", {"title": "1"})])
+        result = rss_reader.get_manifest()
+        self.assertEqual(result, {"20211030": {"news.yahoo.com": {"count": 1, "location": rss_reader.DATABASE_PATH}}})
+        self.assertTrue(os.path.exists(os.path.join("cache", "manifest_sqlite.json")))
+
+    @patch("rss_reader.rss_reader.cache_images")
+    def test_store_counts_only_added_news(self, mock_cache_images):
+        rss_reader.store = SqliteStore(rss_reader.DATABASE_PATH)
+        news = [
+            rss_reader.Novelty(title="2", date="Sat, 30 Oct 2021 09:05:17 +0300", link="link_2"),
+            rss_reader.Novelty(title="1", date="Sat, 30 Oct 2021 09:05:17 +0300", link="link_1"),
+        ]
+        rss_reader.store.add("news.yahoo.com", "20211030", [("link_1", dict(news[1]))])
+        rss_reader.cache_news("news.yahoo.com", news)
+        self.assertEqual(rss_reader.get_manifest()["20211030"]["news.yahoo.com"]["count"], 2)
 
-class TestPrintJson(unittest.TestCase):
     @patch("builtins.print")
-    def test_objects_news(self, mock_print):
+    def test_print_dates(self, mock_print):
+        os.makedirs("cache")
+        rss_reader.save_manifest({"20211030": {"news.yahoo.com": {"count": 2, "location": "path"}}})
+        rss_reader.print_dates(True)
+        result = json.loads(mock_print.call_args.args[0])
+        self.assertEqual(result, [{"date": "20211030", "feeds": 1, "news": 2}])
+
+
+class TestDateRange(unittest.TestCase):
+    manifest = {day: {"news.yahoo.com": {"count": 2}} for day in ["20211028", "20211029", "20211030", "20211101"]}
+
+    def test_get_days(self):
+        result = rss_reader.get_days(self.manifest, "20211029", "20211030")
+        self.assertEqual(result, ["20211030", "20211029"])
+        result = rss_reader.get_days(self.manifest, "20211030", None)
+        self.assertEqual(result, ["20211101", "20211030"])
+        result = rss_reader.get_days(self.manifest, None, "20211028")
+        self.assertEqual(result, ["20211028"])
+
+    @patch("rss_reader.rss_reader.get_cached_news")
+    def test_iter_cached_news_stops_at_limit(self, mock_get_cached_news):
+        mock_get_cached_news.side_effect = lambda directory, filename: [{"title": f"{filename}_{i}"} for i in range(2)]
+        days = rss_reader.get_days(self.manifest, None, None)
+        result = list(rss_reader.iter_cached_news("news.yahoo.com", days, limit=3))
+        self.assertEqual([news["title"] for news in result], [
+            "news.yahoo.com_20211101_0", "news.yahoo.com_20211101_1", "news.yahoo.com_20211030_0",
+        ])
+        self.assertEqual(mock_get_cached_news.call_count, 2)
+
+
+class TestCacheNewsInStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        rss_reader.store = SqliteStore(os.path.join(self.temp_dir.name, "news.sqlite3"))
+
+    def tearDown(self):
+        rss_reader.store.connection.close()
+        rss_reader.store = None
+        self.temp_dir.cleanup()
+
+    @patch("rss_reader.rss_reader.cache_images")
+    def test_only_new_news_added(self, mock_cache_images):
+        news_dict = {"20211030": [rss_reader.Novelty(title="1", link="link_1")]}
+        rss_reader.cache_news_in_store("news.yahoo.com", news_dict)
+        news_dict = {"20211030": [
+            rss_reader.Novelty(title="2", link="link_2"),
+            rss_reader.Novelty(title="1", link="link_1"),
+        ]}
+        rss_reader.cache_news_in_store("news.yahoo.com", news_dict)
+        self.assertEqual([len(call.args[0]) for call in mock_cache_images.call_args_list], [1, 1])
+        self.assertTrue(rss_reader.has_cached_news("news.yahoo.com", "news.yahoo.com_20211030"))
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual([news["title"] for news in result], ["2", "1"])
+
+
+class TestPrintJson(unittest.TestCase):
+    def test_objects_news(self):
         mock_one_news = Mock()
         mock_one_news.dictionary = {
             "date": "date_item",
@@ -205,10 +687,232 @@ class TestPrintJson(unittest.TestCase):
                 "links_item",
             ]
         }
-        news = [mock_one_news]
-        rss_reader.print_json(news)
-        list_dicts = [mock_one_news.dictionary]
-        mock_print.assert_called_with(json.dumps(list_dicts, ensure_ascii=False, indent=4))
+        news = [mock_one_news, mock_one_news]
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            rss_reader.print_json(iter(news))
+        list_dicts = [one_news.dictionary for one_news in news]
+        self.assertEqual(mock_stdout.getvalue(), json.dumps(list_dicts, ensure_ascii=False, indent=4) + "\n")
+
+    def test_no_news(self):
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            rss_reader.print_json(iter([]))
+        self.assertEqual(mock_stdout.getvalue(), "[]\n")
+
+
+class TestPrintNdjson(unittest.TestCase):
+    def test_one_news_per_line(self):
+        news = [rss_reader.Novelty(title="Заголовок 1"), rss_reader.Novelty(title="Title\n2")]
+        with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+            rss_reader.print_ndjson(iter(news))
+        result = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+        self.assertEqual(result, [one_news.dictionary for one_news in news])
+
+
+class TestRenderHtml(unittest.TestCase):
+    template = "<head><title></title><style>p {}</style></head><body>\n</body>\n</html>"
+
+    def test_escaped_markup(self):
+        news = [rss_reader.Novelty(
+            title="A & <b>B</b>", link="https://news.yahoo.com/?a=1&b=2", enclosure="image.png",
+            description="line 1\nline 2", links=["https://news.yahoo.com/?a=1&b=2"],
+        )]
+        output = io.StringIO()
+        rss_reader.render_html(self.template, iter(news), "Feed <1>", output, "@font-face {}")
+        soup = bs4.BeautifulSoup(output.getvalue(), "lxml")
+        self.assertEqual(soup.title.text, "Feed <1>")
+        self.assertEqual(soup.h1.text, "Feed <1>")
+        self.assertIn("@font-face {}", soup.style.text)
+        self.assertEqual(soup.find("p", attrs={"class": "title"}).text, "Title: A & <b>B</b>")
+        self.assertEqual(soup.find("p", attrs={"class": "description"}).get_text("|"), "Description: |line 1|line 2")
+        self.assertEqual(soup.img["src"], "image.png")
+        self.assertEqual(soup.img.parent["href"], "https://news.yahoo.com/?a=1&b=2")
+        self.assertEqual(soup.find("a", id="news0link0").text, "https://news.yahoo.com/?a=1&b=2")
+        self.assertIsNone(soup.find("p", attrs={"class": "source"}))
+
+    def test_convert_to_html(self):
+        with tempfile.TemporaryDirectory() as path:
+            rss_reader.convert_to(path, "html", [rss_reader.Novelty(title="Abc", links=[])], "news.yahoo.com", "Feed")
+            with open(os.path.join(path, "news.yahoo.com.html"), encoding="utf-8") as html_file:
+                soup = bs4.BeautifulSoup(html_file.read(), "lxml")
+        self.assertEqual(soup.title.text, "Feed")
+        self.assertEqual(len(soup.find_all("div")), 1)
+
+    def test_chunk_without_title(self):
+        output = io.StringIO()
+        rss_reader.render_html(self.template, [rss_reader.Novelty(links=["https://a.com"])], "Feed", output, start=50)
+        soup = bs4.BeautifulSoup(output.getvalue(), "lxml")
+        self.assertIsNone(soup.h1)
+        self.assertIsNotNone(soup.find("a", id="news50link0"))
+
+
+class TestCreatePdf(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(rss_reader.DATA_PATH, "templates", "template_for_pdf.html"), encoding="utf-8") as file:
+            self.template = file.read()
+        self.news = [rss_reader.Novelty(title=f"Новость {i}", links=[]) for i in range(5)]
+
+    def get_pages(self, path, workers):
+        with patch("rss_reader.rss_reader.PDF_CHUNK_SIZE", 2):
+            rss_reader.create_pdf(self.template, self.news, "Feed", path, "feed", workers)
+        reader = pypdf.PdfReader(os.path.join(path, "feed.pdf"))
+        fonts = {font["/BaseFont"] for page in reader.pages for font in page["/Resources"]["/Font"].values()}
+        self.assertIn("/AAAAAA+DejaVuSans-Bold", fonts)
+        return reader.pages
+
+    def test_chunks_concatenated(self):
+        with tempfile.TemporaryDirectory() as path:
+            pages = self.get_pages(path, 1)
+            self.assertEqual(len(pages), 5)
+            self.assertIn("Feed", pages[0].extract_text())
+            self.assertNotIn("Feed", pages[2].extract_text())
+            self.assertIn("Новость 4", pages[4].extract_text())
+
+    def test_chunks_in_process_pool(self):
+        try:
+            with tempfile.TemporaryDirectory() as path:
+                self.assertEqual(len(self.get_pages(path, 2)), 5)
+        finally:
+            rss_reader._pdf_executor.shutdown()
+            rss_reader._pdf_executor = None
+
+
+class TestGetSources(unittest.TestCase):
+    def test_sources_and_feeds_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            feeds = os.path.join(directory, "feeds.txt")
+            with open(feeds, "w", encoding="utf-8") as feeds_file:
+                feeds_file.write("# comment\nhttps://b.com/rss\n\nhttps://a.com/rss\n")
+            result = rss_reader.get_sources(["https://a.com/rss"], feeds)
+        self.assertEqual(result, ["https://a.com/rss", "https://b.com/rss"])
+
+    def test_feeds_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            rss_reader.get_sources([], "no_such_feeds_file.txt")
+
+
+class TestGetDirectoryLock(unittest.TestCase):
+    def test_same_directory_same_lock(self):
+        result = rss_reader.get_directory_lock("news.yahoo.com")
+        self.assertIs(result, rss_reader.get_directory_lock("news.yahoo.com"))
+        self.assertIsNot(result, rss_reader.get_directory_lock("news.google.com"))
+
+
+class TestProcessSource(unittest.TestCase):
+    source = "https://news.yahoo.com/rss"
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def get_response(status_code, titles=()):
+        items = "".join(
+            f"<item><title>{title}</title><guid>guid_{title}</guid><link>link_{title}</link>"
+            f"<pubDate>Sat, 30 Oct 2021 09:05:17 +0300</pubDate></item>"
+            for title in titles
+        )
+        response = Mock()
+        response.status_code = status_code
+        response.headers = {"ETag": '"etag"'}
+        response.iter_content.return_value = [f"<rss><channel><title>Feed</title>{items}</channel></rss>".encode()]
+        return response
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    @patch("rss_reader.rss_reader.get_response")
+    def test_reading_stops_at_limit(self, mock_get_response, mock_cache_images):
+        mock_get_response.return_value = self.get_response(200, range(10))
+        news, title, filename = rss_reader.process_source(self.source, None, limit=2)
+        self.assertEqual([one_news.title for one_news in news], ["0", "1"])
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual(len(result), 2)
+        validators = rss_reader.get_validators("news.yahoo.com", self.source)
+        self.assertEqual(rss_reader.get_conditional_headers(validators), {})
+        rss_reader.process_source(self.source, None)
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual(len(result), 10)
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    @patch("rss_reader.rss_reader.get_response")
+    def test_known_items_from_feed_news(self, mock_get_response, mock_cache_images):
+        mock_get_response.return_value = self.get_response(200, ["other", "1"])
+        rss_reader.process_source("https://news.yahoo.com/world/rss", None)
+        mock_get_response.return_value = self.get_response(200, ["2", "1"])
+        news, title, filename = rss_reader.process_source(self.source, None)
+        self.assertEqual([one_news.title for one_news in news], ["2", "1"])
+        mock_get_response.return_value = self.get_response(200, ["3", "2", "1"])
+        scrape_element = rss_reader.StreamParser.scrape_element
+        with patch("rss_reader.rss_reader.StreamParser.scrape_element", side_effect=scrape_element) as mock_scrape:
+            news, title, filename = rss_reader.process_source(self.source, None)
+        self.assertEqual(mock_scrape.call_count, 1)
+        self.assertEqual([one_news.title for one_news in news], ["3", "2", "1"])
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual([one_news["title"] for one_news in result], ["3", "2", "other", "1"])
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    @patch("rss_reader.rss_reader.get_response")
+    def test_not_modified_feed(self, mock_get_response, mock_cache_images):
+        mock_get_response.return_value = self.get_response(200, ["1", "2"])
+        rss_reader.process_source(self.source, None)
+        mock_get_response.return_value = self.get_response(200, ["3"])
+        rss_reader.process_source("https://news.yahoo.com/world/rss", None)
+        mock_get_response.return_value = not_modified = self.get_response(304)
+        news, title, filename = rss_reader.process_source(self.source, None)
+        self.assertEqual([one_news.title for one_news in news], ["1", "2"])
+        self.assertEqual(title, "Feed")
+        mock_get_response.assert_called_with(self.source, {"If-None-Match": '"etag"'})
+        not_modified.close.assert_called_once()
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    @patch("rss_reader.rss_reader.get_response")
+    def test_feed_cached_by_every_backend(self, mock_get_response, mock_cache_images):
+        titles = [str(i) for i in range(5)]
+        mock_get_response.return_value = self.get_response(200, titles)
+        rss_reader.process_source(self.source, None)
+        try:
+            rss_reader.store = SqliteStore(rss_reader.DATABASE_PATH)
+            mock_get_response.return_value = self.get_response(200, titles)
+            rss_reader.process_source(self.source, None)
+            mock_get_response.assert_called_with(self.source, {})
+            result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+            self.assertEqual([one_news["title"] for one_news in result], titles)
+        finally:
+            rss_reader.store.connection.close()
+            rss_reader.store = None
+        result = rss_reader.get_cached_news("news.yahoo.com", "news.yahoo.com_20211030")
+        self.assertEqual([one_news["title"] for one_news in result], titles)
+
+    @patch("rss_reader.rss_reader.cache_images", side_effect=lambda news, workers: news)
+    @patch("rss_reader.rss_reader.get_response")
+    def test_profiled_stages_and_counters(self, mock_get_response, mock_cache_images):
+        mock_get_response.return_value = response = self.get_response(200, ["1", "2", "3"])
+        with patch("rss_reader.rss_reader.profiler", Profiler()) as profiler:
+            profiler.start()
+            rss_reader.process_source(self.source, None)
+            report = profiler.stop()
+        self.assertEqual(set(report["stages"]), {"fetch", "parse", "bucket", "cache_write"})
+        self.assertEqual(report["stages"]["fetch"]["calls"], 0)
+        self.assertEqual(report["counters"]["items_parsed"], 3)
+        self.assertEqual(report["counters"]["feed_bytes_fetched"], len(response.iter_content.return_value[0]))
+        self.assertGreater(
+            report["counters"]["cache_bytes_written"],
+            os.path.getsize(os.path.join("cache", "news.yahoo.com", "news.yahoo.com_20211030.json")),
+        )
+
+
+class TestFetchFeeds(unittest.TestCase):
+    @patch("rss_reader.rss_reader.process_source")
+    def test_results_in_order_of_sources(self, mock_process_source):
+        mock_process_source.side_effect = lambda source, date, limit, image_workers: ([], source, source)
+        sources = [f"https://site{i}.com/rss" for i in range(5)]
+        result = [
+            (source, future.result()[1]) for source, future in rss_reader.fetch_feeds(sources, None, 2)
+        ]
+        self.assertEqual(result, [(source, source) for source in sources])
 
 
 if __name__ == "__main__":
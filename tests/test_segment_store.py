@@ -0,0 +1,100 @@
+import os
+import stat
+import tempfile
+import unittest
+from unittest.mock import patch
+from rss_reader.segment_store import SegmentStore
+
+
+class TestSegmentStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SegmentStore(self.temp_dir.name, max_segments=3)
+
+    def tearDown(self):
+        self.store.wait()
+        self.temp_dir.cleanup()
+
+    def get_segments(self, feed, day):
+        return [name for name in os.listdir(os.path.join(self.temp_dir.name, feed, "segments", day))
+                if ".ndjson" in name]
+
+    def test_add_writes_new_segment(self):
+        self.store.add("news.yahoo.com", "20211030", [("link_2", {"title": "2"}), ("link_1", {"title": "1"})])
+        self.store.add("news.yahoo.com", "20211030", [("link_3", {"title": "3"})])
+        result = sorted(self.get_segments("news.yahoo.com", "20211030"))
+        self.assertEqual(result, ["000001.ndjson.gz", "000002.ndjson.gz"])
+        result = self.store.get_day("news.yahoo.com", "20211030")
+        self.assertEqual([news["title"] for news in result], ["3", "2", "1"])
+        result = self.store.get_day("news.yahoo.com", "20211030", limit=1, offset=1)
+        self.assertEqual(result, [{"title": "2"}])
+
+    def test_segments_readable_by_others(self):
+        self.store.add("news.yahoo.com", "20211030", [("link_1", {"title": "1"})])
+        segment = os.path.join(self.temp_dir.name, "news.yahoo.com", "segments", "20211030", "000001.ndjson.gz")
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(segment).st_mode), 0o666 & ~umask)
+
+    def test_uncompressed_segments(self):
+        store = SegmentStore(self.temp_dir.name, compress=False)
+        store.add("news.yahoo.com", "20211030", [("link_1", {"title": "Заголовок"})])
+        self.assertEqual(self.get_segments("news.yahoo.com", "20211030"), ["000001.ndjson"])
+        self.assertEqual(store.get_day("news.yahoo.com", "20211030"), [{"title": "Заголовок"}])
+
+    def test_get_unknown(self):
+        self.store.add("news.yahoo.com", "20211030", [("link_1", {"title": "1"})])
+        result = self.store.get_unknown("news.yahoo.com", "20211030", ["link_1", "link_2"])
+        self.assertEqual(result, {"link_2"})
+        result = self.store.get_unknown("news.yahoo.com", "20211029", ["link_1"])
+        self.assertEqual(result, {"link_1"})
+
+    def test_compaction(self):
+        for i in range(5):
+            self.store.add("news.yahoo.com", "20211030", [(f"link_{i}", {"title": str(i)})])
+        self.store.wait()
+        self.store.compact("news.yahoo.com", "20211030")
+        self.assertEqual(len(self.get_segments("news.yahoo.com", "20211030")), 1)
+        result = self.store.get_day("news.yahoo.com", "20211030")
+        self.assertEqual([news["title"] for news in result], ["4", "3", "2", "1", "0"])
+
+    def test_segment_added_during_compaction_stays_latest(self):
+        store = SegmentStore(self.temp_dir.name, max_segments=10)
+        other_process = SegmentStore(self.temp_dir.name, max_segments=10)
+        for i in range(3):
+            store.add("news.yahoo.com", "20211030", [(f"link_{i}", {"title": str(i)})])
+        iter_lines = store._iter_lines
+
+        def add_while_reading(day_path):
+            other_process.add("news.yahoo.com", "20211030", [("link_3", {"title": "3"})])
+            return iter_lines(day_path)
+
+        with patch.object(store, "_iter_lines", side_effect=add_while_reading):
+            store.compact("news.yahoo.com", "20211030")
+        result = sorted(self.get_segments("news.yahoo.com", "20211030"))
+        self.assertEqual(result, ["000003.ndjson.gz", "000004.ndjson.gz"])
+        result = store.get_day("news.yahoo.com", "20211030")
+        self.assertEqual([news["title"] for news in result], ["3", "2", "1", "0"])
+
+    def test_read_during_compaction(self):
+        store = SegmentStore(self.temp_dir.name, max_segments=10)
+        for i in range(3):
+            store.add("news.yahoo.com", "20211030", [(f"link_{i}", {"title": str(i)})])
+        news = store.iter_day("news.yahoo.com", "20211030")
+        result = [next(news)]
+        store.compact("news.yahoo.com", "20211030")
+        result += list(news)
+        self.assertEqual([news["title"] for news in result], ["2", "1", "0"])
+
+    def test_days_and_counts(self):
+        self.store.add("news.yahoo.com", "20211029", [("link_1", {"title": "1"})])
+        self.store.add("news.yahoo.com", "20211030", [("link_2", {"title": "2"})])
+        self.store.add("news.google.com", "20211030", [("link_3", {"title": "3"})])
+        self.assertTrue(self.store.has_day("news.yahoo.com", "20211029"))
+        self.assertFalse(self.store.has_day("news.google.com", "20211029"))
+        result = self.store.get_counts()
+        self.assertEqual(result, {"20211029": {"news.yahoo.com": 1}, "20211030": {"news.yahoo.com": 1, "news.google.com": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
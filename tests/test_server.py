@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import Mock
+from rss_reader.server import DayCache, NewsServer
+
+
+class TestDayCache(unittest.TestCase):
+    def test_days_loaded_once(self):
+        cache = DayCache(1024)
+        load = Mock(return_value=[{"title": "a"}])
+        self.assertEqual(cache.get("feed", "20211030", 1, load), [{"title": "a"}])
+        self.assertEqual(cache.get("feed", "20211030", 1, load), [{"title": "a"}])
+        self.assertEqual(load.call_count, 1)
+        cache.get("feed", "20211030", 2, load)
+        self.assertEqual(load.call_count, 2)
+        cache.invalidate("feed", ["20211030"])
+        cache.get("feed", "20211030", None, load)
+        self.assertEqual(load.call_count, 3)
+
+    def test_least_recently_used_evicted(self):
+        size = len(json.dumps([{"title": "a"}]))
+        cache = DayCache(2 * size)
+        load = Mock(return_value=[{"title": "a"}])
+        for day in ("1", "2", "1", "3"):
+            cache.get("feed", day, None, load)
+        self.assertEqual(cache.size, 2 * size)
+        self.assertEqual(load.call_count, 3)
+        cache.get("feed", "1", None, load)
+        self.assertEqual(load.call_count, 3)
+        cache.get("feed", "2", None, load)
+        self.assertEqual(load.call_count, 4)
+
+
+class TestNewsServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.temp_dir.name, "manifest.json")
+        with open(self.manifest_path, "w") as manifest_file:
+            manifest_file.write("{}")
+        self.manifest = {"20211030": {"a.com": {"count": 2}, "b.com": {"count": 3}}}
+        self.read_manifest = Mock(return_value=self.manifest)
+        self.load_day = Mock(side_effect=lambda feed, day: [{"title": f"{feed} {i}"} for i in range(
+            self.manifest[day][feed]["count"]
+        )])
+        self.server = NewsServer(
+            ("127.0.0.1", 0), DayCache(1024 * 1024), self.read_manifest, lambda: self.manifest_path, self.load_day
+        )
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{self.server.server_port}{path}") as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as exc:
+            return exc.code, json.load(exc)
+
+    def test_news_with_limit_and_offset(self):
+        status, news = self.get("/news?date=20211030&offset=1&limit=3")
+        self.assertEqual(status, 200)
+        self.assertEqual([one_news["title"] for one_news in news], ["a.com 1", "b.com 0", "b.com 1"])
+        self.assertEqual(self.get("/news?date=20211030&feed=b.com&offset=2")[1], [{"title": "b.com 2"}])
+        self.assertEqual(self.load_day.call_count, 2)
+        self.assertEqual(self.read_manifest.call_count, 1)
+
+    def test_dates_and_feeds(self):
+        self.assertEqual(self.get("/dates"), (200, {"20211030": {"a.com": 2, "b.com": 3}}))
+        self.assertEqual(self.get("/feeds?date=20211030"), (200, {"a.com": 2, "b.com": 3}))
+
+    def test_manifest_change_reloads_day(self):
+        self.get("/news?date=20211030&feed=a.com")
+        self.manifest["20211030"]["a.com"]["count"] = 3
+        with open(self.manifest_path, "w") as manifest_file:
+            manifest_file.write("{\"changed\": true}")
+        self.assertEqual(len(self.get("/news?date=20211030&feed=a.com")[1]), 3)
+        self.assertEqual(self.read_manifest.call_count, 2)
+
+    def test_errors(self):
+        self.assertEqual(self.get("/news?date=2021")[0], 400)
+        self.assertEqual(self.get("/news?date=20211030&limit=-1")[0], 400)
+        self.assertEqual(self.get("/news?date=20211030&feed=c.com")[0], 404)
+        self.assertEqual(self.get("/unknown")[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import threading
+import unittest
+from rss_reader.sqlite_store import SqliteStore
+
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = SqliteStore(os.path.join(self.temp_dir.name, "cache", "news.sqlite3"))
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.temp_dir.cleanup()
+
+    def test_wal_mode(self):
+        result = self.store.connection.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(result, "wal")
+
+    def test_add_and_get_day(self):
+        self.store.add("news.yahoo.com", "20211030", [("link_2", {"title": "2"}), ("link_1", {"title": "1"})])
+        self.store.add("news.yahoo.com", "20211030", [("link_3", {"title": "3"}), ("link_2", {"title": "2"})])
+        result = self.store.get_day("news.yahoo.com", "20211030")
+        self.assertEqual([news["title"] for news in result], ["3", "2", "1"])
+        result = self.store.get_day("news.yahoo.com", "20211030", limit=1, offset=1)
+        self.assertEqual(result, [{"title": "2"}])
+        result = self.store.iter_day("news.yahoo.com", "20211030")
+        self.assertEqual(next(result), {"title": "3"})
+
+    def test_get_unknown(self):
+        self.store.add("news.yahoo.com", "20211030", [("link_1", {"title": "1"})])
+        result = self.store.get_unknown("news.yahoo.com", "20211030", ["link_1", "link_2"])
+        self.assertEqual(result, {"link_2"})
+        result = self.store.get_unknown("news.yahoo.com", "20211029", ["link_1"])
+        self.assertEqual(result, {"link_1"})
+
+    def test_days_and_counts(self):
+        self.store.add("news.yahoo.com", "20211029", [("link_1", {"title": "1"})])
+        self.store.add("news.yahoo.com", "20211030", [("link_2", {"title": "2"})])
+        self.store.add("news.google.com", "20211030", [("link_3", {"title": "3"})])
+        self.assertTrue(self.store.has_day("news.yahoo.com", "20211029"))
+        self.assertFalse(self.store.has_day("news.google.com", "20211029"))
+        result = self.store.get_counts()
+        self.assertEqual(result, {"20211029": {"news.yahoo.com": 1}, "20211030": {"news.yahoo.com": 1, "news.google.com": 1}})
+
+    def test_connection_per_thread(self):
+        connections = []
+
+        def connect():
+            connections.append(self.store.connection)
+            self.store.connection.close()
+
+        thread = threading.Thread(target=connect)
+        thread.start()
+        thread.join()
+        self.assertIsNot(connections[0], self.store.connection)
+
+
+if __name__ == "__main__":
+    unittest.main()
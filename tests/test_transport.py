@@ -0,0 +1,78 @@
+import socket
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock, patch
+from rss_reader.transport import DnsCache, create_session
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    clients = set()
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        body = b"<rss></rss>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDnsCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.create_connection = Mock()
+        self.cache = DnsCache(self.create_connection, ttl=60, clock=lambda: self.now)
+        self.infos = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", 80))]
+
+    @patch("socket.getaddrinfo")
+    def test_resolved_once_until_expired(self, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = self.infos
+        self.cache.create_connection(("a.com", 80), 5)
+        self.cache.create_connection(("a.com", 80), 5)
+        self.assertEqual(mock_getaddrinfo.call_count, 1)
+        self.create_connection.assert_called_with(("10.0.0.1", 80), 5)
+        self.now = 60
+        self.cache.create_connection(("a.com", 80), 5)
+        self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+    @patch("socket.getaddrinfo")
+    def test_resolved_again_after_failure(self, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = self.infos
+        self.create_connection.side_effect = ConnectionRefusedError
+        with self.assertRaises(ConnectionRefusedError):
+            self.cache.create_connection(("a.com", 80))
+        self.create_connection.side_effect = None
+        self.cache.create_connection(("a.com", 80))
+        self.assertEqual(mock_getaddrinfo.call_count, 2)
+
+    @patch("socket.getaddrinfo")
+    def test_ip_address_not_resolved(self, mock_getaddrinfo):
+        self.cache.create_connection(("127.0.0.1", 80))
+        mock_getaddrinfo.assert_not_called()
+
+
+class TestCreateSession(unittest.TestCase):
+    def test_connections_reused(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        try:
+            session = create_session(host_connections=2)
+            for _ in range(5):
+                response = session.get(f"http://127.0.0.1:{server.server_port}/rss", timeout=5)
+                self.assertEqual(response.content, b"<rss></rss>")
+            self.assertEqual(len(Handler.clients), 1)
+            self.assertIn("gzip", session.headers["Accept-Encoding"])
+            self.assertEqual(session.get_adapter("https://s.yimg.com")._pool_maxsize, 2)
+            session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import datetime as dt
+import unittest
+from unittest.mock import Mock
+from rss_reader.watcher import Watcher
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.now = dt.datetime(2021, 10, 30, 12, 0, tzinfo=dt.timezone.utc).timestamp()
+        self.clock = Clock(self.now)
+
+    def test_interval_respects_ttl(self):
+        watcher = Watcher(["a"], Mock(return_value={"ttl": 60}), interval=900, clock=self.clock)
+        self.assertEqual(watcher.poll_source("a"), self.now + 3600)
+        watcher.poll.return_value = {"ttl": 5}
+        self.assertEqual(watcher.poll_source("a"), self.now + 900)
+
+    def test_skip_hours_and_days(self):
+        schedule = {"ttl": None, "skip_hours": [12, 13], "skip_days": []}
+        watcher = Watcher(["a"], Mock(return_value=schedule), interval=900, clock=self.clock)
+        self.assertEqual(watcher.poll_source("a"), self.now + 2 * 3600)
+        watcher.poll.return_value = {"skip_hours": [], "skip_days": ["Saturday"]}
+        next_poll = dt.datetime.fromtimestamp(watcher.poll_source("a"), dt.timezone.utc)
+        self.assertEqual(next_poll, dt.datetime(2021, 10, 31, 0, 0, tzinfo=dt.timezone.utc))
+
+    def test_backoff_on_failures(self):
+        watcher = Watcher(["a"], Mock(side_effect=RuntimeError), interval=100, max_interval=500, clock=self.clock)
+        self.assertEqual([watcher.poll_source("a") - self.now for _ in range(4)], [200, 400, 500, 500])
+        watcher.poll.side_effect = None
+        watcher.poll.return_value = {}
+        self.assertEqual(watcher.poll_source("a"), self.now + 100)
+
+    def test_run_polls_due_feeds_by_priority(self):
+        polled = []
+
+        def poll(source):
+            polled.append(source)
+            self.clock.now += 10
+            return {"ttl": 1} if source == "a" else {"ttl": 2}
+
+        watcher = Watcher(["a", "b", "a"], poll, interval=30, workers=1, clock=self.clock)
+        watcher._stopped.wait = lambda timeout: setattr(self.clock, "now", self.clock.now + timeout)
+        watcher.run(polls=5)
+        self.assertEqual(polled, ["a", "b", "a", "b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()